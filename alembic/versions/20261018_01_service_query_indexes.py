@@ -0,0 +1,83 @@
+"""Add composite and partial indexes for service queries
+
+Revision ID: 20261018_01
+Revises: 20260302_04
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261018_01"
+down_revision: Union[str, None] = "20260302_04"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (table, index name, columns, partial predicate)
+INDEXES: list[tuple[str, str, list[str], str | None]] = [
+    (
+        "expenses",
+        "ix_expenses_user_id_date_actual",
+        ["user_id", "date"],
+        "is_future = false",
+    ),
+    (
+        "income",
+        "ix_income_user_id_date",
+        ["user_id", "date"],
+        None,
+    ),
+    (
+        "payments",
+        "ix_payments_user_id_due_date_open",
+        ["user_id", "due_date"],
+        "NOT is_paid AND NOT is_skipped",
+    ),
+]
+
+
+def _has_table(inspector: sa.Inspector, table_name: str) -> bool:
+    return table_name in set(inspector.get_table_names())
+
+
+def _has_index(inspector: sa.Inspector, table_name: str, index_name: str) -> bool:
+    return index_name in {idx["name"] for idx in inspector.get_indexes(table_name)}
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        for table_name, index_name, columns, where in INDEXES:
+            inspector = sa.inspect(op.get_bind())
+            if not _has_table(inspector, table_name):
+                continue
+            if _has_index(inspector, table_name, index_name):
+                continue
+            op.create_index(
+                index_name,
+                table_name,
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+                postgresql_where=sa.text(where) if where else None,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table_name, index_name, _columns, _where in reversed(INDEXES):
+            inspector = sa.inspect(op.get_bind())
+            if not _has_table(inspector, table_name):
+                continue
+            if not _has_index(inspector, table_name, index_name):
+                continue
+            op.drop_index(
+                index_name,
+                table_name=table_name,
+                postgresql_concurrently=True,
+            )
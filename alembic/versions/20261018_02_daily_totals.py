@@ -0,0 +1,52 @@
+"""Create daily_totals rollup table
+
+Revision ID: 20261018_02
+Revises: 20261018_01
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261018_02"
+down_revision: Union[str, None] = "20261018_01"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "daily_totals" in set(inspector.get_table_names()):
+        return
+
+    op.create_table(
+        "daily_totals",
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("kind", sa.String(length=16), nullable=False),
+        sa.Column("category", sa.String(length=100), nullable=False, server_default=""),
+        sa.Column("amount_sum", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("row_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint("user_id", "day", "kind", "category"),
+    )
+    op.create_index(
+        "ix_daily_totals_user_id_kind_day",
+        "daily_totals",
+        ["user_id", "kind", "day"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "daily_totals" not in set(inspector.get_table_names()):
+        return
+
+    op.drop_index("ix_daily_totals_user_id_kind_day", table_name="daily_totals")
+    op.drop_table("daily_totals")
@@ -0,0 +1,50 @@
+"""Backfill daily_totals from expenses and income
+
+Revision ID: 20261018_03
+Revises: 20261018_02
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261018_03"
+down_revision: Union[str, None] = "20261018_02"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL_SQL = """
+INSERT INTO daily_totals (user_id, day, kind, category, amount_sum, row_count)
+SELECT user_id, date, 'expense', COALESCE(category, ''), SUM(amount), COUNT(*)
+FROM expenses
+WHERE is_future = false
+GROUP BY user_id, date, COALESCE(category, '')
+UNION ALL
+SELECT user_id, date, 'income', COALESCE(category, ''), SUM(amount), COUNT(*)
+FROM income
+GROUP BY user_id, date, COALESCE(category, '')
+"""
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+    if not {"daily_totals", "expenses", "income"} <= tables:
+        return
+
+    # Rebuild from scratch so the migration can be re-run safely.
+    op.execute("DELETE FROM daily_totals")
+    op.execute(BACKFILL_SQL)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if "daily_totals" not in set(sa.inspect(bind).get_table_names()):
+        return
+
+    op.execute("DELETE FROM daily_totals")
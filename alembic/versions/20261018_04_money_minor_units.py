@@ -0,0 +1,86 @@
+"""Store money amounts as BIGINT tiyin instead of float
+
+Revision ID: 20261018_04
+Revises: 20261018_03
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261018_04"
+down_revision: Union[str, None] = "20261018_03"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (table, column); 1 so'm = 100 tiyin
+MONEY_COLUMNS: list[tuple[str, str]] = [
+    ("expenses", "amount"),
+    ("payments", "amount"),
+    ("income", "amount"),
+    ("daily_totals", "amount_sum"),
+]
+
+# 20261018_03 summed the float amounts, and rounding each bucket's sum is not
+# the same as summing the rounded rows. Rebuild the rollup from the converted
+# columns so check_consistency compares like with like.
+REBUILD_DAILY_TOTALS_SQL = """
+INSERT INTO daily_totals (user_id, day, kind, category, amount_sum, row_count)
+SELECT user_id, date, 'expense', COALESCE(category, ''), SUM(amount), COUNT(*)
+FROM expenses
+WHERE is_future = false
+GROUP BY user_id, date, COALESCE(category, '')
+UNION ALL
+SELECT user_id, date, 'income', COALESCE(category, ''), SUM(amount), COUNT(*)
+FROM income
+GROUP BY user_id, date, COALESCE(category, '')
+"""
+
+
+def _column_type(inspector: sa.Inspector, table_name: str, column_name: str) -> sa.types.TypeEngine | None:
+    if table_name not in set(inspector.get_table_names()):
+        return None
+    for column in inspector.get_columns(table_name):
+        if column["name"] == column_name:
+            return column["type"]
+    return None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    converted = False
+    for table_name, column_name in MONEY_COLUMNS:
+        column_type = _column_type(inspector, table_name, column_name)
+        if column_type is None or isinstance(column_type, sa.BigInteger):
+            continue
+        converted = True
+        # Go through numeric so the float is rounded to tiyin, not truncated.
+        op.alter_column(
+            table_name,
+            column_name,
+            type_=sa.BigInteger(),
+            postgresql_using=f"round({column_name}::numeric * 100)::bigint",
+        )
+
+    if converted and {"daily_totals", "expenses", "income"} <= set(inspector.get_table_names()):
+        op.execute("DELETE FROM daily_totals")
+        op.execute(REBUILD_DAILY_TOTALS_SQL)
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for table_name, column_name in reversed(MONEY_COLUMNS):
+        column_type = _column_type(inspector, table_name, column_name)
+        if column_type is None or not isinstance(column_type, sa.BigInteger):
+            continue
+        op.alter_column(
+            table_name,
+            column_name,
+            type_=sa.Float(),
+            postgresql_using=f"{column_name} / 100.0",
+        )
@@ -0,0 +1,58 @@
+"""Create payment_occurrences table
+
+Revision ID: 20261018_05
+Revises: 20261018_04
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261018_05"
+down_revision: Union[str, None] = "20261018_04"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "payment_occurrences" in set(inspector.get_table_names()):
+        return
+
+    # Rows are generated by the application (OccurrenceService) on startup and nightly.
+    op.create_table(
+        "payment_occurrences",
+        sa.Column("payment_id", sa.Integer(), nullable=False),
+        sa.Column("due_date", sa.Date(), nullable=False),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("amount", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("payment_id", "due_date"),
+    )
+    op.create_index(
+        "ix_payment_occurrences_user_id_due_date",
+        "payment_occurrences",
+        ["user_id", "due_date"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_payment_occurrences_due_date",
+        "payment_occurrences",
+        ["due_date"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "payment_occurrences" not in set(inspector.get_table_names()):
+        return
+
+    op.drop_index("ix_payment_occurrences_due_date", table_name="payment_occurrences")
+    op.drop_index("ix_payment_occurrences_user_id_due_date", table_name="payment_occurrences")
+    op.drop_table("payment_occurrences")
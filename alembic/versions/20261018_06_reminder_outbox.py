@@ -0,0 +1,60 @@
+"""Create reminder_outbox table
+
+Revision ID: 20261018_06
+Revises: 20261018_05
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261018_06"
+down_revision: Union[str, None] = "20261018_05"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "reminder_outbox" in set(inspector.get_table_names()):
+        return
+
+    op.create_table(
+        "reminder_outbox",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("payment_id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(length=32), nullable=False),
+        sa.Column("due_date", sa.Date(), nullable=False),
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("text", sa.Text(), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("payment_id", "kind", "due_date", name="uq_reminder_outbox_payment_id_kind_due_date"),
+    )
+    op.create_index(
+        "ix_reminder_outbox_pending_next_attempt_at",
+        "reminder_outbox",
+        ["next_attempt_at"],
+        unique=False,
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "reminder_outbox" not in set(inspector.get_table_names()):
+        return
+
+    op.drop_index("ix_reminder_outbox_pending_next_attempt_at", table_name="reminder_outbox")
+    op.drop_table("reminder_outbox")
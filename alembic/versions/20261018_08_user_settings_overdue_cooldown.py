@@ -0,0 +1,56 @@
+"""Add overdue_cooldown_hours to user_settings
+
+Revision ID: 20261018_08
+Revises: 20261018_07
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261018_08"
+down_revision: Union[str, None] = "20261018_07"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(inspector: sa.Inspector, table_name: str) -> bool:
+    return table_name in set(inspector.get_table_names())
+
+
+def _has_column(inspector: sa.Inspector, table_name: str, column_name: str) -> bool:
+    return column_name in {col["name"] for col in inspector.get_columns(table_name)}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if not _has_table(inspector, "user_settings"):
+        return
+
+    if not _has_column(inspector, "user_settings", "overdue_cooldown_hours"):
+        op.add_column(
+            "user_settings",
+            sa.Column(
+                "overdue_cooldown_hours",
+                sa.Integer(),
+                nullable=False,
+                server_default="8",
+            ),
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if not _has_table(inspector, "user_settings"):
+        return
+
+    if _has_column(inspector, "user_settings", "overdue_cooldown_hours"):
+        op.drop_column("user_settings", "overdue_cooldown_hours")
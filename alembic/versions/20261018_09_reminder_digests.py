@@ -0,0 +1,46 @@
+"""Create reminder_digests table
+
+Revision ID: 20261018_09
+Revises: 20261018_08
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261018_09"
+down_revision: Union[str, None] = "20261018_08"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "reminder_digests" in set(inspector.get_table_names()):
+        return
+
+    op.create_table(
+        "reminder_digests",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("payment_ids", postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_reminder_digests_created_at", "reminder_digests", ["created_at"], unique=False)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "reminder_digests" not in set(inspector.get_table_names()):
+        return
+
+    op.drop_index("ix_reminder_digests_created_at", table_name="reminder_digests")
+    op.drop_table("reminder_digests")
@@ -0,0 +1,48 @@
+"""Add daily_summary_sent_on to users
+
+Revision ID: 20261018_10
+Revises: 20261018_09
+Create Date: 2026-10-18
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261018_10"
+down_revision: Union[str, None] = "20261018_09"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(inspector: sa.Inspector, table_name: str) -> bool:
+    return table_name in set(inspector.get_table_names())
+
+
+def _has_column(inspector: sa.Inspector, table_name: str, column_name: str) -> bool:
+    return column_name in {col["name"] for col in inspector.get_columns(table_name)}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if not _has_table(inspector, "users"):
+        return
+
+    if not _has_column(inspector, "users", "daily_summary_sent_on"):
+        op.add_column("users", sa.Column("daily_summary_sent_on", sa.Date(), nullable=True))
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if not _has_table(inspector, "users"):
+        return
+
+    if _has_column(inspector, "users", "daily_summary_sent_on"):
+        op.drop_column("users", "daily_summary_sent_on")
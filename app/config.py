@@ -23,7 +23,51 @@ class Settings(BaseSettings):
     POSTGRES_PORT: int = 5432
 
     DATABASE_URL: str = ''
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
     TIMEZONE: str = 'Asia/Tashkent'
+    # Users' timezones are cached per process; a change made on another replica shows up after this long.
+    TIMEZONE_CACHE_SECONDS: int = 300
+    # At most this many users' timezones are cached; the least recently used go first.
+    TIMEZONE_CACHE_SIZE: int = 10000
+    # How far ahead payment_occurrences is kept filled.
+    PAYMENT_OCCURRENCE_HORIZON_DAYS: int = 90
+
+    # Bot API server; point at a local/fake server for tests, empty means api.telegram.org.
+    TELEGRAM_API_URL: str = ''
+    SEND_RATE_PER_SECOND: float = 30.0
+    SEND_CHAT_RATE_PER_SECOND: float = 1.0
+    SEND_CHAT_BURST: int = 3
+    SEND_CONCURRENCY: int = 8
+
+    # Payment reminders are delivered from reminder_outbox.
+    REMINDER_OUTBOX_BATCH_SIZE: int = 200
+    # A claimed row becomes claimable again after this long (worker crashed mid-send).
+    REMINDER_OUTBOX_LEASE_SECONDS: int = 300
+    REMINDER_OUTBOX_MAX_ATTEMPTS: int = 5
+    REMINDER_OUTBOX_RETRY_BASE_SECONDS: int = 30
+    REMINDER_OUTBOX_RETRY_MAX_SECONDS: int = 1800
+    REMINDER_OUTBOX_RETENTION_DAYS: int = 30
+
+    # Several replicas: reminder fan-out is split by user_id hash, every replica
+    # needs the same REPLICA_COUNT and its own REPLICA_INDEX (0..COUNT-1).
+    REPLICA_COUNT: int = 1
+    REPLICA_INDEX: int = 0
+    # Singleton jobs (backup, nightly maintenance) run on the advisory lock holder.
+    LEADER_LOCK_KEY: int = 724_101
+    LEADER_CHECK_SECONDS: float = 15.0
+
+    # Excel/PDF files are rendered in worker processes, off the event loop.
+    REPORT_RENDER_WORKERS: int = 2
+    REPORT_RENDER_PER_USER: int = 1
+    REPORT_RENDER_TIMEOUT_SECONDS: float = 120.0
+    # Files are sent from memory; larger ones come back from the worker as a
+    # temp file (system temp dir, not the reports volume). 0 = always in memory.
+    REPORT_SPILL_BYTES: int = 20 * 1024 * 1024
 
     BACKUP_DIR: str = 'backups'
 
@@ -40,6 +84,12 @@ class Settings(BaseSettings):
     PRE_RESTORE_BACKUP_PREFIX: ClassVar[str] = 'pre_restore_expense_'
     BACKUP_LOCK_TIMEOUT_SECONDS: ClassVar[int] = 600
 
+    @model_validator(mode='after')
+    def _check_replica(self) -> 'Settings':
+        if not 0 <= self.REPLICA_INDEX < max(1, self.REPLICA_COUNT):
+            raise ValueError('REPLICA_INDEX must be in 0..REPLICA_COUNT-1')
+        return self
+
     @model_validator(mode='after')
     def _build_database_url(self) -> 'Settings':
         if self.DATABASE_URL:
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from collections.abc import Callable
+from collections.abc import Awaitable, Callable
 from contextlib import asynccontextmanager
 from typing import TypeVar
 
@@ -10,15 +10,28 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy.orm import declarative_base
 
 from config import config
+from db_metrics import InstrumentedAsyncQueuePool, instrument_engine, instrument_pool, pool_snapshot
 
 
 async_engine: AsyncEngine = create_async_engine(
     config.DATABASE_URL,
-    pool_pre_ping=True,
+    poolclass=InstrumentedAsyncQueuePool,
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW,
+    pool_timeout=config.DB_POOL_TIMEOUT,
+    pool_recycle=config.DB_POOL_RECYCLE,
+    pool_pre_ping=config.DB_POOL_PRE_PING,
+    connect_args={
+        # SQLAlchemy's asyncpg adapter cache and asyncpg's own statement cache.
+        "prepared_statement_cache_size": config.DB_STATEMENT_CACHE_SIZE,
+        "statement_cache_size": config.DB_STATEMENT_CACHE_SIZE,
+    },
 )
+instrument_pool(async_engine.sync_engine.pool)
+instrument_engine(async_engine.sync_engine)
 AsyncSessionLocal = async_sessionmaker(
     bind=async_engine,
     class_=AsyncSession,
@@ -37,6 +50,13 @@ async def get_db():
         yield db
 
 
-async def run_db(fn: Callable[[Session], T], *args, **kwargs) -> T:
+def get_pool_stats() -> dict:
+    return pool_snapshot(async_engine.pool)
+
+
+async def run_db(fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+    """Run fn in its own session and commit. Bot updates get theirs from DbSessionMiddleware."""
     async with AsyncSessionLocal() as db:
-        return await db.run_sync(lambda sync_db: fn(sync_db, *args, **kwargs))
+        result = await fn(db, *args, **kwargs)
+        await db.commit()
+        return result
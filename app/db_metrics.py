@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import time
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+@dataclass(slots=True)
+class PoolStats:
+    connects: int = 0
+    checkouts: int = 0
+    invalidations: int = 0
+    pre_ping_failures: int = 0
+    wait_count: int = 0
+    wait_total_seconds: float = 0.0
+    wait_max_seconds: float = 0.0
+    timeouts: int = 0
+
+
+pool_stats = PoolStats()
+
+
+@dataclass(slots=True)
+class UpdateQueryStats:
+    updates: int = 0
+    queries_total: int = 0
+    queries_max: int = 0
+
+
+update_query_stats = UpdateQueryStats()
+
+# Per-update statement counter; None outside of an update (schedulers, migrations).
+_update_query_count: ContextVar[list[int] | None] = ContextVar("update_query_count", default=None)
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long checkouts wait for a free connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            pool_stats.wait_count += 1
+            pool_stats.wait_total_seconds += waited
+            pool_stats.wait_max_seconds = max(pool_stats.wait_max_seconds, waited)
+
+
+def _on_connect(dbapi_connection, connection_record) -> None:
+    pool_stats.connects += 1
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+    pool_stats.checkouts += 1
+
+
+def _on_invalidate(dbapi_connection, connection_record, exception) -> None:
+    pool_stats.invalidations += 1
+    # A failed pre-ping surfaces as a DisconnectionError on checkout.
+    if isinstance(exception, exc.DisconnectionError):
+        pool_stats.pre_ping_failures += 1
+
+
+def _on_before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    counter = _update_query_count.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def begin_update_queries():
+    return _update_query_count.set([0])
+
+
+def end_update_queries(token) -> int:
+    """Close the counter opened by begin_update_queries() and fold it into the totals."""
+    counter = _update_query_count.get()
+    _update_query_count.reset(token)
+    queries = counter[0] if counter is not None else 0
+    update_query_stats.updates += 1
+    update_query_stats.queries_total += queries
+    update_query_stats.queries_max = max(update_query_stats.queries_max, queries)
+    return queries
+
+
+def instrument_engine(engine) -> None:
+    event.listen(engine, "before_cursor_execute", _on_before_cursor_execute)
+
+
+def instrument_pool(pool) -> None:
+    event.listen(pool, "connect", _on_connect)
+    event.listen(pool, "checkout", _on_checkout)
+    event.listen(pool, "invalidate", _on_invalidate)
+
+
+def pool_snapshot(pool) -> dict:
+    stats = asdict(pool_stats)
+    wait_count = stats["wait_count"]
+    stats["wait_avg_ms"] = (stats["wait_total_seconds"] / wait_count * 1000) if wait_count else 0.0
+    stats["wait_max_ms"] = stats.pop("wait_max_seconds") * 1000
+    stats.pop("wait_total_seconds")
+    stats.update(
+        size=pool.size(),
+        checked_out=pool.checkedout(),
+        idle=pool.checkedin(),
+        overflow=pool.overflow(),
+    )
+    updates = update_query_stats.updates
+    stats.update(
+        updates=updates,
+        queries_per_update_avg=(update_query_stats.queries_total / updates) if updates else 0.0,
+        queries_per_update_max=update_query_stats.queries_max,
+    )
+    return stats
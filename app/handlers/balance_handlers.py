@@ -1,20 +1,20 @@
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date
 
 from keyboards import *
 from services.balance_service import BalanceService
-from database import run_db
 
 router = Router()
 
 @router.message(F.text == "💰 Balans")
-async def show_balance_summary_message(message: Message):
+async def show_balance_summary_message(message: Message, db: AsyncSession):
     if message.from_user is None:
         await message.answer("Iltimos, botga kirish qiling.")
         return
-    balance = await run_db(BalanceService.get_current_balance, message.from_user.id)
+    balance = await BalanceService.get_current_balance(db, message.from_user.id)
     
     # Format balance summary message
     message_text = f"💰 **{balance['month_name']} oylik balans xulosasi**\n\n"
@@ -66,9 +66,9 @@ async def show_balance_summary_message(message: Message):
     )
 
 @router.callback_query(F.data == "balance_summary")
-async def show_balance_summary(callback: CallbackQuery):
+async def show_balance_summary(callback: CallbackQuery, db: AsyncSession):
     await callback.answer()
-    balance = await run_db(BalanceService.get_current_balance, callback.from_user.id)
+    balance = await BalanceService.get_current_balance(db, callback.from_user.id)
     
     # Format balance summary message
     message_text = f"💰 **{balance['month_name']} oylik balans xulosasi**\n\n"
@@ -121,9 +121,9 @@ async def show_balance_summary(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "balance_yearly")
-async def show_yearly_balance(callback: CallbackQuery):
+async def show_yearly_balance(callback: CallbackQuery, db: AsyncSession):
     await callback.answer()
-    yearly_balance = await run_db(BalanceService.get_yearly_balance_summary, callback.from_user.id)
+    yearly_balance = await BalanceService.get_yearly_balance_summary(db, callback.from_user.id)
     
     message_text = f"📊 **{yearly_balance['year']} yillik balans xulosasi**\n\n"
     message_text += f"💵 Jami yillik kirim: {yearly_balance['total_yearly_income']:,.0f} so'm\n"
@@ -148,9 +148,9 @@ async def show_yearly_balance(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "balance_detail")
-async def show_balance_detail(callback: CallbackQuery):
+async def show_balance_detail(callback: CallbackQuery, db: AsyncSession):
     await callback.answer()
-    balance = await run_db(BalanceService.get_current_balance, callback.from_user.id)
+    balance = await BalanceService.get_current_balance(db, callback.from_user.id)
     
     message_text = f"📋 **{balance['month_name']} batafsil balans**\n\n"
     
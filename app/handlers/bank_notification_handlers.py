@@ -8,8 +8,8 @@ from aiogram import F, Router
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, InaccessibleMessage, Message
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import run_db
 from keyboards import (
     get_bank_description_choice_keyboard,
     get_categories_keyboard,
@@ -19,7 +19,9 @@ from keyboards import (
 from models import ExpenseType
 from services.expense_service import ExpenseService
 from services.income_service import IncomeService
+from services.settings_service import SettingsService
 from states import BankMessageStates
+from utils.money import Money
 
 router = Router()
 
@@ -34,18 +36,18 @@ BANK_DATE_RE = re.compile(r"\b(?P<date>\d{2}\.\d{2}\.\d{4})\b")
 @dataclass(slots=True)
 class ParsedBankMessage:
     kind: str
-    amount: float
+    amount: Money
     operation_date: date
     description: str
 
 
-def _format_money_uzs(amount: float) -> str:
-    if abs(amount - round(amount)) < 1e-9:
+def _format_money_uzs(amount: Money) -> str:
+    if amount.is_whole():
         return f"{amount:,.0f}".replace(",", " ")
     return f"{amount:,.2f}".replace(",", " ").replace(".", ",")
 
 
-def _parse_localized_amount(raw_amount: str) -> float | None:
+def _parse_localized_amount(raw_amount: str) -> Money | None:
     cleaned = re.sub(r"[^\d,\.]", "", raw_amount)
     if not cleaned:
         return None
@@ -57,12 +59,12 @@ def _parse_localized_amount(raw_amount: str) -> float | None:
         if not int_digits:
             return None
         frac_digits = (frac_digits + "00")[:2]
-        return float(f"{int_digits}.{frac_digits}")
+        return Money(f"{int_digits}.{frac_digits}")
 
     digits = re.sub(r"\D", "", cleaned)
     if not digits:
         return None
-    return float(digits)
+    return Money(digits)
 
 
 def _detect_kind(text: str) -> str | None:
@@ -81,7 +83,7 @@ def _detect_kind(text: str) -> str | None:
     return None
 
 
-def _parse_bank_message(text: str) -> ParsedBankMessage | None:
+def _parse_bank_message(text: str, today: date) -> ParsedBankMessage | None:
     kind = _detect_kind(text)
     if kind is None:
         return None
@@ -116,12 +118,12 @@ def _parse_bank_message(text: str) -> ParsedBankMessage | None:
     )
 
     date_matches = BANK_DATE_RE.findall(text)
-    operation_date = date.today()
+    operation_date = today
     if date_matches:
         try:
             operation_date = datetime.strptime(date_matches[-1], "%d.%m.%Y").date()
         except ValueError:
-            operation_date = date.today()
+            operation_date = today
 
     return ParsedBankMessage(
         kind=kind,
@@ -166,6 +168,7 @@ async def _ask_description_choice_by_callback(callback: CallbackQuery, state: FS
 
 
 async def _save_bank_operation(
+    db: AsyncSession,
     reply_message: Message,
     state: FSMContext,
     user_id: int,
@@ -174,7 +177,7 @@ async def _save_bank_operation(
     data = await state.get_data()
 
     kind = str(data.get("bank_kind") or "").strip().lower()
-    amount = float(data.get("bank_amount") or 0)
+    amount = Money(data.get("bank_amount") or 0)
     date_raw = str(data.get("bank_date") or "")
     category = str(data.get("bank_category") or "").strip()
 
@@ -189,7 +192,7 @@ async def _save_bank_operation(
     try:
         operation_date = date.fromisoformat(date_raw)
     except ValueError:
-        operation_date = date.today()
+        operation_date = await SettingsService.local_today(db, user_id)
 
     description = (custom_description or "").strip()
     if not description:
@@ -201,8 +204,8 @@ async def _save_bank_operation(
         category = "Kirim" if kind == "income" else "Boshqa"
 
     if kind == "expense":
-        await run_db(
-            ExpenseService.add_expense, # pyright: ignore[reportArgumentType]
+        await ExpenseService.add_expense(
+            db, # pyright: ignore[reportArgumentType]
             user_id=user_id,
             amount=amount,
             category=category,
@@ -219,8 +222,8 @@ async def _save_bank_operation(
             f"📅 Sana: {operation_date.strftime('%d.%m.%Y')}"
         )
     else:
-        await run_db(
-            IncomeService.add_income,  # pyright: ignore[reportArgumentType]
+        await IncomeService.add_income(
+            db,  # pyright: ignore[reportArgumentType]
             user_id=user_id,
             amount=amount,
             description=description,
@@ -240,11 +243,11 @@ async def _save_bank_operation(
 
 
 @router.message(StateFilter("*"), F.text.regexp(r"^\s*(💸\s*Amaliyot|🎉\s*To['’`]?ldirish)\b"))
-async def capture_bank_notification(message: Message, state: FSMContext):
+async def capture_bank_notification(message: Message, state: FSMContext, db: AsyncSession):
     if message.from_user is None or message.text is None:
         return
 
-    parsed = _parse_bank_message(message.text)
+    parsed = _parse_bank_message(message.text, await SettingsService.local_today(db, message.from_user.id))
     if parsed is None:
         return
 
@@ -320,17 +323,17 @@ async def bank_category_text(message: Message, state: FSMContext):
 
 
 @router.callback_query(BankMessageStates.waiting_for_description_choice, F.data == "bank_desc_keep")
-async def bank_description_keep(callback: CallbackQuery, state: FSMContext):
+async def bank_description_keep(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     await callback.answer()
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
 
-    await _save_bank_operation(callback.message, state, callback.from_user.id)
+    await _save_bank_operation(db, callback.message, state, callback.from_user.id)
 
 
 @router.message(BankMessageStates.waiting_for_description_choice)
-async def bank_description_custom_text(message: Message, state: FSMContext):
+async def bank_description_custom_text(message: Message, state: FSMContext, db: AsyncSession):
     if message.from_user is None:
         return
 
@@ -340,6 +343,7 @@ async def bank_description_custom_text(message: Message, state: FSMContext):
         return
 
     await _save_bank_operation(
+        db,
         message,
         state,
         message.from_user.id,
@@ -7,6 +7,7 @@ from aiogram.filters import Command
 from aiogram.types import CallbackQuery, Message, InaccessibleMessage
 
 from config import config
+from database import get_pool_stats
 from keyboards import (
     get_backup_confirm_keyboard,
     get_backup_kind_keyboard,
@@ -15,6 +16,7 @@ from keyboards import (
     get_manage_menu,
 )
 from services.db_backup.engine import BackupMeta, backup_engine
+from services.send_scheduler import send_scheduler
 
 router = Router()
 
@@ -88,6 +90,34 @@ async def backup_menu_message_handler(message: Message):
     await show_backup_menu(message)
 
 
+@router.message(Command("dbstats"))
+async def db_stats_command_handler(message: Message):
+    if message.from_user is None or not _is_admin(message.from_user.id):
+        await message.answer("⛔ Sizda bu buyruqqa ruxsat yo'q.")
+        return
+
+    stats = get_pool_stats()
+    await message.answer(
+        "📊 DB pool holati\n\n"
+        f"Hajm: {stats['size']} (+{stats['overflow']} overflow)\n"
+        f"Band ulanishlar: {stats['checked_out']}\n"
+        f"Bo'sh ulanishlar: {stats['idle']}\n"
+        f"Kutish: o'rtacha {stats['wait_avg_ms']:.1f} ms, maks {stats['wait_max_ms']:.1f} ms\n"
+        f"Timeoutlar: {stats['timeouts']}\n"
+        f"Pre-ping xatolari: {stats['pre_ping_failures']}\n"
+        f"Yangi ulanishlar: {stats['connects']} | checkout: {stats['checkouts']}\n"
+        f"So'rovlar/update: o'rtacha {stats['queries_per_update_avg']:.1f}, "
+        f"maks {stats['queries_per_update_max']} ({stats['updates']} update)"
+    )
+    send_stats = send_scheduler.snapshot()
+    await message.answer(
+        "📤 Yuborish navbati\n\n"
+        f"Navbatda: {send_stats['queue_depth']} (kutayotgan: {send_stats['parked']})\n"
+        f"Yuborildi: {send_stats['sent']} | xato: {send_stats['failed']} | retry_after: {send_stats['retry_after']}\n"
+        f"Kechikish: o'rtacha {send_stats['latency_avg_ms']:.1f} ms, maks {send_stats['latency_max_ms']:.1f} ms"
+    )
+
+
 async def _render_backup_list(
     callback: CallbackQuery,
     section: str,
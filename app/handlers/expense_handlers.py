@@ -1,15 +1,16 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InaccessibleMessage
 from aiogram.fsm.context import FSMContext
-from datetime import date, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import timedelta
 
 from states import ExpenseStates
 from keyboards import *
 from services.expense_service import ExpenseService
+from services.settings_service import SettingsService
 from models import ExpenseType
 from config import config
 from utils.helpers import parse_amount, parse_date
-from database import run_db
 
 router = Router()
 
@@ -87,9 +88,9 @@ async def process_expense_category(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(ExpenseStates.waiting_for_date, F.data == "expense_date_today")
-async def expense_date_today(callback: CallbackQuery, state: FSMContext):
+async def expense_date_today(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     await callback.answer()
-    await state.update_data(date=date.today())
+    await state.update_data(date=await SettingsService.local_today(db, callback.from_user.id))
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
@@ -101,9 +102,9 @@ async def expense_date_today(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(ExpenseStates.waiting_for_date, F.data == "expense_date_yesterday")
-async def expense_date_yesterday(callback: CallbackQuery, state: FSMContext):
+async def expense_date_yesterday(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     await callback.answer()
-    await state.update_data(date=date.today() - timedelta(days=1))
+    await state.update_data(date=await SettingsService.local_today(db, callback.from_user.id) - timedelta(days=1))
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
@@ -115,14 +116,15 @@ async def expense_date_yesterday(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(ExpenseStates.waiting_for_date)
-async def process_expense_date(message: Message, state: FSMContext):
-    if message.text is None:
+async def process_expense_date(message: Message, state: FSMContext, db: AsyncSession):
+    if message.text is None or message.from_user is None:
         await message.answer(
             "❌ Xabarni to'ldirish kerak. Iltimos, sanani kiriting.",
             reply_markup=get_cancel_keyboard()
         )
         return
-    expense_date = parse_date(message.text)
+    today = await SettingsService.local_today(db, message.from_user.id)
+    expense_date = parse_date(message.text, today)
  
     if expense_date is None:
         await message.answer(
@@ -131,7 +133,7 @@ async def process_expense_date(message: Message, state: FSMContext):
         )
         return
  
-    if expense_date > date.today():
+    if expense_date > today:
         await message.answer(
             "❌ Kelajakdagi sana qabul qilinmaydi. Iltimos, bugun yoki undan oldingi sanani kiriting.",
             reply_markup=get_cancel_keyboard(),
@@ -147,7 +149,7 @@ async def process_expense_date(message: Message, state: FSMContext):
 
 
 @router.callback_query(ExpenseStates.waiting_for_description, F.data == "skip_expense_description")
-async def skip_expense_description(callback: CallbackQuery, state: FSMContext):
+async def skip_expense_description(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     await callback.answer()
     data = await state.get_data()
     await state.update_data(description=data.get("category", ""))
@@ -155,26 +157,28 @@ async def skip_expense_description(callback: CallbackQuery, state: FSMContext):
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
-    await save_expense(callback.message, state)
+    await save_expense(callback.message, state, db)
 
 @router.message(ExpenseStates.waiting_for_description)
-async def process_expense_description(message: Message, state: FSMContext):
+async def process_expense_description(message: Message, state: FSMContext, db: AsyncSession):
     await state.update_data(description=message.text)
     
-    await save_expense(message, state)
+    await save_expense(message, state, db)
 
-async def save_expense(message: Message, state: FSMContext):
+async def save_expense(message: Message, state: FSMContext, db: AsyncSession):
     data = await state.get_data()
     if message.from_user is None:
         await message.answer("❌ Foydalanuvchi ma'lumotlari topilmadi.")
         return
-    await run_db(
-        ExpenseService.add_expense,
-        user_id=data.get('user_id') or message.from_user.id,
+    user_id = data.get('user_id') or message.from_user.id
+    expense_date = data.get('date') or await SettingsService.local_today(db, user_id)
+    await ExpenseService.add_expense(
+        db,
+        user_id=user_id,
         amount=data['amount'],
         category=data['category'],
         description=data.get('description', ''),
-        expense_date=data.get('date', date.today()),
+        expense_date=expense_date,
         expense_type=ExpenseType.ONCE,
         is_future=False,
     )
@@ -184,18 +188,18 @@ async def save_expense(message: Message, state: FSMContext):
     message_text += f"📂 Kategoriya: {data['category']}\n"
     if data.get('description'):
         message_text += f"📝 Izoh: {data['description']}\n"
-    message_text += f"📅 Sana: {data.get('date', date.today()).strftime('%d.%m.%Y')}"
+    message_text += f"📅 Sana: {expense_date.strftime('%d.%m.%Y')}"
     
     await message.answer(message_text, reply_markup=get_main_menu())
     await state.clear()
 
 
 @router.message(F.text == "🧾 Oxirgi xarajatlar")
-async def manage_last_expenses_message(message: Message):
+async def manage_last_expenses_message(message: Message, db: AsyncSession):
     if message.from_user is None:
         await message.answer("❌ Foydalanuvchi ma'lumotlari topilmadi.")
         return
-    expenses = await run_db(ExpenseService.get_last_expenses, message.from_user.id, limit=30)
+    expenses = await ExpenseService.get_last_expenses(db, message.from_user.id, limit=30)
 
     if not expenses:
         await message.answer(
@@ -210,9 +214,9 @@ async def manage_last_expenses_message(message: Message):
     )
 
 @router.callback_query(F.data == "manage_last_expenses")
-async def manage_last_expenses(callback: CallbackQuery):
+async def manage_last_expenses(callback: CallbackQuery, db: AsyncSession):
     await callback.answer()
-    expenses = await run_db(ExpenseService.get_last_expenses, callback.from_user.id, limit=30)
+    expenses = await ExpenseService.get_last_expenses(db, callback.from_user.id, limit=30)
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
@@ -231,7 +235,7 @@ async def manage_last_expenses(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("delete_expense_"))
-async def delete_expense_callback(callback: CallbackQuery):
+async def delete_expense_callback(callback: CallbackQuery, db: AsyncSession):
     await callback.answer()
     if callback.data is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
@@ -242,8 +246,8 @@ async def delete_expense_callback(callback: CallbackQuery):
         await callback.answer("❌ Xarajat ID noto'g'ri formatda.", show_alert=True)
         return
 
-    deleted = await run_db(ExpenseService.delete_expense, callback.from_user.id, expense_id)
-    expenses = await run_db(ExpenseService.get_last_expenses, callback.from_user.id, limit=30)
+    deleted = await ExpenseService.delete_expense(db, callback.from_user.id, expense_id)
+    expenses = await ExpenseService.get_last_expenses(db, callback.from_user.id, limit=30)
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
@@ -1,13 +1,14 @@
 from aiogram import Router, F
 from aiogram.types import InaccessibleMessage, Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date, datetime
 
 from states import IncomeStates
 from keyboards import *
 from services.income_service import IncomeService
+from services.settings_service import SettingsService
 from utils.helpers import parse_amount, parse_date
-from database import run_db
 
 router = Router()
 
@@ -116,36 +117,36 @@ async def process_income_description(message: Message, state: FSMContext):
     )
 
 @router.callback_query(F.data == "use_today_date")
-async def use_today_date_income(callback: CallbackQuery, state: FSMContext):
+async def use_today_date_income(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     await callback.answer()
     
     # Debug: Check what data is in state
     data = await state.get_data()
     print(f"DEBUG: State data before save_income: {data}")
     
-    await save_income(callback, state, date.today())
+    await save_income(callback, state, await SettingsService.local_today(db, callback.from_user.id), db)
 
 @router.message(IncomeStates.waiting_for_date)
-async def process_income_date(message: Message, state: FSMContext):
-    if message.text is None:
+async def process_income_date(message: Message, state: FSMContext, db: AsyncSession):
+    if message.text is None or message.from_user is None:
         await message.answer("❌ Xabarni to'ldirish kerak. Iltimos, sanani kiriting:")
         return
     try:
-        income_date = parse_date(message.text)
+        income_date = parse_date(message.text, await SettingsService.local_today(db, message.from_user.id))
         if income_date is None:
             await message.answer(
                 "❌ Noto'g'ri sana formati. Iltimos, DD.MM.YYYY formatida kiriting:\n\n"
                 "Masalan: 05.01.2026"
             )
             return
-        await save_income(message, state, income_date)
+        await save_income(message, state, income_date, db)
     except ValueError:
         await message.answer(
             "❌ Noto'g'ri sana formati. Iltimos, DD.MM.YYYY formatida kiriting:\n\n"
             "Masalan: 05.01.2026"
         )
 
-async def save_income(message_or_callback, state: FSMContext, income_date: date):
+async def save_income(message_or_callback, state: FSMContext, income_date: date, db: AsyncSession):
     data = await state.get_data()
     print(f"DEBUG: save_income called with data: {data}")
     
@@ -164,8 +165,8 @@ async def save_income(message_or_callback, state: FSMContext, income_date: date)
         await state.clear()
         return
     
-    income = await run_db(
-        IncomeService.add_income,
+    income = await IncomeService.add_income(
+        db,
         user_id=message_or_callback.from_user.id,
         amount=data['amount'],
         description=data['description'],
@@ -198,12 +199,12 @@ async def save_income(message_or_callback, state: FSMContext, income_date: date)
     await state.clear()
 
 @router.callback_query(F.data == "income_summary")
-async def show_income_summary(callback: CallbackQuery):
+async def show_income_summary(callback: CallbackQuery, db: AsyncSession):
     await callback.answer()
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
-    summary = await run_db(IncomeService.get_monthly_income, callback.from_user.id)
+    summary = await IncomeService.get_monthly_income(db, callback.from_user.id)
     
     message_text = f"💵 **{summary['month_name']} oylik kirim xulosasi**\n\n"
     
@@ -1,9 +1,10 @@
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import config
-from database import run_db
 from keyboards import (
     get_main_menu,
     get_manage_menu,
@@ -14,7 +15,7 @@ router = Router()
 
 
 @router.message(lambda message: message.text and message.text.startswith('/'))
-async def command_handler(message: Message, state: FSMContext):
+async def command_handler(message: Message, state: FSMContext, db: AsyncSession):
     if message.from_user is None:
         await message.answer("❌ Foydalanuvchi ma'lumotlari topilmadi.")
         return
@@ -22,18 +23,14 @@ async def command_handler(message: Message, state: FSMContext):
         await state.clear()
         from models import User
 
-        user = await run_db(
-            lambda db: db.query(User).filter(User.telegram_id == message.from_user.id).first()
-        )
+        user = await db.scalar(select(User).where(User.telegram_id == message.from_user.id).limit(1))
         if not user:
-            await run_db(
-                lambda db: _create_user(
-                    db,
-                    User,
-                    message.from_user.id,
-                    message.from_user.username,
-                    message.from_user.full_name,
-                )
+            await _create_user(
+                db,
+                User,
+                message.from_user.id,
+                message.from_user.username,
+                message.from_user.full_name,
             )
 
         welcome_message = (
@@ -65,7 +62,7 @@ async def command_handler(message: Message, state: FSMContext):
             message=message,
             data="today_report",
         )
-        await today_report(callback)
+        await today_report(callback, db)
         return
 
     if message.text == '/report':
@@ -81,6 +78,12 @@ async def command_handler(message: Message, state: FSMContext):
         await show_backup_menu(message)
         return
 
+    if message.text == '/dbstats':
+        from handlers.db_backup_handlers import db_stats_command_handler
+
+        await db_stats_command_handler(message)
+        return
+
     if message.text == '/help':
         help_text = (
             "🆘 **Yordam**\n\n"
@@ -168,11 +171,11 @@ async def cancel_callback(callback: CallbackQuery, state: FSMContext):
     )
 
 
-def _create_user(db, user_model, telegram_id: int, username: str | None, full_name: str | None):
+async def _create_user(db, user_model, telegram_id: int, username: str | None, full_name: str | None):
     user = user_model(
         telegram_id=telegram_id,
         username=username,
         full_name=full_name,
     )
     db.add(user)
-    db.commit()
+    await db.flush()
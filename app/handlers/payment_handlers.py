@@ -1,17 +1,20 @@
 from aiogram import Router, F
 from aiogram.types import InaccessibleMessage, Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
-from datetime import date, timedelta, datetime
+from datetime import date, timedelta
 import calendar
-import pytz
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from states import PaymentStates
 from keyboards import *
+from services.outbox_service import OutboxService
 from services.payment_service import PaymentService
+from services.settings_service import SettingsService
 from models import PaymentFrequency, Payment
 from config import config
 from utils.helpers import parse_amount, parse_date
-from database import run_db
+from utils.money import Money
 
 router = Router()
 
@@ -20,11 +23,11 @@ def _is_admin(user_id: int) -> bool:
     return bool(config.ADMIN_ID) and user_id == config.ADMIN_ID
 
 
-def _format_money(amount: float) -> str:
+def _format_money(amount: Money | float) -> str:
     return f"{amount:,.0f}".replace(",", " ")
 
 
-def _build_upcoming_payments_text(totals: dict[str, float], has_30_day_items: bool) -> str:
+def _build_upcoming_payments_text(totals: dict[str, Money], has_30_day_items: bool) -> str:
     text = "🔔 Kelgusi to'lovlar\n\n"
     text += "📊 Umumiy ko'rsatkichlar:\n"
     text += f"📆 Ushbu hafta: {_format_money(totals.get('this_week_total', 0.0))} so'm\n"
@@ -130,7 +133,7 @@ async def process_payment_frequency(callback: CallbackQuery, state: FSMContext):
     await state.set_state(PaymentStates.waiting_for_amount)
 
 @router.callback_query(PaymentStates.waiting_for_weekday, F.data.startswith("weekday_"))
-async def process_payment_weekday(callback: CallbackQuery, state: FSMContext):
+async def process_payment_weekday(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     if callback.data is None:
         await callback.answer("❌ Xato: haftaning kunini tanlanmadi.", show_alert=True)
         return
@@ -144,7 +147,7 @@ async def process_payment_weekday(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Xato: haftaning kunini noto'g'ri kiritdingiz.", show_alert=True)
         return
 
-    today = date.today()
+    today = await SettingsService.local_today(db, callback.from_user.id)
     days_ahead = (weekday - today.weekday()) % 7
     if days_ahead == 0:
         days_ahead = 7
@@ -160,7 +163,7 @@ async def process_payment_weekday(callback: CallbackQuery, state: FSMContext):
     await state.set_state(PaymentStates.waiting_for_occurrences)
 
 @router.callback_query(PaymentStates.waiting_for_day_of_month, F.data.startswith("monthday_"))
-async def process_payment_day_of_month(callback: CallbackQuery, state: FSMContext):
+async def process_payment_day_of_month(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     if callback.data is None:
         await callback.answer("❌ Xato: oyning sanasini tanlanmadi.", show_alert=True)
         return
@@ -174,7 +177,7 @@ async def process_payment_day_of_month(callback: CallbackQuery, state: FSMContex
         await callback.answer("❌ Xato: oyning sanasini noto'g'ri kiritdingiz.", show_alert=True)
         return
 
-    today = date.today()
+    today = await SettingsService.local_today(db, callback.from_user.id)
     last_day_this_month = calendar.monthrange(today.year, today.month)[1]
     day_this_month = min(day_of_month, last_day_this_month)
     candidate = date(today.year, today.month, day_this_month)
@@ -282,14 +285,14 @@ async def process_payment_category(callback: CallbackQuery, state: FSMContext):
     await state.set_state(PaymentStates.waiting_for_description)
 
 @router.message(PaymentStates.waiting_for_description)
-async def process_payment_description(message: Message, state: FSMContext):
+async def process_payment_description(message: Message, state: FSMContext, db: AsyncSession):
     await state.update_data(description=message.text)
     
     data = await state.get_data()
     frequency = data.get('frequency')
 
     if frequency in (PaymentFrequency.WEEKLY, PaymentFrequency.BIWEEKLY, PaymentFrequency.MONTHLY):
-        await save_payment(message, state)
+        await save_payment(message, state, db)
         return
 
     await message.answer(
@@ -301,7 +304,7 @@ async def process_payment_description(message: Message, state: FSMContext):
 
 
 @router.callback_query(PaymentStates.waiting_for_description, F.data == "skip_payment_description")
-async def skip_payment_description(callback: CallbackQuery, state: FSMContext):
+async def skip_payment_description(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
@@ -311,7 +314,7 @@ async def skip_payment_description(callback: CallbackQuery, state: FSMContext):
 
     frequency = data.get('frequency')
     if frequency in (PaymentFrequency.WEEKLY, PaymentFrequency.BIWEEKLY, PaymentFrequency.MONTHLY):
-        await save_payment(callback.message, state)
+        await save_payment(callback.message, state, db)
         return
 
     await callback.message.edit_text(
@@ -322,15 +325,15 @@ async def skip_payment_description(callback: CallbackQuery, state: FSMContext):
     await state.set_state(PaymentStates.waiting_for_date)
 
 @router.message(PaymentStates.waiting_for_date)
-async def process_payment_date(message: Message, state: FSMContext):
-    if message.text is None:
+async def process_payment_date(message: Message, state: FSMContext, db: AsyncSession):
+    if message.text is None or message.from_user is None:
         await message.answer(
             "❌ Iltimos, to'lov sanasini kiriting (DD.MM.YYYY):\n\nMasalan: 01.02.2026\n"
             "Yoki: bugun, ertaga, kecha, +7 (7 kun keyin)",
             reply_markup=get_cancel_keyboard()
         )
         return
-    due_date = parse_date(message.text)
+    due_date = parse_date(message.text, await SettingsService.local_today(db, message.from_user.id))
     
     if due_date is None:
         await message.answer(
@@ -343,16 +346,16 @@ async def process_payment_date(message: Message, state: FSMContext):
         return
     
     await state.update_data(due_date=due_date)
-    await save_payment(message, state)
+    await save_payment(message, state, db)
 
-async def save_payment(message: Message, state: FSMContext):
+async def save_payment(message: Message, state: FSMContext, db: AsyncSession):
     data = await state.get_data()
     if message.from_user is None:
         await message.answer("❌ Foydalanuvchi ma'lumotlari noto'g'ri.")
         return
     
-    await run_db(
-        PaymentService.add_payment,
+    await PaymentService.add_payment(
+        db,
         user_id=data.get('user_id') or message.from_user.id,
         amount=data['amount'],
         category=data.get('category') or "To'lov",
@@ -386,12 +389,12 @@ async def save_payment(message: Message, state: FSMContext):
     await state.clear()
 
 @router.callback_query(F.data == "monthly_payment_summary")
-async def show_monthly_payment_summary(callback: CallbackQuery):
+async def show_monthly_payment_summary(callback: CallbackQuery, db: AsyncSession):
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
     await callback.answer()
-    summary = await run_db(PaymentService.get_monthly_payment_summary, callback.from_user.id)
+    summary = await PaymentService.get_monthly_payment_summary(db, callback.from_user.id)
     
     # Format the summary message
     message_text = f"💵 **{summary['month_name']} oylik to'lovlar rejasi**\n\n"
@@ -419,12 +422,12 @@ async def show_monthly_payment_summary(callback: CallbackQuery):
 
 
 @router.message(F.text == "🔔 Kelgusi to'lovlar")
-async def show_upcoming_payments_message(message: Message):
+async def show_upcoming_payments_message(message: Message, db: AsyncSession):
     if message.from_user is None:
         await message.answer("❌ Foydalanuvchi ma'lumotlari noto'g'ri.")
         return
-    totals = await run_db(PaymentService.get_upcoming_totals, message.from_user.id)
-    payments = await run_db(PaymentService.get_upcoming_payments, message.from_user.id, days_ahead=30)
+    totals = await PaymentService.get_upcoming_totals(db, message.from_user.id)
+    payments = await PaymentService.get_upcoming_payments(db, message.from_user.id, days_ahead=30)
     
     if not payments:
         await message.answer(
@@ -439,13 +442,13 @@ async def show_upcoming_payments_message(message: Message):
     )
 
 @router.callback_query(F.data == "upcoming_payments")
-async def show_upcoming_payments(callback: CallbackQuery):
+async def show_upcoming_payments(callback: CallbackQuery, db: AsyncSession):
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
     await callback.answer()
-    totals = await run_db(PaymentService.get_upcoming_totals, callback.from_user.id)
-    payments = await run_db(PaymentService.get_upcoming_payments, callback.from_user.id, days_ahead=30)
+    totals = await PaymentService.get_upcoming_totals(db, callback.from_user.id)
+    payments = await PaymentService.get_upcoming_payments(db, callback.from_user.id, days_ahead=30)
     
     if not payments:
         await _edit_then_show_main_menu(
@@ -461,7 +464,7 @@ async def show_upcoming_payments(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("view_upcoming_payment_"))
-async def view_upcoming_payment(callback: CallbackQuery):
+async def view_upcoming_payment(callback: CallbackQuery, db: AsyncSession):
     if callback.data is None:
         await callback.answer("❌ Xato: to'lov tanlanmadi.", show_alert=True)
         return
@@ -475,13 +478,13 @@ async def view_upcoming_payment(callback: CallbackQuery):
         await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True)
         return
 
-    payment = await run_db(_get_active_payment, payment_id, callback.from_user.id)
+    payment = await _get_active_payment(db, payment_id, callback.from_user.id)
 
     if not payment:
         await _edit_then_show_main_menu(callback, "❌ To'lov topilmadi yoki allaqachon bajarilgan.")
         return
 
-    today = _local_today()
+    today = await SettingsService.local_today(db, callback.from_user.id)
     days_left = (payment.due_date - today).days
     if days_left < 0:
         status = f"🔴 {abs(days_left)} kun o'tib ketgan"
@@ -504,11 +507,11 @@ async def view_upcoming_payment(callback: CallbackQuery):
     )
 
 @router.message(F.text == "🗓 Kelajakdagi to'lovlar")
-async def manage_future_payments_message(message: Message):
+async def manage_future_payments_message(message: Message, db: AsyncSession):
     if message.from_user is None:
         await message.answer("❌ Foydalanuvchi ma'lumotlari noto'g'ri.")
         return
-    payments = await run_db(PaymentService.get_future_payments, message.from_user.id, limit=30)
+    payments = await PaymentService.get_future_payments(db, message.from_user.id, limit=30)
 
     if not payments:
         await message.answer(
@@ -523,13 +526,13 @@ async def manage_future_payments_message(message: Message):
     )
 
 @router.callback_query(F.data == "manage_future_payments")
-async def manage_future_payments(callback: CallbackQuery):
+async def manage_future_payments(callback: CallbackQuery, db: AsyncSession):
     
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
     await callback.answer()
-    payments = await run_db(PaymentService.get_future_payments, callback.from_user.id, limit=30)
+    payments = await PaymentService.get_future_payments(db, callback.from_user.id, limit=30)
 
     if not payments:
         await _edit_then_show_manage_menu(callback, "Kelajakdagi to'lovlar topilmadi.")
@@ -542,7 +545,7 @@ async def manage_future_payments(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("view_manage_future_payment_"))
-async def view_manage_future_payment(callback: CallbackQuery, state: FSMContext):
+async def view_manage_future_payment(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     if callback.data is None:
         await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True)
         return
@@ -556,7 +559,7 @@ async def view_manage_future_payment(callback: CallbackQuery, state: FSMContext)
         await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True)
         return
 
-    payment = await run_db(_get_active_payment, payment_id, callback.from_user.id)
+    payment = await _get_active_payment(db, payment_id, callback.from_user.id)
 
     if not payment:
         await _edit_then_show_manage_menu(callback, "❌ To'lov topilmadi yoki allaqachon bajarilgan.")
@@ -567,7 +570,7 @@ async def view_manage_future_payment(callback: CallbackQuery, state: FSMContext)
         user_id=callback.from_user.id,
     )
 
-    today = _local_today()
+    today = await SettingsService.local_today(db, callback.from_user.id)
     days_left = (payment.due_date - today).days
     if days_left < 0:
         status = f"🔴 {abs(days_left)} kun o'tib ketgan"
@@ -594,20 +597,73 @@ def _is_manage_future_payments_message(text: str | None) -> bool:
     return bool(text) and "Kelajakdagi to'lovlar" in text
 
 
-def _local_today() -> date:
-    return datetime.now(pytz.timezone(config.TIMEZONE)).date()
-
-
-def _get_active_payment(db, payment_id: int, user_id: int):
-    return db.query(Payment).filter(
+async def _get_active_payment(db, payment_id: int, user_id: int):
+    return await db.scalar(select(Payment).where(
         Payment.id == payment_id,
         Payment.user_id == user_id,
         Payment.is_paid == False,
-    ).first()
+    ).limit(1))
+
+
+@router.callback_query(F.data.startswith("digest:p:"))
+async def digest_page_callback(callback: CallbackQuery, db: AsyncSession):
+    if callback.data is None:
+        await callback.answer()
+        return
+    if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
+        await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
+        return
+    try:
+        digest_id, page = (int(part) for part in callback.data.split(":")[2:])
+    except ValueError:
+        digest_id = None
+
+    payment_ids = None
+    if digest_id is not None:
+        payment_ids = await OutboxService.get_digest_payment_ids(db, digest_id, callback.message.chat.id)
+    if payment_ids is None:
+        await callback.answer("❌ Bu eslatma eskirgan.", show_alert=True)
+        return
+    await callback.answer()
+
+    payments = await PaymentService.get_digest_payments(db, callback.from_user.id, payment_ids)
+    await callback.message.edit_reply_markup(reply_markup=get_payment_digest_keyboard(payments, digest_id, page))
+
+
+@router.callback_query(F.data.startswith("digest:open:"))
+async def digest_open_payment_callback(callback: CallbackQuery, db: AsyncSession):
+    if callback.data is None:
+        await callback.answer("❌ Xato: to'lov tanlanmadi.", show_alert=True)
+        return
+    if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
+        await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
+        return
+    try:
+        payment_id = int(callback.data.rsplit(":", 1)[-1])
+    except ValueError:
+        await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True)
+        return
+
+    payment = await _get_active_payment(db, payment_id, callback.from_user.id)
+    if not payment or payment.is_skipped:
+        await callback.answer("❌ To'lov topilmadi yoki allaqachon bajarilgan.", show_alert=True)
+        return
+    await callback.answer()
+
+    # A separate message, so the digest stays in the chat for the other payments.
+    text = "🔔 **To'lov ma'lumotlari:**\n\n"
+    text += f"📝 {payment.description}\n"
+    text += f"💰 {payment.amount:,.0f} so'm\n"
+    text += f"📅 Sana: {payment.due_date.strftime('%d.%m.%Y')}\n"
+    await callback.message.answer(
+        text,
+        parse_mode="Markdown",
+        reply_markup=get_payment_reminder_actions_keyboard(payment.id),
+    )
 
 
 @router.callback_query(F.data.startswith("confirm_pay_payment_"))
-async def confirm_pay_payment_callback(callback: CallbackQuery, state: FSMContext):
+async def confirm_pay_payment_callback(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     if callback.data is None:
         await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True)
         return
@@ -621,7 +677,7 @@ async def confirm_pay_payment_callback(callback: CallbackQuery, state: FSMContex
         await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True)
         return
 
-    payment = await run_db(_get_active_payment, payment_id, callback.from_user.id)
+    payment = await _get_active_payment(db, payment_id, callback.from_user.id)
     if not payment:
         await _edit_then_show_main_menu(callback, "❌ To'lov topilmadi yoki allaqachon bajarilgan.")
         return
@@ -647,7 +703,7 @@ async def confirm_pay_payment_callback(callback: CallbackQuery, state: FSMContex
 
 
 @router.callback_query(F.data.startswith("ask_pay_amount_"))
-async def ask_pay_amount_callback(callback: CallbackQuery, state: FSMContext):
+async def ask_pay_amount_callback(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     if callback.data is None:
         await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True)
         return
@@ -661,7 +717,7 @@ async def ask_pay_amount_callback(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True)
         return
 
-    payment = await run_db(_get_active_payment, payment_id, callback.from_user.id)
+    payment = await _get_active_payment(db, payment_id, callback.from_user.id)
     if not payment:
         await _edit_then_show_main_menu(callback, "❌ To'lov topilmadi yoki allaqachon bajarilgan.")
         return
@@ -717,7 +773,7 @@ async def process_custom_pay_amount(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("do_pay_payment_custom_"))
-async def do_pay_payment_custom_callback(callback: CallbackQuery, state: FSMContext):
+async def do_pay_payment_custom_callback(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     if callback.data is None:
         await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True)
         return
@@ -739,17 +795,17 @@ async def do_pay_payment_custom_callback(callback: CallbackQuery, state: FSMCont
         await state.clear()
         return
 
-    paid = await run_db(
-        PaymentService.pay_payment_and_record_expense,
+    paid = await PaymentService.pay_payment_and_record_expense(
+        db,
         payment_id,
         callback.from_user.id,
-        paid_amount=float(paid_amount),
+        paid_amount=Money(paid_amount),
     )
 
     await state.clear()
 
     if origin_manage:
-        payments = await run_db(PaymentService.get_future_payments, callback.from_user.id, limit=30)
+        payments = await PaymentService.get_future_payments(db, callback.from_user.id, limit=30)
         if payments:
             await callback.message.edit_text(
                 "Kelajakdagi to'lovlar:\n\nTo'lovni ko'rish uchun tanlang:",
@@ -766,7 +822,7 @@ async def do_pay_payment_custom_callback(callback: CallbackQuery, state: FSMCont
 
 
 @router.callback_query(F.data.startswith("do_pay_payment_"))
-async def do_pay_payment_callback(callback: CallbackQuery, state: FSMContext):
+async def do_pay_payment_callback(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     if callback.data is None:
         await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True)
         return
@@ -783,11 +839,11 @@ async def do_pay_payment_callback(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     origin_manage = bool(data.get("pay_origin_manage", False))
 
-    paid = await run_db(PaymentService.pay_payment_and_record_expense, payment_id, callback.from_user.id)
+    paid = await PaymentService.pay_payment_and_record_expense(db, payment_id, callback.from_user.id)
 
     await state.clear()
 
-    payments = await run_db(PaymentService.get_future_payments, callback.from_user.id, limit=30)
+    payments = await PaymentService.get_future_payments(db, callback.from_user.id, limit=30)
     if origin_manage or _is_manage_future_payments_message(callback.message.text if callback.message else None):
         if not payments:
             await _edit_then_show_manage_menu(callback, "Kelajakdagi to'lovlar topilmadi.")
@@ -805,12 +861,12 @@ async def do_pay_payment_callback(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("cancel_pay_payment_"))
-async def cancel_pay_payment_callback(callback: CallbackQuery):
+async def cancel_pay_payment_callback(callback: CallbackQuery, db: AsyncSession):
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
     await callback.answer()
-    payments = await run_db(PaymentService.get_future_payments, callback.from_user.id, limit=30)
+    payments = await PaymentService.get_future_payments(db, callback.from_user.id, limit=30)
     if payments:
         await callback.message.edit_text(
             "Kelajakdagi to'lovlar:\n\nTo'lovni ko'rish uchun tanlang:",
@@ -821,7 +877,7 @@ async def cancel_pay_payment_callback(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("skip_payment_"))
-async def skip_payment_callback(callback: CallbackQuery):
+async def skip_payment_callback(callback: CallbackQuery, db: AsyncSession):
     if callback.data is None:
         await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True)
         return
@@ -835,8 +891,8 @@ async def skip_payment_callback(callback: CallbackQuery):
         await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True) 
         return
 
-    skipped = await run_db(PaymentService.skip_payment_occurrence, payment_id, callback.from_user.id)
-    payments = await run_db(PaymentService.get_future_payments, callback.from_user.id, limit=30)
+    skipped = await PaymentService.skip_payment_occurrence(db, payment_id, callback.from_user.id)
+    payments = await PaymentService.get_future_payments(db, callback.from_user.id, limit=30)
     if payments and callback.message and callback.message.text and "Kelajakdagi to'lovlar" in callback.message.text:
         await callback.message.edit_text(
             "Kelajakdagi to'lovlar (o'chirish uchun tanlang):",
@@ -850,7 +906,7 @@ async def skip_payment_callback(callback: CallbackQuery):
         await _edit_then_show_main_menu(callback, "❌ To'lov topilmadi yoki allaqachon bajarilgan.")
 
 @router.callback_query(F.data.startswith("confirm_delete_payment_"))
-async def confirm_delete_payment_callback(callback: CallbackQuery):
+async def confirm_delete_payment_callback(callback: CallbackQuery, db: AsyncSession):
     if callback.data is None:
         await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True)
         return
@@ -864,7 +920,7 @@ async def confirm_delete_payment_callback(callback: CallbackQuery):
         await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True)
         return
 
-    payment = await run_db(_get_active_payment, payment_id, callback.from_user.id)
+    payment = await _get_active_payment(db, payment_id, callback.from_user.id)
     if not payment:
         await _edit_then_show_manage_menu(callback, "❌ To'lov topilmadi yoki allaqachon bajarilgan.")
         return
@@ -881,7 +937,7 @@ async def confirm_delete_payment_callback(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("do_delete_payment_"))
-async def do_delete_payment_callback(callback: CallbackQuery):
+async def do_delete_payment_callback(callback: CallbackQuery, db: AsyncSession):
     if callback.data is None:
         await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True)
         return
@@ -895,8 +951,8 @@ async def do_delete_payment_callback(callback: CallbackQuery):
         await callback.answer("❌ Xato: noto'g'ri to'lov identifikatori.", show_alert=True)
         return
 
-    deleted = await run_db(PaymentService.delete_payment, callback.from_user.id, payment_id)
-    payments = await run_db(PaymentService.get_future_payments, callback.from_user.id, limit=30)
+    deleted = await PaymentService.delete_payment(db, callback.from_user.id, payment_id)
+    payments = await PaymentService.get_future_payments(db, callback.from_user.id, limit=30)
     if payments:
         await callback.message.edit_text(
             "Kelajakdagi to'lovlar:\n\nTo'lovni ko'rish uchun tanlang:",
@@ -909,7 +965,7 @@ async def do_delete_payment_callback(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("cancel_delete_payment_"))
-async def cancel_delete_payment_callback(callback: CallbackQuery, state: FSMContext):
+async def cancel_delete_payment_callback(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
@@ -918,7 +974,7 @@ async def cancel_delete_payment_callback(callback: CallbackQuery, state: FSMCont
     origin_manage = bool(data.get("pay_origin_manage", False))
     await state.clear()
 
-    payments = await run_db(PaymentService.get_future_payments, callback.from_user.id, limit=30)
+    payments = await PaymentService.get_future_payments(db, callback.from_user.id, limit=30)
     if origin_manage:
         if payments:
             await callback.message.edit_text(
@@ -1,15 +1,16 @@
 from aiogram import Router, F
-from aiogram.types import InaccessibleMessage, Message, CallbackQuery, FSInputFile
+from aiogram.types import InaccessibleMessage, Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date, timedelta
-import os
 
 from states import ReportStates
 from keyboards import *
+from services.report_renderer import RenderBusyError
 from services.report_service import ReportService
+from services.send_scheduler import send_scheduler
 from services.settings_service import SettingsService
 from utils.helpers import parse_date, format_report_message
-from database import run_db
 
 router = Router()
 
@@ -18,34 +19,55 @@ def _normalize_report_format(value: str | None) -> str:
     return "pdf" if (value or "").strip().lower() == "pdf" else "xlsx"
 
 
-async def _get_report_format(user_id: int) -> str:
-    settings = await run_db(SettingsService.get_or_create, user_id)
+async def _get_report_format(db: AsyncSession, user_id: int) -> str:
+    settings = await SettingsService.get_or_create(db, user_id)
     return _normalize_report_format(settings.report_format)
 
 
-async def _send_report_document(target_message: Message, report_data: dict, user_id: int, file_stem: str):
-    report_format = await _get_report_format(user_id)
-    if report_format == "pdf":
-        try:
-            filename = await ReportService.create_pdf_report(report_data, f"{file_stem}.pdf")
-            caption = "📎 Yuqoridagi hisobotning PDF fayli"
-        except Exception:
-            filename = await ReportService.create_excel_report(report_data, f"{file_stem}.xlsx")
-            caption = "📎 PDF tayyorlab bo'lmadi, Excel fayli yuborildi"
-    else:
-        filename = await ReportService.create_excel_report(report_data, f"{file_stem}.xlsx")
-        caption = "📎 Yuqoridagi hisobotning Excel fayli"
+async def _file_stem(db: AsyncSession, prefix: str, user_id: int) -> str:
+    today = await SettingsService.local_today(db, user_id)
+    return f"{prefix}_{user_id}_{today.strftime('%Y%m%d')}"
 
-    document = FSInputFile(filename)
-    await target_message.answer_document(document=document, caption=caption)
 
+async def _send_report_document(target_message: Message, report_data: dict, user_id: int, report_format: str, file_stem: str):
     try:
-        os.remove(filename)
-    except OSError:
-        pass
+        if report_format == "pdf":
+            try:
+                report = await ReportService.create_pdf_report(user_id, report_data, f"{file_stem}.pdf")
+                caption = "📎 Yuqoridagi hisobotning PDF fayli"
+            except (RenderBusyError, TimeoutError):
+                raise
+            except Exception:
+                report = await ReportService.create_excel_report(user_id, report_data, f"{file_stem}.xlsx")
+                caption = "📎 PDF tayyorlab bo'lmadi, Excel fayli yuborildi"
+        else:
+            report = await ReportService.create_excel_report(user_id, report_data, f"{file_stem}.xlsx")
+            caption = "📎 Yuqoridagi hisobotning Excel fayli"
+    except RenderBusyError:
+        await send_scheduler.send(
+            target_message.chat.id,
+            lambda: target_message.answer("⏳ Oldingi hisobot fayli hali tayyorlanmoqda, biroz kuting."),
+        )
+        return
+    except TimeoutError:
+        await send_scheduler.send(
+            target_message.chat.id,
+            lambda: target_message.answer("⌛ Hisobot fayli juda katta, tayyorlash vaqti tugadi. Qisqaroq davrni tanlang."),
+        )
+        return
+
+    document = report.as_input_file()
+    try:
+        await send_scheduler.send(
+            target_message.chat.id,
+            lambda: target_message.answer_document(document=document, caption=caption),
+        )
+    finally:
+        report.discard()
 
 
 async def _reply_with_report(
+    db: AsyncSession,
     target_message: Message,
     report_data: dict,
     user_id: int,
@@ -53,124 +75,138 @@ async def _reply_with_report(
     message_text: str | None = None,
 ):
     text = message_text or format_report_message(report_data)
-    await target_message.answer(text, parse_mode="Markdown")
-    await _send_report_document(target_message, report_data, user_id, file_stem)
+    report_format = await _get_report_format(db, user_id)
+    # Everything the file needs is read by now: end the update's transaction so
+    # rendering and uploading do not hold a pooled connection for minutes.
+    await db.commit()
+    await send_scheduler.send(
+        target_message.chat.id,
+        lambda: target_message.answer(text, parse_mode="Markdown"),
+    )
+    await _send_report_document(target_message, report_data, user_id, report_format, file_stem)
 
 @router.message(F.text == "📊 Bugun")
-async def today_report_message(message: Message):
+async def today_report_message(message: Message, db: AsyncSession):
     if message.from_user is None:
         await message.answer("❌ Foydalanuvchi ma'lumotlari topilmadi.")
         return
-    report_data = await run_db(ReportService.generate_daily_report, message.from_user.id)
+    report_data = await ReportService.generate_daily_report(db, message.from_user.id)
     await _reply_with_report(
+        db,
         message,
         report_data,
         message.from_user.id,
-        f"reports/today_{message.from_user.id}_{date.today().strftime('%Y%m%d')}",
+        await _file_stem(db, "today", message.from_user.id),
     )
 
 @router.callback_query(F.data == "today_report")
-async def today_report(callback: CallbackQuery):
+async def today_report(callback: CallbackQuery, db: AsyncSession):
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
     await callback.answer()
-    report_data = await run_db(ReportService.generate_daily_report, callback.from_user.id)
+    report_data = await ReportService.generate_daily_report(db, callback.from_user.id)
     await _reply_with_report(
+        db,
         callback.message,
         report_data,
         callback.from_user.id,
-        f"reports/today_{callback.from_user.id}_{date.today().strftime('%Y%m%d')}",
+        await _file_stem(db, "today", callback.from_user.id),
     )
 
 
 @router.callback_query(F.data == "report_today")
-async def today_report_alias(callback: CallbackQuery):
-    await today_report(callback)
+async def today_report_alias(callback: CallbackQuery, db: AsyncSession):
+    await today_report(callback, db)
 
 @router.message(F.text == "📈 Kecha")
-async def yesterday_report_message(message: Message):
+async def yesterday_report_message(message: Message, db: AsyncSession):
     if message.from_user is None:
         await message.answer("❌ Foydalanuvchi ma'lumotlari topilmadi.")
         return
-    yesterday = date.today() - timedelta(days=1)
-    report_data = await run_db(ReportService.generate_daily_report, message.from_user.id, yesterday)
+    yesterday = await SettingsService.local_today(db, message.from_user.id) - timedelta(days=1)
+    report_data = await ReportService.generate_daily_report(db, message.from_user.id, yesterday)
     await _reply_with_report(
+        db,
         message,
         report_data,
         message.from_user.id,
-        f"reports/yesterday_{message.from_user.id}_{yesterday.strftime('%Y%m%d')}",
+        f"yesterday_{message.from_user.id}_{yesterday.strftime('%Y%m%d')}",
     )
 
 @router.callback_query(F.data == "yesterday_report")
-async def yesterday_report(callback: CallbackQuery):
+async def yesterday_report(callback: CallbackQuery, db: AsyncSession):
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
     await callback.answer()
-    yesterday = date.today() - timedelta(days=1)
-    report_data = await run_db(ReportService.generate_daily_report, callback.from_user.id, yesterday)
+    yesterday = await SettingsService.local_today(db, callback.from_user.id) - timedelta(days=1)
+    report_data = await ReportService.generate_daily_report(db, callback.from_user.id, yesterday)
     await _reply_with_report(
+        db,
         callback.message,
         report_data,
         callback.from_user.id,
-        f"reports/yesterday_{callback.from_user.id}_{yesterday.strftime('%Y%m%d')}",
+        f"yesterday_{callback.from_user.id}_{yesterday.strftime('%Y%m%d')}",
     )
 
 
 @router.callback_query(F.data == "report_yesterday")
-async def yesterday_report_alias(callback: CallbackQuery):
-    await yesterday_report(callback)
+async def yesterday_report_alias(callback: CallbackQuery, db: AsyncSession):
+    await yesterday_report(callback, db)
 
 
 @router.message(F.text == "📅 Haftalik")
-async def weekly_report_message(message: Message):
+async def weekly_report_message(message: Message, db: AsyncSession):
     if message.from_user is None:
         await message.answer("❌ Foydalanuvchi ma'lumotlari topilmadi.")
         return
-    report_data = await run_db(ReportService.generate_weekly_report, message.from_user.id)
+    report_data = await ReportService.generate_weekly_report(db, message.from_user.id)
     await _reply_with_report(
+        db,
         message,
         report_data,
         message.from_user.id,
-        f"reports/weekly_{message.from_user.id}_{date.today().strftime('%Y%m%d')}",
+        await _file_stem(db, "weekly", message.from_user.id),
     )
 
 @router.callback_query(F.data == "weekly_report")
-async def weekly_report(callback: CallbackQuery):
+async def weekly_report(callback: CallbackQuery, db: AsyncSession):
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
     await callback.answer()
-    report_data = await run_db(ReportService.generate_weekly_report, callback.from_user.id)
+    report_data = await ReportService.generate_weekly_report(db, callback.from_user.id)
     await _reply_with_report(
+        db,
         callback.message,
         report_data,
         callback.from_user.id,
-        f"reports/weekly_{callback.from_user.id}_{date.today().strftime('%Y%m%d')}",
+        await _file_stem(db, "weekly", callback.from_user.id),
     )
 
 
 @router.callback_query(F.data == "report_week")
-async def weekly_report_alias(callback: CallbackQuery):
-    await weekly_report(callback)
+async def weekly_report_alias(callback: CallbackQuery, db: AsyncSession):
+    await weekly_report(callback, db)
 
 
 @router.message(F.text == "📆 Oylik")
-async def monthly_report_message(message: Message):
+async def monthly_report_message(message: Message, db: AsyncSession):
     if message.from_user is None:
         await message.answer("❌ Foydalanuvchi ma'lumotlari topilmadi.")
         return
-    report_data = await run_db(ReportService.generate_monthly_report, message.from_user.id)
+    report_data = await ReportService.generate_monthly_report(db, message.from_user.id)
     await _reply_with_report(
+        db,
         message,
         report_data,
         message.from_user.id,
-        f"reports/monthly_{message.from_user.id}_{date.today().strftime('%Y%m%d')}",
+        await _file_stem(db, "monthly", message.from_user.id),
     )
 
 @router.callback_query(F.data == "monthly_report")
-async def monthly_report(callback: CallbackQuery):
+async def monthly_report(callback: CallbackQuery, db: AsyncSession):
     if callback.from_user is None:
         await callback.answer("❌ Foydalanuvchi ma'lumotlari topilmadi.", show_alert=True)
         return
@@ -178,26 +214,27 @@ async def monthly_report(callback: CallbackQuery):
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
     await callback.answer()
-    report_data = await run_db(ReportService.generate_monthly_report, callback.from_user.id)
+    report_data = await ReportService.generate_monthly_report(db, callback.from_user.id)
     await _reply_with_report(
+        db,
         callback.message,
         report_data,
         callback.from_user.id,
-        f"reports/monthly_{callback.from_user.id}_{date.today().strftime('%Y%m%d')}",
+        await _file_stem(db, "monthly", callback.from_user.id),
     )
 
 
 @router.callback_query(F.data == "report_month")
-async def monthly_report_alias(callback: CallbackQuery):
-    await monthly_report(callback)
+async def monthly_report_alias(callback: CallbackQuery, db: AsyncSession):
+    await monthly_report(callback, db)
 
 
 @router.message(F.text == "🎯 Yillik")
-async def yearly_report_message(message: Message):
+async def yearly_report_message(message: Message, db: AsyncSession):
     if message.from_user is None:
         await message.answer("❌ Foydalanuvchi ma'lumotlari topilmadi.")
         return
-    report_data = await run_db(ReportService.generate_yearly_report, message.from_user.id)
+    report_data = await ReportService.generate_yearly_report(db, message.from_user.id)
     
     message_text = format_report_message(report_data)
     
@@ -220,15 +257,16 @@ async def yearly_report_message(message: Message):
                 message_text += f"• {date(2024, month, 1).strftime('%B')}: {data:,.0f} so'm\n"
     
     await _reply_with_report(
+        db,
         message,
         report_data,
         message.from_user.id,
-        f"reports/yearly_{message.from_user.id}_{date.today().strftime('%Y%m%d')}",
+        await _file_stem(db, "yearly", message.from_user.id),
         message_text=message_text,
     )
 
 @router.callback_query(F.data == "yearly_report")
-async def yearly_report(callback: CallbackQuery):
+async def yearly_report(callback: CallbackQuery, db: AsyncSession):
     if callback.from_user is None:
         await callback.answer("❌ Foydalanuvchi ma'lumotlari topilmadi.", show_alert=True)
         return
@@ -236,7 +274,7 @@ async def yearly_report(callback: CallbackQuery):
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
     await callback.answer()
-    report_data = await run_db(ReportService.generate_yearly_report, callback.from_user.id)
+    report_data = await ReportService.generate_yearly_report(db, callback.from_user.id)
     
     message = format_report_message(report_data)
     
@@ -261,17 +299,18 @@ async def yearly_report(callback: CallbackQuery):
                     message += f"• {month_name}: {data:,.0f} so'm\n"
     
     await _reply_with_report(
+        db,
         callback.message,
         report_data,
         callback.from_user.id,
-        f"reports/yearly_{callback.from_user.id}_{date.today().strftime('%Y%m%d')}",
+        await _file_stem(db, "yearly", callback.from_user.id),
         message_text=message,
     )
 
 
 @router.callback_query(F.data == "report_year")
-async def yearly_report_alias(callback: CallbackQuery):
-    await yearly_report(callback)
+async def yearly_report_alias(callback: CallbackQuery, db: AsyncSession):
+    await yearly_report(callback, db)
 
 
 @router.message(F.text == "📊 Ixtiyoriy")
@@ -301,11 +340,11 @@ async def custom_report_start(callback: CallbackQuery, state: FSMContext):
     await state.set_state(ReportStates.waiting_for_start_date)
 
 @router.message(ReportStates.waiting_for_start_date)
-async def process_start_date(message: Message, state: FSMContext):
-    if message.text is None:
+async def process_start_date(message: Message, state: FSMContext, db: AsyncSession):
+    if message.text is None or message.from_user is None:
         await message.answer("❌ Xabar matni topilmadi.")
         return
-    start_date = parse_date(message.text)
+    start_date = parse_date(message.text, await SettingsService.local_today(db, message.from_user.id))
     
     if start_date is None:
         await message.answer(
@@ -322,14 +361,14 @@ async def process_start_date(message: Message, state: FSMContext):
     await state.set_state(ReportStates.waiting_for_end_date)
 
 @router.message(ReportStates.waiting_for_end_date)
-async def process_end_date(message: Message, state: FSMContext):
+async def process_end_date(message: Message, state: FSMContext, db: AsyncSession):
     if message.from_user is None:
         await message.answer("❌ Foydalanuvchi ma'lumotlari topilmadi.")
         return
     if message.text is None:
         await message.answer("❌ Xabar matni topilmadi.")
         return
-    end_date = parse_date(message.text)
+    end_date = parse_date(message.text, await SettingsService.local_today(db, message.from_user.id))
     
     if end_date is None:
         await message.answer(
@@ -351,17 +390,18 @@ async def process_end_date(message: Message, state: FSMContext):
         )
         return
     
-    report_data = await run_db(
-        ReportService.generate_custom_report,
+    report_data = await ReportService.generate_custom_report(
+        db,
         message.from_user.id,
         start_date,
         end_date,
     )
     await _reply_with_report(
+        db,
         message,
         report_data,
         message.from_user.id,
-        f"reports/custom_{message.from_user.id}_{date.today().strftime('%Y%m%d')}",
+        await _file_stem(db, "custom", message.from_user.id),
     )
     
     await state.clear()
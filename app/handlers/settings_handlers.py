@@ -4,15 +4,16 @@ import pytz
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, InaccessibleMessage, Message
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import run_db
 from keyboards import (
     get_main_menu,
+    get_overdue_cooldown_keyboard,
     get_report_format_keyboard,
     get_settings_keyboard,
     get_timezone_keyboard,
 )
-from services.settings_service import SettingsService
+from services.settings_service import OVERDUE_COOLDOWN_HOURS, SettingsService
 from states import SettingsStates
 
 router = Router()
@@ -38,12 +39,14 @@ def _render_settings_text(settings) -> str:
         f"📁 Hisobot formati: **{report_format}**\n"
         f"🔔 Kunlik eslatma: {_status_text(bool(settings.daily_reminder_enabled))}\n"
         f"🚨 Overdue eslatma: {_status_text(bool(settings.overdue_reminder_enabled))}\n"
-        f"📊 Kunlik hisobot: {_status_text(bool(settings.daily_summary_enabled))}"
+        f"⏱ Overdue oralig'i: {settings.overdue_cooldown_hours} soat\n"
+        f"📊 Kunlik hisobot: {_status_text(bool(settings.daily_summary_enabled))}\n"
+        f"📬 Jamlangan eslatma: {_status_text(bool(settings.digest_enabled))}"
     )
 
 
-async def _show_settings(message: Message, user_id: int) -> None:
-    settings = await run_db(SettingsService.get_or_create, user_id) # pyright: ignore[reportArgumentType]
+async def _show_settings(db: AsyncSession, message: Message, user_id: int) -> None:
+    settings = await SettingsService.get_or_create(db, user_id) # pyright: ignore[reportArgumentType]
     await message.answer(
         _render_settings_text(settings),
         parse_mode="Markdown",
@@ -52,12 +55,14 @@ async def _show_settings(message: Message, user_id: int) -> None:
             bool(settings.daily_reminder_enabled),
             bool(settings.overdue_reminder_enabled),
             bool(settings.daily_summary_enabled),
+            bool(settings.digest_enabled),
+            settings.overdue_cooldown_hours,
         ),
     )
 
 
-async def _edit_settings(callback: CallbackQuery, user_id: int) -> None:
-    settings = await run_db(SettingsService.get_or_create, user_id) # pyright: ignore[reportArgumentType]
+async def _edit_settings(db: AsyncSession, callback: CallbackQuery, user_id: int) -> None:
+    settings = await SettingsService.get_or_create(db, user_id) # pyright: ignore[reportArgumentType]
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
         return
@@ -70,14 +75,16 @@ async def _edit_settings(callback: CallbackQuery, user_id: int) -> None:
             bool(settings.daily_reminder_enabled),
             bool(settings.overdue_reminder_enabled),
             bool(settings.daily_summary_enabled),
+            bool(settings.digest_enabled),
+            settings.overdue_cooldown_hours,
         ),
     )
 
 
 @router.callback_query(F.data == "settings:format")
-async def settings_report_format_callback(callback: CallbackQuery):
+async def settings_report_format_callback(callback: CallbackQuery, db: AsyncSession):
     await callback.answer()
-    settings = await run_db(SettingsService.get_or_create, callback.from_user.id) # pyright: ignore[reportArgumentType]
+    settings = await SettingsService.get_or_create(db, callback.from_user.id) # pyright: ignore[reportArgumentType]
 
     if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
         await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
@@ -90,31 +97,60 @@ async def settings_report_format_callback(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("settings:fmt:set:"))
-async def settings_report_format_set_callback(callback: CallbackQuery):
+async def settings_report_format_set_callback(callback: CallbackQuery, db: AsyncSession):
     await callback.answer()
     if callback.data is None:
         return
 
     format_value = callback.data.rsplit(":", 1)[-1]
-    await run_db(SettingsService.set_report_format, callback.from_user.id, format_value) # pyright: ignore[reportArgumentType]
-    await _edit_settings(callback, callback.from_user.id)
+    await SettingsService.set_report_format(db, callback.from_user.id, format_value) # pyright: ignore[reportArgumentType]
+    await _edit_settings(db, callback, callback.from_user.id)
+
+
+@router.callback_query(F.data == "settings:cooldown")
+async def settings_overdue_cooldown_callback(callback: CallbackQuery, db: AsyncSession):
+    await callback.answer()
+    settings = await SettingsService.get_or_create(db, callback.from_user.id) # pyright: ignore[reportArgumentType]
+
+    if isinstance(callback.message, InaccessibleMessage) or callback.message is None:
+        await callback.answer("❌ Xabarni ko'rish mumkin emas.", show_alert=True)
+        return
+
+    await callback.message.edit_text(
+        "⏱ Muddati o'tgan to'lov haqida qanchada bir eslatilsin?",
+        reply_markup=get_overdue_cooldown_keyboard(settings.overdue_cooldown_hours, OVERDUE_COOLDOWN_HOURS),
+    )
+
+
+@router.callback_query(F.data.startswith("settings:cd:set:"))
+async def settings_overdue_cooldown_set_callback(callback: CallbackQuery, db: AsyncSession):
+    await callback.answer()
+    if callback.data is None:
+        return
+
+    try:
+        hours = int(callback.data.rsplit(":", 1)[-1])
+    except ValueError:
+        return
+    await SettingsService.set_overdue_cooldown(db, callback.from_user.id, hours) # pyright: ignore[reportArgumentType]
+    await _edit_settings(db, callback, callback.from_user.id)
 
 
 @router.message(F.text == "⚙️ Sozlamalar")
-async def settings_message_handler(message: Message, state: FSMContext):
+async def settings_message_handler(message: Message, state: FSMContext, db: AsyncSession):
     if message.from_user is None:
         await message.answer("❌ Foydalanuvchi ma'lumotlari topilmadi.")
         return
 
     await state.clear()
-    await _show_settings(message, message.from_user.id)
+    await _show_settings(db, message, message.from_user.id)
 
 
 @router.callback_query(F.data == "settings:menu")
-async def settings_menu_callback(callback: CallbackQuery, state: FSMContext):
+async def settings_menu_callback(callback: CallbackQuery, state: FSMContext, db: AsyncSession):
     await callback.answer()
     await state.clear()
-    await _edit_settings(callback, callback.from_user.id)
+    await _edit_settings(db, callback, callback.from_user.id)
 
 
 @router.callback_query(F.data == "settings:close")
@@ -130,24 +166,31 @@ async def settings_close_callback(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "settings:toggle:daily")
-async def settings_toggle_daily_callback(callback: CallbackQuery):
+async def settings_toggle_daily_callback(callback: CallbackQuery, db: AsyncSession):
     await callback.answer()
-    await run_db(SettingsService.toggle_daily_reminder, callback.from_user.id) # pyright: ignore[reportArgumentType]
-    await _edit_settings(callback, callback.from_user.id)
+    await SettingsService.toggle_daily_reminder(db, callback.from_user.id) # pyright: ignore[reportArgumentType]
+    await _edit_settings(db, callback, callback.from_user.id)
 
 
 @router.callback_query(F.data == "settings:toggle:overdue")
-async def settings_toggle_overdue_callback(callback: CallbackQuery):
+async def settings_toggle_overdue_callback(callback: CallbackQuery, db: AsyncSession):
     await callback.answer()
-    await run_db(SettingsService.toggle_overdue_reminder, callback.from_user.id) # pyright: ignore[reportArgumentType]
-    await _edit_settings(callback, callback.from_user.id)
+    await SettingsService.toggle_overdue_reminder(db, callback.from_user.id) # pyright: ignore[reportArgumentType]
+    await _edit_settings(db, callback, callback.from_user.id)
 
 
 @router.callback_query(F.data == "settings:toggle:summary")
-async def settings_toggle_summary_callback(callback: CallbackQuery):
+async def settings_toggle_summary_callback(callback: CallbackQuery, db: AsyncSession):
+    await callback.answer()
+    await SettingsService.toggle_daily_summary(db, callback.from_user.id) # pyright: ignore[reportArgumentType]
+    await _edit_settings(db, callback, callback.from_user.id)
+
+
+@router.callback_query(F.data == "settings:toggle:digest")
+async def settings_toggle_digest_callback(callback: CallbackQuery, db: AsyncSession):
     await callback.answer()
-    await run_db(SettingsService.toggle_daily_summary, callback.from_user.id) # pyright: ignore[reportArgumentType]
-    await _edit_settings(callback, callback.from_user.id)
+    await SettingsService.toggle_digest(db, callback.from_user.id) # pyright: ignore[reportArgumentType]
+    await _edit_settings(db, callback, callback.from_user.id)
 
 
 @router.callback_query(F.data == "settings:timezone")
@@ -165,7 +208,7 @@ async def settings_timezone_callback(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("settings:tz:set:"))
-async def settings_timezone_set_callback(callback: CallbackQuery):
+async def settings_timezone_set_callback(callback: CallbackQuery, db: AsyncSession):
     await callback.answer()
     if callback.data is None:
         return
@@ -176,8 +219,8 @@ async def settings_timezone_set_callback(callback: CallbackQuery):
         await callback.answer("❌ Noma'lum vaqt zonasi", show_alert=True)
         return
 
-    await run_db(SettingsService.set_timezone, callback.from_user.id, timezone_name) # pyright: ignore[reportArgumentType]
-    await _edit_settings(callback, callback.from_user.id)
+    await SettingsService.set_timezone(db, callback.from_user.id, timezone_name) # pyright: ignore[reportArgumentType]
+    await _edit_settings(db, callback, callback.from_user.id)
 
 
 @router.callback_query(F.data == "settings:tz:custom")
@@ -197,7 +240,7 @@ async def settings_timezone_custom_callback(callback: CallbackQuery, state: FSMC
 
 
 @router.message(SettingsStates.waiting_for_timezone)
-async def settings_timezone_input_handler(message: Message, state: FSMContext):
+async def settings_timezone_input_handler(message: Message, state: FSMContext, db: AsyncSession):
     if message.from_user is None:
         await message.answer("❌ Foydalanuvchi ma'lumotlari topilmadi.")
         return
@@ -216,6 +259,6 @@ async def settings_timezone_input_handler(message: Message, state: FSMContext):
         )
         return
 
-    await run_db(SettingsService.set_timezone, message.from_user.id, timezone_name) # pyright: ignore[reportArgumentType]
+    await SettingsService.set_timezone(db, message.from_user.id, timezone_name) # pyright: ignore[reportArgumentType]
     await state.clear()
-    await _show_settings(message, message.from_user.id)
+    await _show_settings(db, message, message.from_user.id)
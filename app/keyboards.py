@@ -378,6 +378,37 @@ def get_payment_reminder_actions_keyboard(payment_id: int):
     )
     return builder.as_markup()
 
+DIGEST_PAGE_SIZE = 5
+
+
+def get_payment_digest_keyboard(payments: list, digest_id: int, page: int = 0):
+    """One button per payment of reminder digest `digest_id`, DIGEST_PAGE_SIZE per page."""
+    total_pages = max(1, (len(payments) + DIGEST_PAGE_SIZE - 1) // DIGEST_PAGE_SIZE)
+    page = max(0, min(page, total_pages - 1))
+
+    builder = InlineKeyboardBuilder()
+    for payment in payments[page * DIGEST_PAGE_SIZE:(page + 1) * DIGEST_PAGE_SIZE]:
+        description = (payment.description or payment.category or "To'lov")[:24]
+        builder.row(
+            InlineKeyboardButton(
+                text=f"{description} — {payment.amount:,.0f} so'm",
+                callback_data=f"digest:open:{payment.id}",
+            )
+        )
+
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(
+            InlineKeyboardButton(text="⬅️ Oldingi", callback_data=f"digest:p:{digest_id}:{page - 1}")
+        )
+    if page + 1 < total_pages:
+        nav_buttons.append(
+            InlineKeyboardButton(text="Keyingi ➡️", callback_data=f"digest:p:{digest_id}:{page + 1}")
+        )
+    if nav_buttons:
+        builder.row(*nav_buttons)
+    return builder.as_markup()
+
 def get_confirm_pay_payment_keyboard(payment_id: int):
     builder = InlineKeyboardBuilder()
     builder.row(
@@ -556,11 +587,14 @@ def get_settings_keyboard(
     daily_reminder_enabled: bool,
     overdue_reminder_enabled: bool,
     daily_summary_enabled: bool,
+    digest_enabled: bool = False,
+    overdue_cooldown_hours: int = 8,
 ):
     normalized_format = "PDF" if (report_format or "").lower() == "pdf" else "XLSX"
     daily_status = "✅" if daily_reminder_enabled else "❌"
     overdue_status = "✅" if overdue_reminder_enabled else "❌"
     summary_status = "✅" if daily_summary_enabled else "❌"
+    digest_status = "✅" if digest_enabled else "❌"
 
     builder = InlineKeyboardBuilder()
     builder.row(
@@ -584,12 +618,24 @@ def get_settings_keyboard(
             callback_data="settings:toggle:overdue",
         )
     )
+    builder.row(
+        InlineKeyboardButton(
+            text=f"⏱ Overdue oralig'i: {overdue_cooldown_hours} soat",
+            callback_data="settings:cooldown",
+        )
+    )
     builder.row(
         InlineKeyboardButton(
             text=f"📊 Kunlik hisobot: {summary_status}",
             callback_data="settings:toggle:summary",
         )
     )
+    builder.row(
+        InlineKeyboardButton(
+            text=f"📬 Jamlangan eslatma: {digest_status}",
+            callback_data="settings:toggle:digest",
+        )
+    )
     builder.row(
         InlineKeyboardButton(text="🔄 Yangilash", callback_data="settings:menu"),
         InlineKeyboardButton(text="🔙 Ortga", callback_data="settings:close"),
@@ -619,6 +665,21 @@ def get_report_format_keyboard(current_format: str):
     return builder.as_markup()
 
 
+def get_overdue_cooldown_keyboard(current_hours: int, choices):
+    builder = InlineKeyboardBuilder()
+    builder.row(*(
+        InlineKeyboardButton(
+            text=f"{'✅ ' if hours == current_hours else ''}{hours} soat",
+            callback_data=f"settings:cd:set:{hours}",
+        )
+        for hours in choices
+    ))
+    builder.row(
+        InlineKeyboardButton(text="🔙 Sozlamalar", callback_data="settings:menu"),
+    )
+    return builder.as_markup()
+
+
 def get_timezone_keyboard():
     builder = InlineKeyboardBuilder()
     builder.row(
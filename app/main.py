@@ -3,12 +3,14 @@ import logging
 
 import pytz
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import BotCommand, BotCommandScopeChat
 from apscheduler.schedulers.asyncio import AsyncIOScheduler  # type: ignore
 
 from config import config
-from database import run_db
+from database import get_pool_stats, run_db
 from handlers import (
     balance_handlers,
     bank_notification_handlers,
@@ -21,8 +23,15 @@ from handlers import (
     settings_handlers,
 )
 from services.db_backup.scheduler import setup_backup_scheduler
-from services.reminder_service import ReminderService
-from middlewares import SafeDeleteHandledMessagesMiddleware
+from services.occurrence_service import OccurrenceService
+from services.outbox_service import OutboxService
+from services.payment_service import PaymentService
+from services.reminder_service import SLOT_MINUTES, ReminderService
+from services.rollup_service import RollupService
+from services.leader_election import leader_election, leader_only
+from services.report_renderer import report_renderer
+from services.send_scheduler import send_scheduler
+from middlewares import CommitBeforeRequestMiddleware, DbSessionMiddleware, SafeDeleteHandledMessagesMiddleware
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -40,9 +49,16 @@ routers = [
 
 
 async def main():
-    bot = Bot(token=config.BOT_TOKEN)
+    session = None
+    if config.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.TELEGRAM_API_URL))
+    bot = Bot(token=config.BOT_TOKEN, session=session)
+    bot.session.middleware(CommitBeforeRequestMiddleware())
+    send_scheduler.start()
+    report_renderer.start()
     storage = MemoryStorage()
     dp = Dispatcher(storage=storage)
+    dp.update.outer_middleware(DbSessionMiddleware())
     dp.message.outer_middleware(SafeDeleteHandledMessagesMiddleware())
 
     for router in routers:
@@ -60,50 +76,91 @@ async def main():
     if config.ADMIN_ID:
         admin_commands = user_commands.copy()
         admin_commands.append(BotCommand(command="backup", description="DB backup (admin)"))
+        admin_commands.append(BotCommand(command="dbstats", description="DB pool holati (admin)"))
         await bot.set_my_commands(
             admin_commands,
             scope=BotCommandScopeChat(chat_id=config.ADMIN_ID),
         )
 
+    # Before the scheduler starts, so startup singleton jobs see the result.
+    await leader_election.start()
     scheduler = AsyncIOScheduler(timezone=pytz.timezone(config.TIMEZONE))
     setup_backup_scheduler(scheduler)
 
-    scheduler.add_job(send_daily_reminders, 'cron', hour=9, minute=0, args=[bot])
-    scheduler.add_job(send_overdue_reminders, 'cron', hour=9, minute=0, args=[bot])
-    scheduler.add_job(send_overdue_reminders, 'cron', hour=18, minute=0, args=[bot])
-    scheduler.add_job(send_daily_summary, 'cron', hour=23, minute=0, args=[bot])
-    scheduler.add_job(check_reminders, 'interval', hours=1, args=[bot])
+    # Each user is reminded at 09:00/18:00/23:00 in their own timezone. A tick
+    # that runs late still runs (ticks catch up on missed slots anyway), and a
+    # backlog of missed runs collapses into one.
+    scheduler.add_job(
+        send_local_reminders,
+        'cron',
+        minute='0,15,30,45',
+        timezone=pytz.utc,
+        args=[bot],
+        misfire_grace_time=SLOT_MINUTES * 60,
+        coalesce=True,
+        max_instances=1,
+    )
+    # Delivers what the ticks queue, plus retries and rows left behind by a crashed drain.
+    scheduler.add_job(drain_reminder_outbox, 'interval', minutes=1, args=[bot], coalesce=True)
+    scheduler.add_job(roll_forward_recurring_payments, 'cron', hour=3, minute=30)
+    scheduler.add_job(refresh_payment_occurrences, 'cron', hour=3, minute=45)
+    # Fill payment_occurrences right away after a deploy/migration as well.
+    scheduler.add_job(refresh_payment_occurrences, 'date')
+    scheduler.add_job(check_rollup_consistency, 'cron', hour=4, minute=30)
+    scheduler.add_job(prune_reminder_outbox, 'cron', hour=4, minute=45)
     scheduler.start()
 
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await send_scheduler.stop()
+        await report_renderer.stop()
+        await leader_election.stop()
 
 
-async def send_daily_reminders(bot: Bot):
-    from models import User
+async def send_local_reminders(bot: Bot):
+    await ReminderService.run_local_schedule(bot)
+    logging.debug("DB pool after local reminders: %s", get_pool_stats())
+    logging.debug("Send queue after local reminders: %s", send_scheduler.snapshot())
 
-    users = await run_db(lambda db: db.query(User).all())
-    for user in users:
-        await ReminderService.send_daily_reminders(user.telegram_id, bot)
 
+async def drain_reminder_outbox(bot: Bot):
+    sent = await ReminderService.drain_outbox(bot)
+    if sent:
+        logging.info("Delivered %s reminders from the outbox", sent)
 
-async def send_daily_summary(bot: Bot):
-    from models import User
 
-    users = await run_db(lambda db: db.query(User).all())
-    for user in users:
-        await ReminderService.send_daily_summary(user.telegram_id, bot)
+@leader_only
+async def prune_reminder_outbox():
+    removed = await run_db(OutboxService.prune)
+    logging.info("Pruned %s reminder_outbox/reminder_digests rows", removed)
 
 
-async def check_reminders(bot: Bot):
-    await ReminderService.check_and_send_reminders(bot)
+@leader_only
+async def roll_forward_recurring_payments():
+    total = 0
+    after_id = 0
+    while after_id is not None:
+        updated, after_id = await run_db(PaymentService.roll_forward_batch, after_id)
+        total += updated
+    logging.info("Rolled forward %s recurring payments", total)
 
 
-async def send_overdue_reminders(bot: Bot):
-    from models import User
+@leader_only
+async def refresh_payment_occurrences():
+    total = 0
+    after_id = 0
+    while after_id is not None:
+        written, after_id = await run_db(OccurrenceService.refresh_batch, after_id)
+        total += written
+    logging.info("Refreshed payment occurrences: %s rows", total)
 
-    users = await run_db(lambda db: db.query(User).all())
-    for user in users:
-        await ReminderService.send_overdue_reminders(user.telegram_id, bot)
+
+@leader_only
+async def check_rollup_consistency():
+    mismatches = await run_db(RollupService.check_consistency)
+    for mismatch in mismatches:
+        logging.warning("daily_totals mismatch: %s", mismatch)
 
 
 if __name__ == "__main__":
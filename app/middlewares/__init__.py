@@ -1,3 +1,4 @@
+from .db_session import CommitBeforeRequestMiddleware, DbSessionMiddleware
 from .safe_delete import SafeDeleteHandledMessagesMiddleware
 
-__all__ = ["SafeDeleteHandledMessagesMiddleware"]
+__all__ = ["CommitBeforeRequestMiddleware", "DbSessionMiddleware", "SafeDeleteHandledMessagesMiddleware"]
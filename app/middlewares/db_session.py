@@ -0,0 +1,71 @@
+import logging
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from db_metrics import begin_update_queries, end_update_queries
+
+_update_session: ContextVar[AsyncSession | None] = ContextVar("update_session", default=None)
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Open one AsyncSession per update and pass it to handlers as `db`. It is
+    committed before each Bot API call the handler makes (see
+    CommitBeforeRequestMiddleware) and once more at the end.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        token = begin_update_queries()
+        try:
+            async with AsyncSessionLocal() as db:
+                data["db"] = db
+                session_token = _update_session.set(db)
+                try:
+                    result = await handler(event, data)
+                except Exception:
+                    await db.rollback()
+                    raise
+                finally:
+                    _update_session.reset(session_token)
+                await db.commit()
+                return result
+        finally:
+            queries = end_update_queries(token)
+            logging.getLogger(__name__).debug("Update handled with %s queries", queries)
+
+
+class CommitBeforeRequestMiddleware(BaseRequestMiddleware):
+    """
+    Commit the current update's session before a Bot API request goes out, so
+    a reply like "qo'shildi" is only sent once the write is stored and no
+    transaction stays open while Telegram answers. If the commit fails the
+    session is rolled back and the request is not sent.
+    """
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        db = _update_session.get()
+        if db is not None and db.in_transaction():
+            try:
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        return await make_request(bot, method)
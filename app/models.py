@@ -1,9 +1,11 @@
 from datetime import datetime, date as datetime_date
 import enum
 
-from sqlalchemy import BigInteger, Float, String, Boolean, Text, Date, DateTime, Enum, Integer
+from sqlalchemy import BigInteger, String, Boolean, Text, Date, DateTime, Enum, Index, Integer, PrimaryKeyConstraint, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Mapped, mapped_column
 from database import Base
+from utils.money import Money, MoneyType
 
 
 def utc_now_naive() -> datetime:
@@ -38,6 +40,8 @@ class User(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=utc_now_naive
     )
+    # Local date of the last daily summary claimed for this user.
+    daily_summary_sent_on: Mapped[datetime_date | None] = mapped_column(Date)
 
 
 class UserSettings(Base):
@@ -50,6 +54,10 @@ class UserSettings(Base):
     daily_reminder_enabled: Mapped[bool] = mapped_column(Boolean, default=True)
     overdue_reminder_enabled: Mapped[bool] = mapped_column(Boolean, default=True)
     daily_summary_enabled: Mapped[bool] = mapped_column(Boolean, default=True)
+    # One combined message per reminder run instead of one message per payment.
+    digest_enabled: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Minimum hours between two reminders about the same overdue payment.
+    overdue_cooldown_hours: Mapped[int] = mapped_column(Integer, default=8)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=utc_now_naive)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime,
@@ -60,10 +68,18 @@ class UserSettings(Base):
 
 class Expense(Base):
     __tablename__ = "expenses"
+    __table_args__ = (
+        Index(
+            "ix_expenses_user_id_date_actual",
+            "user_id",
+            "date",
+            postgresql_where=text("is_future = false"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(BigInteger, index=True)
-    amount: Mapped[float] = mapped_column(Float, nullable=False)
+    amount: Mapped[Money] = mapped_column(MoneyType, nullable=False)
     category: Mapped[str | None] = mapped_column(String(100))
     description: Mapped[str | None] = mapped_column(Text)
     date: Mapped[datetime_date] = mapped_column(Date, nullable=False)
@@ -83,10 +99,18 @@ class Expense(Base):
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        Index(
+            "ix_payments_user_id_due_date_open",
+            "user_id",
+            "due_date",
+            postgresql_where=text("NOT is_paid AND NOT is_skipped"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(BigInteger, index=True)
-    amount: Mapped[float] = mapped_column(Float, nullable=False)
+    amount: Mapped[Money] = mapped_column(MoneyType, nullable=False)
     category: Mapped[str | None] = mapped_column(String(100))
     description: Mapped[str | None] = mapped_column(Text)
     due_date: Mapped[datetime_date] = mapped_column(Date, nullable=False)
@@ -108,13 +132,90 @@ class Payment(Base):
 
 class Income(Base):
     __tablename__ = "income"
+    __table_args__ = (
+        Index("ix_income_user_id_date", "user_id", "date"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(BigInteger, index=True)
-    amount: Mapped[float] = mapped_column(Float, nullable=False)
+    amount: Mapped[Money] = mapped_column(MoneyType, nullable=False)
     description: Mapped[str] = mapped_column(String(200))
     category: Mapped[str] = mapped_column(String(50), default="Kirim")
     date: Mapped[datetime_date] = mapped_column(Date, nullable=False)
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=utc_now_naive
     )
+
+
+class DailyTotal(Base):
+    """Per-day rollup of actual expenses and income, kept in step by the services."""
+
+    __tablename__ = "daily_totals"
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "day", "kind", "category"),
+        Index("ix_daily_totals_user_id_kind_day", "user_id", "kind", "day"),
+    )
+
+    user_id: Mapped[int] = mapped_column(BigInteger)
+    day: Mapped[datetime_date] = mapped_column(Date)
+    kind: Mapped[str] = mapped_column(String(16))
+    category: Mapped[str] = mapped_column(String(100), default="")
+    amount_sum: Mapped[Money] = mapped_column(MoneyType, nullable=False, default=0)
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class PaymentOccurrence(Base):
+    """Upcoming occurrences of open payments, expanded up to a rolling horizon."""
+
+    __tablename__ = "payment_occurrences"
+    __table_args__ = (
+        PrimaryKeyConstraint("payment_id", "due_date"),
+        Index("ix_payment_occurrences_user_id_due_date", "user_id", "due_date"),
+        Index("ix_payment_occurrences_due_date", "due_date"),
+    )
+
+    payment_id: Mapped[int] = mapped_column(Integer)
+    due_date: Mapped[datetime_date] = mapped_column(Date)
+    user_id: Mapped[int] = mapped_column(BigInteger)
+    amount: Mapped[Money] = mapped_column(MoneyType, nullable=False)
+
+
+class ReminderOutbox(Base):
+    """Payment reminders waiting for delivery; one row per payment, reminder kind and due date."""
+
+    __tablename__ = "reminder_outbox"
+    __table_args__ = (
+        UniqueConstraint("payment_id", "kind", "due_date", name="uq_reminder_outbox_payment_id_kind_due_date"),
+        Index(
+            "ix_reminder_outbox_pending_next_attempt_at",
+            "next_attempt_at",
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    payment_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    kind: Mapped[str] = mapped_column(String(32), nullable=False)
+    due_date: Mapped[datetime_date] = mapped_column(Date, nullable=False)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[str] = mapped_column(String(16), default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=utc_now_naive)
+    last_error: Mapped[str | None] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utc_now_naive)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+
+class ReminderDigest(Base):
+    """The payments listed by a digest message, in display order, for paging its keyboard."""
+
+    __tablename__ = "reminder_digests"
+    __table_args__ = (
+        Index("ix_reminder_digests_created_at", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    payment_ids: Mapped[list[int]] = mapped_column(ARRAY(Integer), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utc_now_naive)
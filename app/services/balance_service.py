@@ -1,49 +1,56 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import Date, cast, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date, timedelta
 from typing import List, Optional, Dict
-from models import Income, Expense
+from models import DailyTotal
 from services.income_service import IncomeService
 from services.expense_service import ExpenseService
+from services.rollup_service import EXPENSE_KIND, INCOME_KIND
+from services.settings_service import SettingsService
+from utils.helpers import get_month_range
+from utils.money import Money, MoneyType
 
 
 class BalanceService:
     @staticmethod
     def _month_bounds(year: int, month: int) -> tuple[date, date]:
-        start_date = date(year, month, 1)
-        if month == 12:
-            end_date = date(year + 1, 1, 1) - timedelta(days=1)
-        else:
-            end_date = date(year, month + 1, 1) - timedelta(days=1)
-        return start_date, end_date
+        return get_month_range(year, month)
 
     @staticmethod
-    def get_monthly_balance_summary(db: Session, user_id: int, year: int | None = None, month: int | None = None) -> Dict:
+    async def get_monthly_balance_summary(
+        db: AsyncSession,
+        user_id: int,
+        year: int | None = None,
+        month: int | None = None,
+        include_rows: bool = True,
+    ) -> Dict:
         """
-        Calculate comprehensive balance summary for a specific month
+        Calculate comprehensive balance summary for a specific month.
+        Totals are aggregated in SQL; rows are only loaded when include_rows is set.
         """
-        if year is None:
-            year = date.today().year
-        if month is None:
-            month = date.today().month
+        if year is None or month is None:
+            today = await SettingsService.local_today(db, user_id)
+            year = year or today.year
+            month = month or today.month
             
         # Get month boundaries
         start_date, end_date = BalanceService._month_bounds(year, month)
         
         # Get income data
-        income_data = IncomeService.get_monthly_income(db, user_id, year, month)
+        income_data = await IncomeService.get_monthly_income(
+            db, user_id, year, month, include_rows=include_rows
+        )
         total_income = income_data['total_amount']
         income_count = income_data['income_count']
         incomes = income_data['incomes']
         
         # Get expense data
-        expenses = db.query(Expense).filter(
-            Expense.user_id == user_id,
-            Expense.date >= start_date,
-            Expense.date <= end_date
-        ).all()
-        
-        total_expenses = sum(exp.amount for exp in expenses)
-        expense_count = len(expenses)
+        total_expenses, expense_count = await ExpenseService.get_expense_totals(
+            db, user_id, start_date, end_date
+        )
+        expenses = []
+        if include_rows and expense_count:
+            expenses = await ExpenseService.get_expenses_by_period(db, user_id, start_date, end_date)
         
         # Calculate balance
         available_balance = total_income - total_expenses
@@ -56,15 +63,9 @@ class BalanceService:
             prev_year = year
             prev_month = month - 1
 
-        prev_income_data = IncomeService.get_monthly_income(db, user_id, prev_year, prev_month)
-        prev_total_income = prev_income_data["total_amount"]
         prev_start_date, prev_end_date = BalanceService._month_bounds(prev_year, prev_month)
-        prev_expenses = db.query(Expense).filter(
-            Expense.user_id == user_id,
-            Expense.date >= prev_start_date,
-            Expense.date <= prev_end_date
-        ).all()
-        prev_total_expenses = sum(exp.amount for exp in prev_expenses)
+        prev_total_income = await IncomeService.get_total_income(db, user_id, prev_start_date, prev_end_date)
+        prev_total_expenses = await ExpenseService.get_total_expenses(db, user_id, prev_start_date, prev_end_date)
         carry_over = prev_total_income - prev_total_expenses
         
         return {
@@ -85,35 +86,93 @@ class BalanceService:
         }
     
     @staticmethod
-    def get_current_balance(db: Session, user_id: int) -> Dict:
+    async def get_current_balance(db: AsyncSession, user_id: int) -> Dict:
         """
         Get current month balance summary
         """
-        return BalanceService.get_monthly_balance_summary(db, user_id)
+        return await BalanceService.get_monthly_balance_summary(db, user_id)
     
     @staticmethod
-    def get_yearly_balance_summary(db: Session, user_id: int, year: int | None = None) -> Dict:
+    async def get_yearly_balance_summary(db: AsyncSession, user_id: int, year: int | None = None) -> Dict:
         """
-        Get yearly balance summary with month-by-month breakdown
+        Get yearly balance summary with month-by-month breakdown.
+        Monthly totals and carry-over come from one grouped query over the
+        daily rollup with LAG(); the previous December is included only to
+        seed January's carry-over.
         """
         if year is None:
-            year = date.today().year
-            
+            year = (await SettingsService.local_today(db, user_id)).year
+
+        first_month = date(year - 1, 12, 1)
+        last_month = date(year, 12, 1)
+        end_date = date(year, 12, 31)
+        month_part = literal_column("'month'")
+
+        months = select(
+            cast(
+                func.generate_series(first_month, last_month, literal_column("interval '1 month'")),
+                Date,
+            ).label("month_start")
+        ).cte("months")
+
+        rollup_month = cast(func.date_trunc(month_part, DailyTotal.day), Date)
+        is_income = DailyTotal.kind == INCOME_KIND
+        is_expense = DailyTotal.kind == EXPENSE_KIND
+        month_totals = select(
+            rollup_month.label("month_start"),
+            func.sum(DailyTotal.amount_sum, type_=MoneyType).filter(is_income).label("income_total"),
+            func.sum(DailyTotal.row_count).filter(is_income).label("income_count"),
+            func.sum(DailyTotal.amount_sum, type_=MoneyType).filter(is_expense).label("expense_total"),
+            func.sum(DailyTotal.row_count).filter(is_expense).label("expense_count"),
+        ).where(
+            DailyTotal.user_id == user_id,
+            DailyTotal.day >= first_month,
+            DailyTotal.day <= end_date
+        ).group_by(rollup_month).cte("month_totals")
+
+        month_income = func.coalesce(month_totals.c.income_total, 0)
+        month_expenses = func.coalesce(month_totals.c.expense_total, 0)
+        query = select(
+            months.c.month_start,
+            month_income,
+            func.coalesce(month_totals.c.income_count, 0),
+            month_expenses,
+            func.coalesce(month_totals.c.expense_count, 0),
+            func.lag(month_income - month_expenses, type_=MoneyType).over(order_by=months.c.month_start),
+        ).select_from(
+            months.outerjoin(month_totals, month_totals.c.month_start == months.c.month_start)
+        ).order_by(months.c.month_start)
+
         monthly_summaries = []
-        total_yearly_income = 0
-        total_yearly_expenses = 0
-        
-        for month in range(1, 13):
-            try:
-                monthly_summary = BalanceService.get_monthly_balance_summary(
-                    db, user_id, year, month
-                )
-                monthly_summaries.append(monthly_summary)
-                total_yearly_income += monthly_summary['total_income']
-                total_yearly_expenses += monthly_summary['total_expenses']
-            except:
+        total_yearly_income = Money(0)
+        total_yearly_expenses = Money(0)
+
+        for month_start, total_income, income_count, total_expenses, expense_count, carry_over in (await db.execute(query)).all():
+            if month_start.year != year:
                 continue
-        
+            total_income = Money(total_income)
+            total_expenses = Money(total_expenses)
+            available_balance = total_income - total_expenses
+            start_date, month_end = BalanceService._month_bounds(year, month_start.month)
+            monthly_summaries.append({
+                'year': year,
+                'month': month_start.month,
+                'month_name': start_date.strftime('%B %Y'),
+                'start_date': start_date,
+                'end_date': month_end,
+                'total_income': total_income,
+                'income_count': int(income_count),
+                'incomes': [],
+                'total_expenses': total_expenses,
+                'expense_count': int(expense_count),
+                'expenses': [],
+                'available_balance': available_balance,
+                'carry_over': Money(carry_over),
+                'next_month_starting_balance': max(0, available_balance)
+            })
+            total_yearly_income += total_income
+            total_yearly_expenses += total_expenses
+
         return {
             'year': year,
             'monthly_summaries': monthly_summaries,
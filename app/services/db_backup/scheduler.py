@@ -3,6 +3,7 @@ from datetime import timedelta, timezone
 
 from config import config
 from services.db_backup.engine import backup_engine
+from services.leader_election import leader_only
 
 
 logger = logging.getLogger(__name__)
@@ -42,6 +43,7 @@ def setup_backup_scheduler(scheduler) -> None:
     )
 
 
+@leader_only
 async def _run_auto_backup() -> None:
     try:
         backup = await backup_engine.create_backup("auto")
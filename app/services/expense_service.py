@@ -1,16 +1,19 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import extract, func, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, and_, or_
 from datetime import datetime, date, timedelta
 from typing import List, Dict, Optional
 from models import Expense, ExpenseType, Payment
-from utils.helpers import parse_date, format_date
+from utils.money import Money
+from services.rollup_service import EXPENSE_KIND, RollupService
+from services.settings_service import SettingsService
+from utils.helpers import parse_date, format_date, get_month_bounds, get_year_bounds
 
 class ExpenseService:
     @staticmethod
-    def add_expense(
-        db: Session,
+    async def add_expense(
+        db: AsyncSession,
         user_id: int,
-        amount: float,
+        amount: Money,
         category: str,
         description: str,
         expense_date: date,
@@ -27,124 +30,135 @@ class ExpenseService:
             is_future=is_future
         )
         db.add(expense)
-        db.commit()
-        db.refresh(expense)
+        if not is_future:
+            await RollupService.apply(db, user_id, expense_date, EXPENSE_KIND, category, amount, 1)
+        await db.flush()
+        await db.refresh(expense)
         return expense
 
     @staticmethod
-    def get_today_expenses(db: Session, user_id: int) -> List[Expense]:
-        today = date.today()
-        return db.query(Expense).filter(
+    async def get_today_expenses(db: AsyncSession, user_id: int) -> List[Expense]:
+        today = await SettingsService.local_today(db, user_id)
+        result = await db.scalars(select(Expense).where(
             Expense.user_id == user_id,
             Expense.date == today,
             Expense.is_future == False
-        ).all()
+        ))
+        return list(result.all())
 
     @staticmethod
-    def get_yesterday_expenses(db: Session, user_id: int) -> List[Expense]:
-        yesterday = date.today() - timedelta(days=1)
-        return db.query(Expense).filter(
+    async def get_yesterday_expenses(db: AsyncSession, user_id: int) -> List[Expense]:
+        yesterday = await SettingsService.local_today(db, user_id) - timedelta(days=1)
+        result = await db.scalars(select(Expense).where(
             Expense.user_id == user_id,
             Expense.date == yesterday,
             Expense.is_future == False
-        ).all()
+        ))
+        return list(result.all())
 
     @staticmethod
-    def get_weekly_expenses(db: Session, user_id: int) -> List[Expense]:
-        today = date.today()
+    async def get_weekly_expenses(db: AsyncSession, user_id: int) -> List[Expense]:
+        today = await SettingsService.local_today(db, user_id)
         start_date = today - timedelta(days=today.weekday())
         end_date = start_date + timedelta(days=6)
-        
-        return db.query(Expense).filter(
+
+        result = await db.scalars(select(Expense).where(
             Expense.user_id == user_id,
             Expense.date >= start_date,
             Expense.date <= end_date,
             Expense.is_future == False
-        ).all()
+        ))
+        return list(result.all())
 
     @staticmethod
-    def get_monthly_expenses(db: Session, user_id: int, year: int| None = None, month: int | None = None) -> List[Expense]:
-        today = date.today()
+    async def get_monthly_expenses(db: AsyncSession, user_id: int, year: int| None = None, month: int | None = None) -> List[Expense]:
+        today = await SettingsService.local_today(db, user_id)
         year = year or today.year
         month = month or today.month
-        
-        return db.query(Expense).filter(
+        start_date, next_start = get_month_bounds(year, month)
+
+        result = await db.scalars(select(Expense).where(
             Expense.user_id == user_id,
-            extract('year', Expense.date) == year,
-            extract('month', Expense.date) == month,
+            Expense.date >= start_date,
+            Expense.date < next_start,
             Expense.is_future == False
-        ).all()
+        ))
+        return list(result.all())
 
     @staticmethod
-    def get_yearly_expenses(db: Session, user_id: int, year: int | None = None) -> List[Expense]:
-        today = date.today()
+    async def get_yearly_expenses(db: AsyncSession, user_id: int, year: int | None = None) -> List[Expense]:
+        today = await SettingsService.local_today(db, user_id)
         year = year or today.year
-        
-        return db.query(Expense).filter(
+        start_date, next_start = get_year_bounds(year)
+
+        result = await db.scalars(select(Expense).where(
             Expense.user_id == user_id,
-            extract('year', Expense.date) == year,
+            Expense.date >= start_date,
+            Expense.date < next_start,
             Expense.is_future == False
-        ).all()
+        ))
+        return list(result.all())
 
     @staticmethod
-    def get_expenses_by_period(db: Session, user_id: int, start_date: date, end_date: date) -> List[Expense]:
-        return db.query(Expense).filter(
+    async def get_expenses_by_period(db: AsyncSession, user_id: int, start_date: date, end_date: date) -> List[Expense]:
+        result = await db.scalars(select(Expense).where(
             Expense.user_id == user_id,
             Expense.date >= start_date,
             Expense.date <= end_date,
             Expense.is_future == False
-        ).order_by(Expense.date).all()
+        ).order_by(Expense.date))
+        return list(result.all())
 
     @staticmethod
-    def get_future_expenses(db: Session, user_id: int) -> List[Expense]:
-        today = date.today()
-        return db.query(Expense).filter(
+    async def get_future_expenses(db: AsyncSession, user_id: int) -> List[Expense]:
+        today = await SettingsService.local_today(db, user_id)
+        result = await db.scalars(select(Expense).where(
             Expense.user_id == user_id,
             Expense.date > today,
             Expense.is_future == True
-        ).order_by(Expense.date).all()
+        ).order_by(Expense.date))
+        return list(result.all())
 
     @staticmethod
-    def get_total_expenses(db: Session, user_id: int, expenses: List[Expense]) -> float:
-        return sum(exp.amount for exp in expenses)
+    async def get_expense_totals(db: AsyncSession, user_id: int, start_date: date, end_date: date) -> tuple[Money, int]:
+        """Return (sum, count) of actual expenses in the period from the daily rollup."""
+        return await RollupService.get_totals(db, user_id, EXPENSE_KIND, start_date, end_date)
 
     @staticmethod
-    def get_expenses_by_category(db: Session, user_id: int, start_date: date, end_date: date) -> Dict[str, float]:
-        expenses = db.query(Expense).filter(
-            Expense.user_id == user_id,
-            Expense.date >= start_date,
-            Expense.date <= end_date,
-            Expense.is_future == False
-        ).all()
-        
-        category_totals = {}
-        for expense in expenses:
-            category_totals[expense.category] = category_totals.get(expense.category, 0) + expense.amount
-        
-        return category_totals
+    async def get_total_expenses(db: AsyncSession, user_id: int, start_date: date, end_date: date) -> Money:
+        total, _count = await ExpenseService.get_expense_totals(db, user_id, start_date, end_date)
+        return total
 
     @staticmethod
-    def get_last_expenses(db: Session, user_id: int, limit: int = 30) -> List[Expense]:
-        return (
-            db.query(Expense)
-            .filter(
+    async def get_expenses_by_category(db: AsyncSession, user_id: int, start_date: date, end_date: date) -> Dict[str, Money]:
+        return await RollupService.get_category_totals(db, user_id, EXPENSE_KIND, start_date, end_date)
+
+    @staticmethod
+    async def get_last_expenses(db: AsyncSession, user_id: int, limit: int = 30) -> List[Expense]:
+        result = await db.scalars(
+            select(Expense)
+            .where(
                 Expense.user_id == user_id,
                 Expense.is_future == False,
             )
             .order_by(Expense.date.desc(), Expense.id.desc())
             .limit(limit)
-            .all()
         )
+        return list(result.all())
 
     @staticmethod
-    def delete_expense(db: Session, user_id: int, expense_id: int) -> bool:
-        expense = db.query(Expense).filter(
+    async def delete_expense(db: AsyncSession, user_id: int, expense_id: int) -> bool:
+        expense = await db.scalar(select(Expense).where(
             Expense.id == expense_id,
             Expense.user_id == user_id,
-        ).first()
+        ).limit(1))
         if not expense:
             return False
 
-        db.delete(expense)
-        db.commit()
-        return True
\ No newline at end of file
+        if not expense.is_future:
+            await RollupService.apply(
+                db, user_id, expense.date, EXPENSE_KIND, expense.category, -expense.amount, -1
+            )
+        await db.delete(expense)
+        await db.flush()
+        return True
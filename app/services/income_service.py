@@ -1,15 +1,20 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from datetime import date, datetime, timedelta
 from typing import List, Optional
 from models import Income
+from utils.money import Money
+from services.rollup_service import INCOME_KIND, RollupService
+from services.settings_service import SettingsService
+from utils.helpers import get_month_range
 
 
 class IncomeService:
     @staticmethod
-    def add_income(db: Session, user_id: int, amount: float, description: str, category: str = "Kirim", income_date: date | None = None) -> Income:
+    async def add_income(db: AsyncSession, user_id: int, amount: Money, description: str, category: str = "Kirim", income_date: date | None = None) -> Income:
         if income_date is None:
-            income_date = date.today()
-            
+            income_date = await SettingsService.local_today(db, user_id)
+
         income = Income(
             user_id=user_id,
             amount=amount,
@@ -17,69 +22,88 @@ class IncomeService:
             category=category,
             date=income_date
         )
-        
+
         db.add(income)
-        db.commit()
-        db.refresh(income)
+        await RollupService.apply(db, user_id, income_date, INCOME_KIND, category, amount, 1)
+        await db.flush()
+        await db.refresh(income)
         return income
-    
+
+    @staticmethod
+    async def get_income_totals(db: AsyncSession, user_id: int, start_date: date | None = None, end_date: date | None = None) -> tuple[Money, int]:
+        """Return (sum, count) of income in the period from the daily rollup."""
+        return await RollupService.get_totals(db, user_id, INCOME_KIND, start_date, end_date)
+
     @staticmethod
-    def get_total_income(db: Session, user_id: int, start_date: date | None = None, end_date: date | None = None) -> float:
-        query = db.query(Income).filter(Income.user_id == user_id)
-        
-        if start_date:
-            query = query.filter(Income.date >= start_date)
-        if end_date:
-            query = query.filter(Income.date <= end_date)
-            
-        incomes = query.all()
-        return sum(income.amount for income in incomes)
-    
+    async def get_total_income(db: AsyncSession, user_id: int, start_date: date | None = None, end_date: date | None = None) -> Money:
+        total, _count = await IncomeService.get_income_totals(db, user_id, start_date, end_date)
+        return total
+
     @staticmethod
-    def get_monthly_income(db: Session, user_id: int, year: int | None = None, month: int | None = None) -> dict:
-        if year is None:
-            year = date.today().year
-        if month is None:
-            month = date.today().month
-            
-        start_date = date(year, month, 1)
-        if month == 12:
-            end_date = date(year + 1, 1, 1) - timedelta(days=1)
-        else:
-            end_date = date(year, month + 1, 1) - timedelta(days=1)
-            
-        incomes = db.query(Income).filter(
+    async def get_incomes_by_period(db: AsyncSession, user_id: int, start_date: date, end_date: date) -> List[Income]:
+        result = await db.scalars(select(Income).where(
             Income.user_id == user_id,
             Income.date >= start_date,
             Income.date <= end_date
-        ).order_by(Income.date.desc()).all()
-        
-        total_amount = sum(income.amount for income in incomes)
-        
+        ).order_by(Income.date))
+        return list(result.all())
+
+    @staticmethod
+    async def get_monthly_income(
+        db: AsyncSession,
+        user_id: int,
+        year: int | None = None,
+        month: int | None = None,
+        include_rows: bool = True,
+    ) -> dict:
+        if year is None or month is None:
+            today = await SettingsService.local_today(db, user_id)
+            year = year or today.year
+            month = month or today.month
+
+        start_date, end_date = get_month_range(year, month)
+
+        total_amount, income_count = await IncomeService.get_income_totals(
+            db, user_id, start_date, end_date
+        )
+
+        incomes: List[Income] = []
+        if include_rows and income_count:
+            result = await db.scalars(select(Income).where(
+                Income.user_id == user_id,
+                Income.date >= start_date,
+                Income.date <= end_date
+            ).order_by(Income.date.desc()))
+            incomes = list(result.all())
+
         return {
             'total_amount': total_amount,
-            'income_count': len(incomes),
+            'income_count': income_count,
             'incomes': incomes,
             'month_name': start_date.strftime('%B %Y'),
             'start_date': start_date,
             'end_date': end_date
         }
-    
+
     @staticmethod
-    def get_recent_incomes(db: Session, user_id: int, limit: int = 10) -> List[Income]:
-        return db.query(Income).filter(
+    async def get_recent_incomes(db: AsyncSession, user_id: int, limit: int = 10) -> List[Income]:
+        result = await db.scalars(select(Income).where(
             Income.user_id == user_id
-        ).order_by(Income.date.desc()).limit(limit).all()
-    
+        ).order_by(Income.date.desc()).limit(limit))
+        return list(result.all())
+
     @staticmethod
-    def delete_income(db: Session, user_id: int, income_id: int) -> bool:
-        income = db.query(Income).filter(
+    async def delete_income(db: AsyncSession, user_id: int, income_id: int) -> bool:
+        income = await db.scalar(select(Income).where(
             Income.id == income_id,
             Income.user_id == user_id
-        ).first()
-        
+        ).limit(1))
+
         if income:
-            db.delete(income)
-            db.commit()
+            await RollupService.apply(
+                db, user_id, income.date, INCOME_KIND, income.category, -income.amount, -1
+            )
+            await db.delete(income)
+            await db.flush()
             return True
         return False
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any, TypeVar
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from config import config
+from database import async_engine
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class LeaderElection:
+    """
+    Picks one replica to run singleton jobs (backup, nightly maintenance)
+    with a session-level Postgres advisory lock. The lock lives on a
+    dedicated connection, so it is released as soon as the leader's
+    process or connection dies and another replica takes over on its next
+    check. Holds one pooled connection for the lifetime of the process.
+    """
+
+    def __init__(self, engine: AsyncEngine, lock_key: int, interval: float) -> None:
+        self.engine = engine
+        self.lock_key = lock_key
+        self.interval = interval
+        self.is_leader = False
+        self._conn: AsyncConnection | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Run the first election right away, then keep checking in the background."""
+        if self._task is not None:
+            return
+        await self._check()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._release()
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._check()
+
+    async def _check(self) -> None:
+        try:
+            if self._conn is None:
+                self._conn = await self.engine.connect()
+            if self.is_leader:
+                # Heartbeat: a broken connection means the lock is gone too.
+                await self._conn.execute(text("SELECT 1"))
+                await self._conn.commit()
+                return
+            acquired = await self._conn.scalar(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": self.lock_key}
+            )
+            # Session-level lock: it survives the commit, which only ends the implicit transaction.
+            await self._conn.commit()
+            if acquired:
+                self.is_leader = True
+                logger.info("This replica is now the leader (lock %s)", self.lock_key)
+        except Exception:
+            if self.is_leader:
+                logger.exception("Lost leadership")
+            else:
+                logger.exception("Leader election check failed")
+            await self._drop_connection()
+
+    async def _drop_connection(self) -> None:
+        self.is_leader = False
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                await conn.invalidate()
+            except Exception:
+                pass
+
+    async def _release(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            if self.is_leader:
+                await self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.lock_key})
+                await self._conn.commit()
+            await self._conn.close()
+        except Exception:
+            logger.exception("Failed to release the leader lock")
+        self._conn = None
+        self.is_leader = False
+
+
+def leader_only(fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T | None]]:
+    """Wrap a scheduled job so only the leader replica runs it."""
+
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> T | None:
+        if not leader_election.is_leader:
+            logger.debug("Skipping %s: not the leader", fn.__name__)
+            return None
+        return await fn(*args, **kwargs)
+
+    return wrapper
+
+
+leader_election = LeaderElection(
+    async_engine,
+    lock_key=config.LEADER_LOCK_KEY,
+    interval=config.LEADER_CHECK_SECONDS,
+)
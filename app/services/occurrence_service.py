@@ -0,0 +1,192 @@
+from dataclasses import dataclass
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Iterable, List
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import config
+from models import Payment, PaymentFrequency, PaymentOccurrence, UserSettings
+from utils.helpers import local_today
+from utils.money import Money, MoneyType
+
+
+@dataclass(slots=True)
+class ScheduledPayment:
+    """One occurrence of a payment; `id` is the payment id so keyboards and callbacks keep working."""
+
+    id: int
+    user_id: int
+    amount: Money
+    category: str | None
+    description: str | None
+    frequency: PaymentFrequency
+    due_date: date
+
+
+class OccurrenceService:
+    """
+    Keeps payment_occurrences filled for open payments up to
+    PAYMENT_OCCURRENCE_HORIZON_DAYS ahead. Writers regenerate a payment's
+    rows in the same transaction as the change; a nightly pass moves the
+    horizon forward.
+    """
+
+    @staticmethod
+    def horizon_end(today: date) -> date:
+        return today + timedelta(days=config.PAYMENT_OCCURRENCE_HORIZON_DAYS)
+
+    @staticmethod
+    def expand(payment: Payment, until: date) -> List[date]:
+        """Occurrence dates from the current due_date up to `until`, honouring occurrences_left."""
+        from services.payment_service import PaymentService
+
+        if payment.is_paid or payment.is_skipped or payment.due_date is None:
+            return []
+
+        dates = [payment.due_date]
+        if payment.frequency == PaymentFrequency.ONCE:
+            return dates
+
+        limit = max(1, payment.occurrences_left) if payment.occurrences_left is not None else None
+        while limit is None or len(dates) < limit:
+            if payment.frequency == PaymentFrequency.MONTHLY:
+                # Same rule as paying: the next month-day after the previous occurrence.
+                next_due = PaymentService._next_month_day(dates[-1], payment.day_of_month or dates[-1].day)
+            else:
+                next_due = PaymentService._occurrence(payment, len(dates))
+            if next_due <= dates[-1] or next_due > until:
+                break
+            dates.append(next_due)
+        return dates
+
+    @staticmethod
+    async def regenerate(db: AsyncSession, payments: Iterable[Payment], today: date) -> int:
+        """
+        Replace the stored occurrences of the given payments, up to the horizon
+        from `today` (the owner's local date). Does not commit.
+        """
+        payments = list(payments)
+        if not payments:
+            return 0
+
+        await db.execute(delete(PaymentOccurrence).where(
+            PaymentOccurrence.payment_id.in_([payment.id for payment in payments])
+        ))
+        until = OccurrenceService.horizon_end(today)
+        rows = [
+            {
+                "payment_id": payment.id,
+                "due_date": due_date,
+                "user_id": payment.user_id,
+                "amount": payment.amount,
+            }
+            for payment in payments
+            for due_date in OccurrenceService.expand(payment, until)
+        ]
+        if rows:
+            await db.execute(insert(PaymentOccurrence), rows)
+        return len(rows)
+
+    @staticmethod
+    async def remove(db: AsyncSession, payment_id: int) -> None:
+        await db.execute(delete(PaymentOccurrence).where(PaymentOccurrence.payment_id == payment_id))
+
+    @staticmethod
+    async def refresh_batch(db: AsyncSession, after_id: int = 0, batch_size: int = 500) -> tuple[int, int | None]:
+        """
+        Regenerate occurrences for the next batch of open payments (keyset by id)
+        and drop rows of payments that are no longer open. Rows locked by a
+        concurrent pay/skip are left to that writer, which regenerates them itself.
+        Returns (rows written, last payment id or None when done).
+        """
+        rows = (await db.execute(
+            select(Payment, UserSettings.timezone)
+            .outerjoin(UserSettings, UserSettings.user_id == Payment.user_id)
+            .where(
+                Payment.id > after_id,
+                Payment.is_paid == False,
+                Payment.is_skipped == False,
+            )
+            .order_by(Payment.id)
+            .limit(batch_size)
+            .with_for_update(of=Payment, skip_locked=True)
+        )).all()
+        if not rows:
+            await db.execute(delete(PaymentOccurrence).where(
+                ~PaymentOccurrence.payment_id.in_(
+                    select(Payment.id).where(Payment.is_paid == False, Payment.is_skipped == False)
+                )
+            ))
+            return 0, None
+
+        written = await OccurrenceService.regenerate_local(db, rows)
+        return written, rows[-1][0].id
+
+    @staticmethod
+    async def regenerate_local(db: AsyncSession, rows: Iterable[tuple[Payment, str | None]]) -> int:
+        """regenerate() for (payment, timezone) rows of different users, each from its own local date."""
+        by_today = defaultdict(list)
+        for payment, timezone_name in rows:
+            by_today[local_today(timezone_name)].append(payment)
+        written = 0
+        for today, payments in by_today.items():
+            written += await OccurrenceService.regenerate(db, payments, today)
+        return written
+
+    @staticmethod
+    async def get_scheduled(
+        db: AsyncSession,
+        user_id: int,
+        start_date: date,
+        end_date: date,
+    ) -> List[ScheduledPayment]:
+        """All occurrences of the user's open payments in [start_date, end_date], by date."""
+        result = await db.execute(
+            select(Payment, PaymentOccurrence.due_date)
+            .select_from(PaymentOccurrence)
+            .join(Payment, Payment.id == PaymentOccurrence.payment_id)
+            .where(
+                PaymentOccurrence.user_id == user_id,
+                PaymentOccurrence.due_date >= start_date,
+                PaymentOccurrence.due_date <= end_date,
+            )
+            .order_by(PaymentOccurrence.due_date, PaymentOccurrence.payment_id)
+        )
+        return [
+            ScheduledPayment(
+                id=payment.id,
+                user_id=payment.user_id,
+                amount=payment.amount,
+                category=payment.category,
+                description=payment.description,
+                frequency=payment.frequency,
+                due_date=due_date,
+            )
+            for payment, due_date in result.all()
+        ]
+
+    @staticmethod
+    async def get_scheduled_totals(
+        db: AsyncSession,
+        user_id: int,
+        start_date: date,
+        *end_dates: date,
+    ) -> List[Money]:
+        """Sum of occurrence amounts from start_date up to each of end_dates, in one query."""
+        sums = [
+            func.coalesce(
+                func.sum(PaymentOccurrence.amount, type_=MoneyType).filter(PaymentOccurrence.due_date <= end_date),
+                0,
+            )
+            for end_date in end_dates
+        ]
+        row = (await db.execute(
+            select(*sums).where(
+                PaymentOccurrence.user_id == user_id,
+                PaymentOccurrence.due_date >= start_date,
+                PaymentOccurrence.due_date <= max(end_dates),
+            )
+        )).one()
+        return [Money(value) for value in row]
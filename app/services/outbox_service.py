@@ -0,0 +1,233 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import List, Sequence, Tuple
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from sqlalchemy import and_, delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import config
+from models import ReminderDigest, ReminderOutbox
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+# Retrying cannot help: the user blocked the bot or the message/chat is invalid.
+PERMANENT_ERRORS = (TelegramForbiddenError, TelegramBadRequest)
+
+
+@dataclass(slots=True)
+class OutboxMessage:
+    chat_id: int
+    payment_id: int
+    kind: str
+    due_date: date
+    text: str
+
+
+@dataclass(slots=True)
+class ClaimedMessage:
+    id: int
+    chat_id: int
+    payment_id: int
+    kind: str
+    due_date: date
+    text: str
+    attempts: int
+
+
+class OutboxService:
+    """
+    reminder_outbox: the planner inserts rows (deduplicated on payment, kind
+    and due date) in the same transaction that marks the payments reminded;
+    workers claim due rows with SKIP LOCKED, send them outside the
+    transaction and record the outcome. Rows of one chat may go out as a
+    single digest message, whose payments are kept in reminder_digests for
+    paging its keyboard. A claim is a lease: rows of a worker that died
+    mid-send become claimable again after REMINDER_OUTBOX_LEASE_SECONDS.
+    """
+
+    @staticmethod
+    async def enqueue(
+        db: AsyncSession,
+        messages: Sequence[OutboxMessage],
+        now: datetime | None = None,
+        repeat: bool = False,
+    ) -> int:
+        """
+        Insert messages, skipping ones already queued. With repeat=True a
+        finished row with the same key is queued again (repeating reminders);
+        one that is still pending is left alone. Returns how many rows were
+        queued. Does not commit.
+        """
+        if not messages:
+            return 0
+        now = now or datetime.utcnow()
+        rows = [
+            {
+                "payment_id": message.payment_id,
+                "kind": message.kind,
+                "due_date": message.due_date,
+                "chat_id": message.chat_id,
+                "text": message.text,
+                "status": PENDING,
+                "attempts": 0,
+                "next_attempt_at": now,
+                "created_at": now,
+            }
+            for message in messages
+        ]
+        key = [ReminderOutbox.payment_id, ReminderOutbox.kind, ReminderOutbox.due_date]
+        stmt = insert(ReminderOutbox)
+        if repeat:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=key,
+                set_={
+                    "chat_id": stmt.excluded.chat_id,
+                    "text": stmt.excluded.text,
+                    "status": PENDING,
+                    "attempts": 0,
+                    "next_attempt_at": stmt.excluded.next_attempt_at,
+                    "last_error": None,
+                    "created_at": stmt.excluded.created_at,
+                    "sent_at": None,
+                },
+                where=ReminderOutbox.status != PENDING,
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=key)
+        stmt = stmt.returning(ReminderOutbox.id)
+        return len((await db.execute(stmt, rows)).all())
+
+    @staticmethod
+    async def claim(db: AsyncSession, limit: int, now: datetime | None = None) -> List[ClaimedMessage]:
+        """
+        Lease the due rows of up to `limit` chats, all of a chat's rows together
+        so they can be sent as one digest; concurrent workers skip each other's rows.
+        """
+        now = now or datetime.utcnow()
+        is_due = and_(ReminderOutbox.status == PENDING, ReminderOutbox.next_attempt_at <= now)
+        chats = (
+            select(ReminderOutbox.chat_id)
+            .where(is_due)
+            .order_by(ReminderOutbox.next_attempt_at, ReminderOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        due = (
+            select(ReminderOutbox.id)
+            .where(is_due, ReminderOutbox.chat_id.in_(chats.scalar_subquery()))
+            .with_for_update(skip_locked=True)
+        )
+        result = await db.execute(
+            update(ReminderOutbox)
+            .where(ReminderOutbox.id.in_(due.scalar_subquery()))
+            .values(
+                attempts=ReminderOutbox.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=config.REMINDER_OUTBOX_LEASE_SECONDS),
+            )
+            .returning(
+                ReminderOutbox.id,
+                ReminderOutbox.chat_id,
+                ReminderOutbox.payment_id,
+                ReminderOutbox.kind,
+                ReminderOutbox.due_date,
+                ReminderOutbox.text,
+                ReminderOutbox.attempts,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        claimed = [ClaimedMessage(*row) for row in result.all()]
+        claimed.sort(key=lambda message: message.id)
+        return claimed
+
+    @staticmethod
+    def retry_delay(attempts: int) -> timedelta:
+        """Exponential backoff after the given number of failed attempts."""
+        seconds = config.REMINDER_OUTBOX_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1)
+        return timedelta(seconds=min(seconds, config.REMINDER_OUTBOX_RETRY_MAX_SECONDS))
+
+    @staticmethod
+    async def record(
+        db: AsyncSession,
+        claimed: Sequence[ClaimedMessage],
+        results: Sequence[object],
+        now: datetime | None = None,
+    ) -> int:
+        """
+        Store send outcomes (an exception or a result per claimed row): sent rows
+        are closed, failed ones rescheduled with backoff until they run out of attempts.
+        Returns the number of rows sent.
+        """
+        now = now or datetime.utcnow()
+        sent_ids = [message.id for message, result in zip(claimed, results) if not isinstance(result, BaseException)]
+        if sent_ids:
+            await db.execute(
+                update(ReminderOutbox)
+                .where(ReminderOutbox.id.in_(sent_ids))
+                .values(status=SENT, sent_at=now, last_error=None)
+                .execution_options(synchronize_session=False)
+            )
+
+        failures = []
+        for message, result in zip(claimed, results):
+            if not isinstance(result, BaseException):
+                continue
+            give_up = (
+                isinstance(result, PERMANENT_ERRORS)
+                or message.attempts >= config.REMINDER_OUTBOX_MAX_ATTEMPTS
+            )
+            failures.append({
+                "id": message.id,
+                "status": FAILED if give_up else PENDING,
+                "next_attempt_at": now + OutboxService.retry_delay(message.attempts),
+                "last_error": f"{type(result).__name__}: {result}"[:500],
+            })
+        if failures:
+            await db.execute(update(ReminderOutbox), failures)
+        return len(sent_ids)
+
+    @staticmethod
+    async def save_digests(
+        db: AsyncSession,
+        digests: Sequence[Tuple[int, List[int]]],
+        now: datetime | None = None,
+    ) -> List[int]:
+        """
+        Store (chat_id, payment ids in display order) of digest messages about
+        to be sent. Returns their ids in the same order. Does not commit.
+        """
+        if not digests:
+            return []
+        now = now or datetime.utcnow()
+        result = await db.execute(
+            insert(ReminderDigest).returning(ReminderDigest.id, sort_by_parameter_order=True),
+            [{"chat_id": chat_id, "payment_ids": payment_ids, "created_at": now} for chat_id, payment_ids in digests],
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def get_digest_payment_ids(db: AsyncSession, digest_id: int, chat_id: int) -> List[int] | None:
+        """Payment ids of a digest sent to the chat, or None when it is unknown or pruned."""
+        return await db.scalar(
+            select(ReminderDigest.payment_ids).where(
+                ReminderDigest.id == digest_id,
+                ReminderDigest.chat_id == chat_id,
+            )
+        )
+
+    @staticmethod
+    async def prune(db: AsyncSession, now: datetime | None = None) -> int:
+        """Drop finished rows and digests older than REMINDER_OUTBOX_RETENTION_DAYS."""
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=config.REMINDER_OUTBOX_RETENTION_DAYS)
+        result = await db.execute(
+            delete(ReminderOutbox).where(
+                ReminderOutbox.status != PENDING,
+                ReminderOutbox.created_at < cutoff,
+            )
+        )
+        digests = await db.execute(delete(ReminderDigest).where(ReminderDigest.created_at < cutoff))
+        return (result.rowcount or 0) + (digests.rowcount or 0)
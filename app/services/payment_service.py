@@ -1,9 +1,13 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, date, timedelta
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, date, timedelta, timezone
 from typing import List, Optional
 import calendar
-from models import Payment, PaymentFrequency
+from models import Payment, PaymentFrequency, UserSettings
+from services.occurrence_service import OccurrenceService, ScheduledPayment
+from services.settings_service import SettingsService
+from utils.helpers import local_today
+from utils.money import Money, MoneyType
 
 class PaymentService:
     @staticmethod
@@ -34,76 +38,149 @@ class PaymentService:
             return date(next_month.year, next_month.month, day_next_month)
         return candidate
 
+    # Repeated _add_months() clamps cumulatively (Jan 31 -> Apr 30 -> Jul 30). After 48 steps
+    # of 1, 3 or 12 months every month on the path, including a non-leap February, has been seen.
+    _CLAMP_HORIZON = 48
+    _PERIOD_DAYS = {PaymentFrequency.WEEKLY: 7, PaymentFrequency.BIWEEKLY: 14}
+    _PERIOD_MONTHS = {PaymentFrequency.QUARTERLY: 3, PaymentFrequency.YEARLY: 12}
+
+    @staticmethod
+    def _shift_months(anchor: date, months: int, steps: int) -> date:
+        """Apply _add_months(anchor, months) `steps` times, without iterating over all steps."""
+        day = anchor.day
+        for step in range(1, min(steps, PaymentService._CLAMP_HORIZON) + 1):
+            year_offset, month_index = divmod(anchor.month - 1 + step * months, 12)
+            day = min(day, calendar.monthrange(anchor.year + year_offset, month_index + 1)[1])
+        year_offset, month_index = divmod(anchor.month - 1 + steps * months, 12)
+        year, month = anchor.year + year_offset, month_index + 1
+        return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+    @staticmethod
+    def _occurrence(payment: Payment, steps: int) -> date:
+        """The occurrence `steps` periods after payment.due_date (weekly/biweekly/quarterly/yearly)."""
+        period_days = PaymentService._PERIOD_DAYS.get(payment.frequency)
+        if period_days:
+            return payment.due_date + timedelta(days=period_days * steps)
+        period_months = PaymentService._PERIOD_MONTHS.get(payment.frequency)
+        if period_months and steps:
+            return PaymentService._shift_months(payment.due_date, period_months, steps)
+        return payment.due_date
+
+    @staticmethod
+    def _steps_after(payment: Payment, base: date) -> int:
+        """Smallest number of periods that moves payment.due_date past base."""
+        due_date = payment.due_date
+        if due_date > base:
+            return 0
+        period_days = PaymentService._PERIOD_DAYS.get(payment.frequency)
+        if period_days:
+            return (base - due_date).days // period_days + 1
+        period_months = PaymentService._PERIOD_MONTHS[payment.frequency]
+        elapsed_months = (base.year - due_date.year) * 12 + base.month - due_date.month
+        steps = max(1, elapsed_months // period_months)
+        # The estimate is at most two periods short.
+        while PaymentService._occurrence(payment, steps) <= base:
+            steps += 1
+        return steps
+
     @staticmethod
     def _get_next_due_date(payment: Payment, from_date: date | None = None) -> date:
         base = from_date or date.today()
 
-        if payment.frequency == PaymentFrequency.WEEKLY:
-            next_due = payment.due_date
-            if next_due is None:
-                if payment.weekday is None:
-                    return base
-                return PaymentService._next_weekday(base, payment.weekday)
- 
-            while next_due <= base:
-                next_due = next_due + timedelta(days=7)
-            return next_due
-
-        if payment.frequency == PaymentFrequency.BIWEEKLY:
-            next_due = payment.due_date
-            if next_due is None:
-                if payment.weekday is None:
-                    return base
-                # First occurrence: pick next selected weekday, then biweekly increments will preserve weekday
-                next_due = PaymentService._next_weekday(base, payment.weekday)
- 
-            while next_due <= base:
-                next_due = next_due + timedelta(days=14)
-            return next_due
+        if payment.frequency in (PaymentFrequency.WEEKLY, PaymentFrequency.BIWEEKLY) and payment.due_date is None:
+            if payment.weekday is None:
+                return base
+            # First occurrence: pick next selected weekday, then biweekly increments will preserve weekday
+            return PaymentService._next_weekday(base, payment.weekday)
 
         if payment.frequency == PaymentFrequency.MONTHLY:
             if payment.day_of_month is None:
                 return PaymentService._next_month_day(base, payment.due_date.day)
             return PaymentService._next_month_day(base, payment.day_of_month)
 
-        if payment.frequency == PaymentFrequency.QUARTERLY:
-            next_due = payment.due_date
-            while next_due <= base:
-                next_due = PaymentService._add_months(next_due, 3)
-            return next_due
-
-        if payment.frequency == PaymentFrequency.YEARLY:
-            next_due = payment.due_date
-            while next_due <= base:
-                next_due = date(next_due.year + 1, next_due.month, min(next_due.day, calendar.monthrange(next_due.year + 1, next_due.month)[1]))
-            return next_due
+        if payment.frequency in PaymentService._PERIOD_DAYS or payment.frequency in PaymentService._PERIOD_MONTHS:
+            return PaymentService._occurrence(payment, PaymentService._steps_after(payment, base))
 
         return payment.due_date
 
     @staticmethod
-    def normalize_recurring_payments(db: Session, user_id: int | None = None, advance_overdue: bool = False):
-        today = date.today()
-        query = db.query(Payment).filter(Payment.is_paid == False)
-        if user_id is not None:
-            query = query.filter(Payment.user_id == user_id)
-
-        payments = query.filter(Payment.frequency != PaymentFrequency.ONCE).all()
-        updated = False
-
-        for payment in payments:
-            if advance_overdue and payment.due_date < today:
-                payment.due_date = PaymentService._get_next_due_date(payment, today)
+    def _latest_occurrence(payment: Payment, today: date) -> date:
+        """Last occurrence of a recurring payment on or before today (its due_date if none later)."""
+        due_date = payment.due_date
+        if due_date >= today:
+            return due_date
+
+        if payment.frequency == PaymentFrequency.MONTHLY:
+            if payment.day_of_month is None:
+                # Paying steps from the current due date, so the clamped day carries over.
+                months = (today.year - due_date.year) * 12 + today.month - due_date.month
+                latest = PaymentService._shift_months(due_date, 1, months)
+                if latest > today:
+                    latest = PaymentService._shift_months(due_date, 1, months - 1)
+                return max(latest, due_date)
+            day_of_month = payment.day_of_month
+            latest = today.replace(day=min(day_of_month, calendar.monthrange(today.year, today.month)[1]))
+            if latest > today:
+                previous = PaymentService._add_months(today.replace(day=1), -1)
+                latest = previous.replace(day=min(day_of_month, calendar.monthrange(previous.year, previous.month)[1]))
+            return max(latest, due_date)
+
+        if payment.frequency in PaymentService._PERIOD_DAYS or payment.frequency in PaymentService._PERIOD_MONTHS:
+            return PaymentService._occurrence(payment, PaymentService._steps_after(payment, today) - 1)
+
+        return due_date
+
+    @staticmethod
+    async def roll_forward_batch(db: AsyncSession, after_id: int = 0, batch_size: int = 500) -> tuple[int, int | None]:
+        """
+        Nightly roll-forward of recurring payments that missed more than one
+        occurrence: due_date moves to the latest occurrence up to the user's
+        today, so the payment stays overdue for the current period only.
+        Rows locked by a concurrent pay/skip are skipped and picked up next night.
+        Returns (updated rows, last scanned id or None when done).
+        """
+        # The shortest period is a week; anything newer cannot have missed two
+        # occurrences. The batch is bounded by the latest local date anywhere
+        # (UTC+14); each row is then rolled to its own user's today.
+        latest_today = (datetime.now(timezone.utc) + timedelta(hours=14)).date()
+        cutoff = latest_today - timedelta(days=6)
+        rows = (await db.execute(
+            select(Payment, UserSettings.timezone)
+            .outerjoin(UserSettings, UserSettings.user_id == Payment.user_id)
+            .where(
+                Payment.id > after_id,
+                Payment.frequency != PaymentFrequency.ONCE,
+                Payment.is_paid == False,
+                Payment.is_skipped == False,
+                Payment.due_date < cutoff,
+            )
+            .order_by(Payment.id)
+            .limit(batch_size)
+            .with_for_update(of=Payment, skip_locked=True)
+        )).all()
+        if not rows:
+            return 0, None
+
+        updated = 0
+        moved = []
+        for payment, timezone_name in rows:
+            original_due = payment.due_date
+            latest = PaymentService._latest_occurrence(payment, local_today(timezone_name))
+            payment.due_date = latest
+            if latest != original_due:
                 payment.reminder_sent = False
-                updated = True
+                moved.append((payment, timezone_name))
+                updated += 1
 
-        if updated:
-            db.commit()
+        await OccurrenceService.regenerate_local(db, moved)
+        await db.flush()
+        return updated, rows[-1][0].id
 
     @staticmethod
-    def add_payment(
-        db: Session,
+    async def add_payment(
+        db: AsyncSession,
         user_id: int,
-        amount: float,
+        amount: Money,
         category: str,
         description: str,
         due_date: date,
@@ -126,16 +203,17 @@ class PaymentService:
             is_paid=is_paid
         )
         db.add(payment)
-        db.commit()
-        db.refresh(payment)
+        await db.flush()
+        await db.refresh(payment)
+        await OccurrenceService.regenerate(db, [payment], await SettingsService.local_today(db, user_id))
         return payment
 
     @staticmethod
-    def pay_payment_and_record_expense(
-        db: Session,
+    async def pay_payment_and_record_expense(
+        db: AsyncSession,
         payment_id: int,
         user_id: int,
-        paid_amount: float | None = None,
+        paid_amount: Money | None = None,
     ) -> Optional[Payment]:
         """Mark payment as paid (for ONCE) or roll forward (for recurring), and record as expense.
 
@@ -144,28 +222,30 @@ class PaymentService:
         from services.expense_service import ExpenseService
         from models import ExpenseType
 
-        payment = db.query(Payment).filter(
+        payment = await db.scalar(select(Payment).where(
             Payment.id == payment_id,
             Payment.user_id == user_id,
             Payment.is_paid == False,
-        ).first()
+        ).limit(1).with_for_update())
         if not payment:
             return None
 
+        today = await SettingsService.local_today(db, user_id)
+
         # Record as expense on the day user marks it as paid
-        ExpenseService.add_expense(
+        await ExpenseService.add_expense(
             db=db,
             user_id=user_id,
             amount=paid_amount if paid_amount is not None else payment.amount,
             category=payment.category or "To'lov",
             description=payment.description or "",
-            expense_date=date.today(),
+            expense_date=today,
             expense_type=ExpenseType.ONCE,
             is_future=False,
         )
 
         # Update payment state
-        payment.payment_date = date.today()
+        payment.payment_date = today
         payment.reminder_sent = True
         payment.overdue_last_sent_at = None
 
@@ -179,99 +259,98 @@ class PaymentService:
                     payment.occurrences_left = payment.occurrences_left
 
                 if payment.occurrences_left is not None and payment.occurrences_left <= 0: # pyright: ignore[reportOptionalOperand]
-                    db.delete(payment)
-                    db.commit()
+                    await OccurrenceService.remove(db, payment.id)
+                    await db.delete(payment)
+                    await db.flush()
                     return payment
 
             # Keep recurring payment active; advance due date to next occurrence
-            payment.due_date = PaymentService._get_next_due_date(payment, payment.due_date)
+            payment.due_date = PaymentService._get_next_due_date(payment, payment.due_date or today)
             payment.reminder_sent = False
 
-        db.commit()
-        db.refresh(payment)
+        await OccurrenceService.regenerate(db, [payment], today)
+        await db.flush()
+        await db.refresh(payment)
         return payment
 
     @staticmethod
-    def skip_payment_occurrence(db: Session, payment_id: int, user_id: int) -> Optional[Payment]:
+    async def skip_payment_occurrence(db: AsyncSession, payment_id: int, user_id: int) -> Optional[Payment]:
         """Skip this period. For ONCE: mark skipped. For recurring: roll due_date forward."""
-        payment = db.query(Payment).filter(
+        payment = await db.scalar(select(Payment).where(
             Payment.id == payment_id,
             Payment.user_id == user_id,
             Payment.is_paid == False,
-        ).first()
+        ).limit(1).with_for_update())
         if not payment:
             return None
 
+        today = await SettingsService.local_today(db, user_id)
         payment.overdue_last_sent_at = None
 
         if payment.frequency == PaymentFrequency.ONCE:
             payment.is_skipped = True
             payment.reminder_sent = True
         else:
-            payment.due_date = PaymentService._get_next_due_date(payment, payment.due_date)
+            payment.due_date = PaymentService._get_next_due_date(payment, payment.due_date or today)
             payment.reminder_sent = False
 
-        db.commit()
-        db.refresh(payment)
+        await OccurrenceService.regenerate(db, [payment], today)
+        await db.flush()
+        await db.refresh(payment)
         return payment
 
     @staticmethod
-    def get_overdue_payments(db: Session, user_id: int) -> List[Payment]:
-        today = date.today()
-        return (
-            db.query(Payment)
-            .filter(
+    async def get_overdue_payments(db: AsyncSession, user_id: int) -> List[Payment]:
+        today = await SettingsService.local_today(db, user_id)
+        result = await db.scalars(
+            select(Payment)
+            .where(
                 Payment.user_id == user_id,
                 Payment.is_paid == False,
                 Payment.is_skipped == False,
                 Payment.due_date < today,
             )
             .order_by(Payment.due_date.asc(), Payment.id.asc())
-            .all()
         )
+        return list(result.all())
 
     @staticmethod
-    def mark_overdue_sent(db: Session, payment_ids: List[int]):
-        now = datetime.utcnow()
-        db.query(Payment).filter(Payment.id.in_(payment_ids)).update(
-            {"overdue_last_sent_at": now},
-            synchronize_session=False,
+    async def get_digest_payments(db: AsyncSession, user_id: int, payment_ids: List[int]) -> List[Payment]:
+        """The user's payments among payment_ids (a reminder digest), in that order."""
+        if not payment_ids:
+            return []
+        result = await db.scalars(
+            select(Payment).where(Payment.user_id == user_id, Payment.id.in_(payment_ids))
         )
-        db.commit()
+        by_id = {payment.id: payment for payment in result.all()}
+        return [by_id[payment_id] for payment_id in payment_ids if payment_id in by_id]
 
     @staticmethod
-    def mark_as_paid(db: Session, payment_id: int, user_id: int) -> Optional[Payment]:
-        payment = db.query(Payment).filter(
+    async def mark_as_paid(db: AsyncSession, payment_id: int, user_id: int) -> Optional[Payment]:
+        payment = await db.scalar(select(Payment).where(
             Payment.id == payment_id,
             Payment.user_id == user_id
-        ).first()
+        ).limit(1))
 
         if payment:
             payment.is_paid = True
-            payment.payment_date = date.today()
-            db.commit()
-            db.refresh(payment)
+            payment.payment_date = await SettingsService.local_today(db, user_id)
+            await OccurrenceService.remove(db, payment.id)
+            await db.flush()
+            await db.refresh(payment)
 
         return payment
 
     @staticmethod
-    def get_upcoming_payments(db: Session, user_id: int, days_ahead: int = 30) -> List[Payment]:
-        PaymentService.normalize_recurring_payments(db, user_id=user_id)
-        today = date.today()
+    async def get_upcoming_payments(db: AsyncSession, user_id: int, days_ahead: int = 30) -> List[ScheduledPayment]:
+        """Every occurrence due in the next days_ahead days, recurring payments included more than once."""
+        today = await SettingsService.local_today(db, user_id)
         end_date = today + timedelta(days=days_ahead)
-
-        return db.query(Payment).filter(
-            Payment.user_id == user_id,
-            Payment.due_date >= today,
-            Payment.due_date <= end_date,
-            Payment.is_paid == False,
-            Payment.is_skipped == False,
-        ).order_by(Payment.due_date).all()
+        return await OccurrenceService.get_scheduled(db, user_id, today, end_date)
 
     @staticmethod
-    def get_upcoming_payments_this_month(db: Session, user_id: int) -> List[Payment]:
-        PaymentService.normalize_recurring_payments(db, user_id=user_id)
-        today = date.today()
+    async def get_upcoming_payments_this_month(db: AsyncSession, user_id: int) -> List[Payment]:
+        today = await SettingsService.local_today(db, user_id)
         
         # Get the last day of the current month
         if today.month == 12:
@@ -279,57 +358,50 @@ class PaymentService:
         else:
             last_day_of_month = date(today.year, today.month + 1, 1) - timedelta(days=1)
 
-        return db.query(Payment).filter(
+        result = await db.scalars(select(Payment).where(
             Payment.user_id == user_id,
             Payment.due_date >= today,
             Payment.due_date <= last_day_of_month,
             Payment.is_paid == False,
             Payment.is_skipped == False,
-        ).order_by(Payment.due_date).all()
+        ).order_by(Payment.due_date))
+        return list(result.all())
 
     @staticmethod
-    def get_upcoming_totals(db: Session, user_id: int) -> dict[str, float]:
-        PaymentService.normalize_recurring_payments(db, user_id=user_id)
-        today = date.today()
+    async def get_upcoming_totals(db: AsyncSession, user_id: int) -> dict[str, Money]:
+        today = await SettingsService.local_today(db, user_id)
         week_end = today + timedelta(days=(6 - today.weekday()))
         if today.month == 12:
             month_end = date(today.year + 1, 1, 1) - timedelta(days=1)
         else:
             month_end = date(today.year, today.month + 1, 1) - timedelta(days=1)
 
-        base_query = db.query(Payment).filter(
-            Payment.user_id == user_id,
-            Payment.due_date >= today,
-            Payment.is_paid == False,
-            Payment.is_skipped == False,
+        multiplier = func.coalesce(Payment.occurrences_left, 1)
+        all_total = await db.scalar(
+            select(func.coalesce(func.sum(Payment.amount * multiplier, type_=MoneyType), 0)).where(
+                Payment.user_id == user_id,
+                Payment.due_date >= today,
+                Payment.is_paid == False,
+                Payment.is_skipped == False,
+            )
+        )
+        week_total, month_total = await OccurrenceService.get_scheduled_totals(
+            db, user_id, today, week_end, month_end
         )
-
-        all_total = 0.0
-        for payment in base_query.all():
-            multiplier = payment.occurrences_left if payment.occurrences_left is not None else 1
-            all_total += float(payment.amount) * float(multiplier)
-
-        week_total = base_query.filter(Payment.due_date <= week_end).with_entities(
-            func.coalesce(func.sum(Payment.amount), 0.0)
-        ).scalar() or 0.0
-        month_total = base_query.filter(Payment.due_date <= month_end).with_entities(
-            func.coalesce(func.sum(Payment.amount), 0.0)
-        ).scalar() or 0.0
 
         return {
-            "this_week_total": float(week_total),
-            "this_month_total": float(month_total),
-            "all_future_total": float(all_total),
+            "this_week_total": Money(week_total),
+            "this_month_total": Money(month_total),
+            "all_future_total": Money(all_total),
         }
 
     @staticmethod
-    def get_monthly_payment_summary(db: Session, user_id: int) -> dict:
+    async def get_monthly_payment_summary(db: AsyncSession, user_id: int) -> dict:
         """
         Calculate minimal monthly payments for the current month
         Returns dict with total_amount, payment_count, and payments list
         """
-        PaymentService.normalize_recurring_payments(db, user_id=user_id)
-        today = date.today()
+        today = await SettingsService.local_today(db, user_id)
         
         # Get the first and last day of current month
         first_day_of_month = today.replace(day=1)
@@ -338,13 +410,7 @@ class PaymentService:
         else:
             last_day_of_month = date(today.year, today.month + 1, 1) - timedelta(days=1)
 
-        payments = db.query(Payment).filter(
-            Payment.user_id == user_id,
-            Payment.due_date >= first_day_of_month,
-            Payment.due_date <= last_day_of_month,
-            Payment.is_paid == False,
-            Payment.is_skipped == False,
-        ).order_by(Payment.due_date).all()
+        payments = await OccurrenceService.get_scheduled(db, user_id, first_day_of_month, last_day_of_month)
 
         total_amount = sum(p.amount for p in payments)
         
@@ -358,71 +424,21 @@ class PaymentService:
         }
 
     @staticmethod
-    def get_payments_due_tomorrow(db: Session, user_id: int) -> List[Payment]:
-        PaymentService.normalize_recurring_payments(db, user_id=user_id)
-        tomorrow = date.today() + timedelta(days=1)
-
-        return db.query(Payment).filter(
-            Payment.user_id == user_id,
-            Payment.due_date == tomorrow,
-            Payment.is_paid == False,
-            Payment.is_skipped == False,
-            Payment.reminder_sent == False
-        ).all()
-
-    @staticmethod
-    def get_monthly_payments_due_in_3_days(db: Session, user_id: int) -> List[Payment]:
-        PaymentService.normalize_recurring_payments(db, user_id=user_id)
-        today = date.today()
-        for i in range(1, 4):  # Check next 3 days
-            check_date = today + timedelta(days=i)
-            payments = db.query(Payment).filter(
-                Payment.user_id == user_id,
-                Payment.due_date == check_date,
-                Payment.frequency == PaymentFrequency.MONTHLY,
-                Payment.is_paid == False,
-                Payment.is_skipped == False,
-                Payment.reminder_sent == False
-            ).all()
-            if payments:
-                return payments
-        return []
-
-    @staticmethod
-    def get_yearly_payments_due_in_week(db: Session, user_id: int) -> List[Payment]:
-        PaymentService.normalize_recurring_payments(db, user_id=user_id)
-        today = date.today()
-        payments_due = []
-
-        for i in range(1, 8):  # Check next 7 days
-            check_date = today + timedelta(days=i)
-            payments = db.query(Payment).filter(
-                Payment.user_id == user_id,
-                Payment.due_date == check_date,
-                Payment.frequency == PaymentFrequency.YEARLY,
-                Payment.is_paid == False,
-                Payment.is_skipped == False,
-                Payment.reminder_sent == False
-            ).all()
-            payments_due.extend(payments)
-        
-        return payments_due
-
-    @staticmethod
-    def mark_reminder_sent(db: Session, payment_ids: List[int]):
-        db.query(Payment).filter(Payment.id.in_(payment_ids)).update(
-            {"reminder_sent": True},
-            synchronize_session=False
+    async def mark_reminder_sent(db: AsyncSession, payment_ids: List[int]):
+        await db.execute(
+            update(Payment)
+            .where(Payment.id.in_(payment_ids))
+            .values(reminder_sent=True)
+            .execution_options(synchronize_session=False)
         )
-        db.commit()
+        await db.flush()
 
     @staticmethod
-    def get_future_payments(db: Session, user_id: int, limit: int = 30) -> List[Payment]:
-        PaymentService.normalize_recurring_payments(db, user_id=user_id)
-        today = date.today()
-        return (
-            db.query(Payment)
-            .filter(
+    async def get_future_payments(db: AsyncSession, user_id: int, limit: int = 30) -> List[Payment]:
+        today = await SettingsService.local_today(db, user_id)
+        result = await db.scalars(
+            select(Payment)
+            .where(
                 Payment.user_id == user_id,
                 Payment.due_date >= today,
                 Payment.is_paid == False,
@@ -430,18 +446,19 @@ class PaymentService:
             )
             .order_by(Payment.due_date.asc(), Payment.id.asc())
             .limit(limit)
-            .all()
         )
+        return list(result.all())
 
     @staticmethod
-    def delete_payment(db: Session, user_id: int, payment_id: int) -> bool:
-        payment = db.query(Payment).filter(
+    async def delete_payment(db: AsyncSession, user_id: int, payment_id: int) -> bool:
+        payment = await db.scalar(select(Payment).where(
             Payment.id == payment_id,
             Payment.user_id == user_id,
-        ).first()
+        ).limit(1))
         if not payment:
             return False
 
-        db.delete(payment)
-        db.commit()
+        await OccurrenceService.remove(db, payment.id)
+        await db.delete(payment)
+        await db.flush()
         return True
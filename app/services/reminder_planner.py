@@ -0,0 +1,309 @@
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Collection, Dict, Iterable, List, Tuple
+
+from sqlalchemy import and_, case, func, literal, or_, select, true, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import config
+from models import DailyTotal, Payment, PaymentFrequency, PaymentOccurrence, User, UserSettings
+from services.rollup_service import EXPENSE_KIND
+from utils.money import Money
+
+DUE_TOMORROW = "due_tomorrow"
+MONTHLY_AHEAD = "monthly_ahead"
+YEARLY_AHEAD = "yearly_ahead"
+OVERDUE = "overdue"
+
+PAYMENT_REMINDER_KINDS = (DUE_TOMORROW, MONTHLY_AHEAD, YEARLY_AHEAD)
+
+# Lookahead per frequency: reminder kind and how many days ahead it looks.
+AHEAD_WINDOWS = {
+    PaymentFrequency.MONTHLY: (MONTHLY_AHEAD, 3),
+    PaymentFrequency.YEARLY: (YEARLY_AHEAD, 7),
+}
+
+# Default gap between overdue reminders for one payment (users can change it in settings).
+OVERDUE_COOLDOWN = timedelta(hours=8)
+OVERDUE_GRACE = timedelta(minutes=15)
+
+
+@dataclass(slots=True)
+class PlannedReminder:
+    chat_id: int
+    kind: str
+    payment: Payment
+
+
+@dataclass(slots=True)
+class DigestRecipient:
+    chat_id: int
+    timezone: str
+    payments: Dict[int, Payment] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class PlannedSummary:
+    chat_id: int
+    timezone: str
+    total: Money = field(default_factory=Money)
+    expense_count: int = 0
+    category_totals: Dict[str | None, Money] = field(default_factory=dict)
+
+
+class ReminderPlanner:
+    """
+    Builds the reminder fan-out for all users at once. Each plan is a handful
+    of queries joined against users/user_settings, so the cost follows the
+    number of messages to send rather than the number of users. Users without
+    a settings row get the defaults (everything enabled). With several
+    replicas each one plans only its own partition of users.
+    """
+
+    @staticmethod
+    def _enabled(flag):
+        return func.coalesce(flag, true())
+
+    @staticmethod
+    def _user_timezone():
+        return func.coalesce(UserSettings.timezone, config.TIMEZONE)
+
+    @staticmethod
+    def _in_partition(user_id_column):
+        """This replica's share of users (by user_id hash) when REPLICA_COUNT > 1."""
+        if config.REPLICA_COUNT <= 1:
+            return true()
+        return func.abs(func.hashint8(user_id_column) % config.REPLICA_COUNT) == config.REPLICA_INDEX
+
+    @staticmethod
+    async def get_timezones(db: AsyncSession) -> List[str]:
+        """Distinct timezones of registered users, used to bucket scheduled sends."""
+        result = await db.scalars(
+            select(ReminderPlanner._user_timezone())
+            .select_from(User)
+            .outerjoin(UserSettings, UserSettings.user_id == User.telegram_id)
+            .distinct()
+        )
+        return list(result.all())
+
+    @staticmethod
+    def _payments_for(flag, timezones: Collection[str] | None):
+        """Open payments of registered users whose given setting is on."""
+        query = (
+            select(Payment, User.telegram_id)
+            .join(User, User.telegram_id == Payment.user_id)
+            .outerjoin(UserSettings, UserSettings.user_id == Payment.user_id)
+            .where(
+                ReminderPlanner._enabled(flag),
+                ReminderPlanner._in_partition(Payment.user_id),
+                Payment.is_paid == False,
+                Payment.is_skipped == False,
+            )
+        )
+        if timezones is not None:
+            query = query.where(ReminderPlanner._user_timezone().in_(timezones))
+        return query
+
+    @staticmethod
+    async def plan_payment_reminders(
+        db: AsyncSession,
+        kinds: Iterable[str] = PAYMENT_REMINDER_KINDS,
+        today: date | None = None,
+        timezones: Collection[str] | None = None,
+    ) -> List[PlannedReminder]:
+        """
+        Plan "due tomorrow", monthly (next 3 days) and yearly (next 7 days)
+        reminders with one date-range query. When tomorrow's reminders are
+        planned in the same pass the monthly/yearly windows start the day
+        after, so a payment is reminded once.
+        `today` is the local date of the users in `timezones` (all users if None).
+        """
+        today = today or date.today()
+        kinds = set(kinds)
+        tomorrow = today + timedelta(days=1)
+        ahead_start = tomorrow + timedelta(days=1) if DUE_TOMORROW in kinds else tomorrow
+        # Date ranges are scanned on payment_occurrences (indexed by due_date across users);
+        # reminder_sent tracks the current occurrence, so only that one is joined.
+        due = PaymentOccurrence.due_date
+        windows = [
+            (Payment.frequency == frequency, today + timedelta(days=days))
+            for frequency, (kind, days) in AHEAD_WINDOWS.items()
+            if kind in kinds
+        ]
+        ranges = []
+        last_day = tomorrow
+        if DUE_TOMORROW in kinds:
+            ranges.append(due == tomorrow)
+        if windows:
+            # Frequency-aware upper bound; other frequencies get NULL and drop out.
+            ranges.append(and_(due >= ahead_start, due <= case(*windows)))
+            last_day = max(end for _, end in windows)
+        if not ranges:
+            return []
+
+        result = await db.execute(
+            ReminderPlanner._payments_for(UserSettings.daily_reminder_enabled, timezones)
+            .join(PaymentOccurrence, and_(PaymentOccurrence.payment_id == Payment.id, due == Payment.due_date))
+            # The plain BETWEEN lets the due_date index bound the scan before the per-kind filter.
+            .where(Payment.reminder_sent == False, due.between(tomorrow, last_day), or_(*ranges))
+            .order_by(Payment.user_id, Payment.due_date, Payment.id)
+        )
+
+        plan: List[PlannedReminder] = []
+        # Monthly: only the nearest day that has monthly payments, per user.
+        first_monthly: Dict[int, date] = {}
+        for payment, chat_id in result.all():
+            if payment.due_date == tomorrow and DUE_TOMORROW in kinds:
+                plan.append(PlannedReminder(chat_id, DUE_TOMORROW, payment))
+            elif payment.frequency == PaymentFrequency.MONTHLY:
+                if first_monthly.setdefault(payment.user_id, payment.due_date) == payment.due_date:
+                    plan.append(PlannedReminder(chat_id, MONTHLY_AHEAD, payment))
+            else:
+                plan.append(PlannedReminder(chat_id, YEARLY_AHEAD, payment))
+        return plan
+
+    @staticmethod
+    async def claim_overdue_reminders(
+        db: AsyncSession,
+        today: date | None = None,
+        now: datetime | None = None,
+        timezones: Collection[str] | None = None,
+        default_cooldown: timedelta = OVERDUE_COOLDOWN,
+        slot_start: datetime | None = None,
+    ) -> List[PlannedReminder]:
+        """
+        Overdue payments whose user's cooldown (user_settings.overdue_cooldown_hours,
+        default_cooldown without a settings row) has passed and, with
+        slot_start (UTC), that were not reminded since then. Claims them by
+        stamping overdue_last_sent_at in the same UPDATE ... RETURNING, so a
+        concurrent run cannot pick them up too. Does not commit.
+        """
+        today = today or date.today()
+        now = now or datetime.utcnow()
+        cooldown_hours = func.coalesce(
+            UserSettings.overdue_cooldown_hours, int(default_cooldown.total_seconds() // 3600)
+        )
+        # Ticks are quarter-hourly: with the grace a 24h cooldown fires in the same slot next day.
+        cutoff = literal(now + OVERDUE_GRACE) - literal(timedelta(hours=1)) * cooldown_hours
+        reminded_before = Payment.overdue_last_sent_at <= cutoff
+        if slot_start is not None:
+            reminded_before = and_(reminded_before, Payment.overdue_last_sent_at < slot_start)
+        due = (
+            ReminderPlanner._payments_for(UserSettings.overdue_reminder_enabled, timezones)
+            .with_only_columns(Payment.id)
+            .where(
+                Payment.due_date < today,
+                or_(Payment.overdue_last_sent_at.is_(None), reminded_before),
+            )
+            .with_for_update(of=Payment, skip_locked=True)
+        )
+        payments = (await db.scalars(
+            update(Payment)
+            .where(Payment.id.in_(due.scalar_subquery()))
+            .values(overdue_last_sent_at=now)
+            .returning(Payment)
+            .execution_options(synchronize_session=False)
+        )).all()
+        # payments.user_id is the user's Telegram id, i.e. the chat to remind.
+        return [
+            PlannedReminder(payment.user_id, OVERDUE, payment)
+            for payment in sorted(payments, key=lambda p: (p.user_id, p.due_date, p.id))
+        ]
+
+    @staticmethod
+    async def get_digest_recipients(
+        db: AsyncSession,
+        items: Iterable[Tuple[int, int]],
+    ) -> Dict[int, DigestRecipient]:
+        """
+        For (chat_id, payment_id) pairs about to be delivered: the chats that
+        want a digest, with their timezone and the payments (two queries).
+        """
+        items = list(items)
+        chat_ids = {chat_id for chat_id, _ in items}
+        if not chat_ids:
+            return {}
+        result = await db.execute(
+            select(UserSettings.user_id, ReminderPlanner._user_timezone())
+            .where(UserSettings.user_id.in_(chat_ids), UserSettings.digest_enabled == True)
+        )
+        recipients = {
+            chat_id: DigestRecipient(chat_id, timezone_name)
+            for chat_id, timezone_name in result.all()
+        }
+        payment_ids = {payment_id for chat_id, payment_id in items if chat_id in recipients}
+        if payment_ids:
+            for payment in await db.scalars(select(Payment).where(Payment.id.in_(payment_ids))):
+                recipient = recipients.get(payment.user_id)
+                if recipient is not None:
+                    recipient.payments[payment.id] = payment
+        return recipients
+
+    @staticmethod
+    async def plan_daily_summaries(
+        db: AsyncSession,
+        day: date | None = None,
+        timezones: Collection[str] | None = None,
+    ) -> List[PlannedSummary]:
+        """Per-user expense totals for the day, read from the daily rollup in one query."""
+        day = day or date.today()
+        query = (
+            select(
+                User.telegram_id,
+                ReminderPlanner._user_timezone(),
+                DailyTotal.category,
+                DailyTotal.amount_sum,
+                DailyTotal.row_count,
+            )
+            .select_from(DailyTotal)
+            .join(User, User.telegram_id == DailyTotal.user_id)
+            .outerjoin(UserSettings, UserSettings.user_id == DailyTotal.user_id)
+            .where(
+                ReminderPlanner._enabled(UserSettings.daily_summary_enabled),
+                ReminderPlanner._in_partition(DailyTotal.user_id),
+                DailyTotal.day == day,
+                DailyTotal.kind == EXPENSE_KIND,
+                DailyTotal.row_count > 0,
+            )
+            .order_by(User.telegram_id, DailyTotal.category)
+        )
+        if timezones is not None:
+            query = query.where(ReminderPlanner._user_timezone().in_(timezones))
+        result = await db.execute(query)
+
+        summaries: Dict[int, PlannedSummary] = {}
+        for chat_id, timezone_name, category, amount, row_count in result.all():
+            summary = summaries.get(chat_id)
+            if summary is None:
+                summary = summaries[chat_id] = PlannedSummary(chat_id, timezone_name or config.TIMEZONE)
+            summary.total = Money(summary.total + amount)
+            summary.expense_count += row_count
+            summary.category_totals[category or None] = amount
+        return list(summaries.values())
+
+    @staticmethod
+    async def claim_daily_summaries(
+        db: AsyncSession,
+        day: date | None = None,
+        timezones: Collection[str] | None = None,
+    ) -> List[PlannedSummary]:
+        """
+        plan_daily_summaries, minus users who already got the summary for
+        `day`. Claims the rest by stamping users.daily_summary_sent_on, so a
+        later or concurrent run skips them. Does not commit.
+        """
+        day = day or date.today()
+        summaries = await ReminderPlanner.plan_daily_summaries(db, day, timezones)
+        if not summaries:
+            return []
+        claimed = set((await db.scalars(
+            update(User)
+            .where(
+                User.telegram_id.in_([summary.chat_id for summary in summaries]),
+                or_(User.daily_summary_sent_on.is_(None), User.daily_summary_sent_on < day),
+            )
+            .values(daily_summary_sent_on=day)
+            .returning(User.telegram_id)
+            .execution_options(synchronize_session=False)
+        )).all())
+        return [summary for summary in summaries if summary.chat_id in claimed]
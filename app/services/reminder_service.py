@@ -1,215 +1,351 @@
-from datetime import datetime, date
-import pytz
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, date, timedelta, timezone
+from typing import Collection, Dict, List, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import config
 from database import run_db
+from services.outbox_service import ClaimedMessage, OutboxMessage, OutboxService
+from services.reminder_planner import (
+    DUE_TOMORROW,
+    MONTHLY_AHEAD,
+    OVERDUE,
+    PAYMENT_REMINDER_KINDS,
+    DigestRecipient,
+    PlannedReminder,
+    PlannedSummary,
+    ReminderPlanner,
+)
+from services.send_scheduler import send_scheduler
+from utils.helpers import local_now, local_today
+
+logger = logging.getLogger(__name__)
+
+MORNING = (9, 0)
+EVENING = (18, 0)
+NIGHT = (23, 0)
+# Local time slots are checked on every quarter hour (all UTC offsets are multiples of 15 min).
+SLOT_MINUTES = 15
+# Longer digests are cut (Telegram messages are limited to 4096 characters).
+DIGEST_MAX_LINES = 40
 
 
 class ReminderService:
-    @staticmethod
-    async def _get_user_settings(user_id: int):
-        from services.settings_service import SettingsService
-
-        return await run_db(SettingsService.get_or_create, user_id)
+    """Sends the reminders planned by ReminderPlanner; one planning pass per job."""
 
     @staticmethod
-    async def check_and_send_reminders(bot):
-        """Check and send all types of reminders"""
-        from models import User
+    async def _timezone_buckets(now: datetime) -> Dict[Tuple[int, int, date], List[str]]:
+        """Group user timezones by their current local (hour, minute, date)."""
+        buckets: Dict[Tuple[int, int, date], List[str]] = defaultdict(list)
+        for timezone_name in await run_db(ReminderPlanner.get_timezones):
+            local = local_now(timezone_name, now)
+            buckets[(local.hour, local.minute, local.date())].append(timezone_name)
+        return buckets
 
-        users = await run_db(lambda db: db.query(User).all())
+    @staticmethod
+    async def run_local_schedule(bot, now: datetime | None = None):
+        """
+        Quarter-hour tick, planned per timezone group with its own local date.
+        From 09:00 local users get tomorrow's and the monthly/yearly lookahead
+        reminders, overdue reminders once in the 09:00 and once in the 18:00
+        window, and from 23:00 the daily summary. Every slot is planned again
+        on each tick until the local day ends, so a missed tick is caught up by
+        the next one; reminder_sent, overdue_last_sent_at and
+        users.daily_summary_sent_on keep that idempotent. Reminders only go to
+        reminder_outbox here: the drain job delivers them.
+        """
+        now = now or datetime.now(timezone.utc)
+        now = now.replace(minute=now.minute - now.minute % SLOT_MINUTES, second=0, microsecond=0)
+
+        for (hour, minute, today), timezones in (await ReminderService._timezone_buckets(now)).items():
+            local_time = (hour, minute)
+            if local_time >= MORNING:
+                overdue_slot = EVENING if local_time >= EVENING else MORNING
+                slot_start = now - timedelta(hours=hour - overdue_slot[0], minutes=minute - overdue_slot[1])
+                await run_db(
+                    ReminderService._queue_local_reminders,
+                    today,
+                    timezones,
+                    slot_start.replace(tzinfo=None),
+                    now.replace(tzinfo=None),
+                )
+            if local_time >= NIGHT:
+                await ReminderService.send_daily_summaries(bot, today, timezones)
 
-        for user in users:
-            await ReminderService.send_daily_reminders(user.telegram_id, bot)
-            await ReminderService.send_monthly_reminders(user.telegram_id, bot)
-            await ReminderService.send_yearly_reminders(user.telegram_id, bot)
+    @staticmethod
+    async def _queue_local_reminders(
+        db: AsyncSession,
+        today: date,
+        timezones: Collection[str],
+        slot_start: datetime,
+        now: datetime,
+    ) -> int:
+        """
+        Queue a timezone group's payment and overdue reminders in one
+        transaction, so a concurrent drain sees all of a chat's rows at once
+        and its digest is not split in two.
+        """
+        queued = await ReminderService._queue_payment_reminders(db, PAYMENT_REMINDER_KINDS, today, timezones)
+        queued += await ReminderService._queue_overdue_reminders(db, today, timezones, slot_start, now)
+        return queued
 
     @staticmethod
-    async def send_daily_reminders(user_id: int, bot):
-        """Send reminders for payments due tomorrow"""
+    async def _queue_payment_reminders(
+        db: AsyncSession,
+        kinds,
+        today: date | None,
+        timezones: Collection[str] | None,
+    ) -> int:
+        """Plan reminders into reminder_outbox and mark the payments reminded, in one transaction."""
         from services.payment_service import PaymentService
-        from keyboards import get_payment_reminder_actions_keyboard
 
-        settings = await ReminderService._get_user_settings(user_id)
-        if not settings.daily_reminder_enabled:
-            return
-
-        payments = await run_db(PaymentService.get_payments_due_tomorrow, user_id)
-
-        if payments:
-            for payment in payments:
-                message = "📢 **ERTAGA TO'LOV ESLATMASI:**\n\n"
-                message += f"📝 {payment.description}\n"
-                message += f"💰 {payment.amount:,.0f} so'm\n"
-                message += f"📅 Sana: {payment.due_date.strftime('%d.%m.%Y')}\n"
-
-                try:
-                    await bot.send_message(
-                        user_id,
-                        message,
-                        parse_mode="Markdown",
-                        reply_markup=get_payment_reminder_actions_keyboard(payment.id),
-                    )
-                    await run_db(PaymentService.mark_reminder_sent, [payment.id])
-                except Exception as e:
-                    print(f"Error sending reminder to {user_id}: {e}")
+        today = today or date.today()
+        plan = await ReminderPlanner.plan_payment_reminders(db, kinds, today, timezones)
+        if not plan:
+            return 0
+        queued = await OutboxService.enqueue(db, [
+            OutboxMessage(
+                chat_id=reminder.chat_id,
+                payment_id=reminder.payment.id,
+                kind=reminder.kind,
+                due_date=reminder.payment.due_date,
+                text=ReminderService._format_payment_reminder(reminder, today),
+            )
+            for reminder in plan
+        ])
+        await PaymentService.mark_reminder_sent(db, [reminder.payment.id for reminder in plan])
+        return queued
 
     @staticmethod
-    async def send_monthly_reminders(user_id: int, bot):
-        """Send reminders for monthly payments in last 3 days"""
-        from services.payment_service import PaymentService
-        from keyboards import get_payment_reminder_actions_keyboard
-
-        settings = await ReminderService._get_user_settings(user_id)
-        if not settings.daily_reminder_enabled:
-            return
-
-        payments = await run_db(PaymentService.get_monthly_payments_due_in_3_days, user_id)
-
-        if payments:
-            today = date.today()
-            for payment in payments:
-                days_left = (payment.due_date - today).days
-                message = f"⏰ **OYLIK TO'LOV ESLATMASI:**\n\n"
-                message += f"{payment.description} to'lovi {days_left} kun qoldi\n"
-                message += f"Miqdori: {payment.amount:,.0f} so'm\n"
-                message += f"To'lov sanasi: {payment.due_date.strftime('%d.%m.%Y')}"
-
-                try:
-                    await bot.send_message(
-                        user_id,
-                        message,
+    async def drain_outbox(bot, batch_size: int | None = None) -> int:
+        """
+        Deliver due reminder_outbox rows batch by batch until none is left to
+        claim. Several drains (or processes) can run at once. Returns rows sent.
+        """
+        from keyboards import get_payment_digest_keyboard, get_payment_reminder_actions_keyboard
+
+        batch_size = batch_size or config.REMINDER_OUTBOX_BATCH_SIZE
+        sent = 0
+        while True:
+            claimed = await run_db(OutboxService.claim, batch_size)
+            if not claimed:
+                return sent
+
+            recipients = await run_db(
+                ReminderPlanner.get_digest_recipients,
+                [(message.chat_id, message.payment_id) for message in claimed],
+            )
+            # Digest users get one message per chat for the whole group of rows.
+            groups: Dict[Tuple[int, int], List[ClaimedMessage]] = defaultdict(list)
+            for message in claimed:
+                digest = message.chat_id in recipients
+                groups[(message.chat_id, 0 if digest else message.id)].append(message)
+
+            digests = {
+                chat_id: ReminderService._format_digest(messages, recipients[chat_id])
+                for (chat_id, row_id), messages in groups.items()
+                if not row_id
+            }
+            # Stored before sending, so the keyboard pages over exactly the digest's payments.
+            stored = [(chat_id, [payment.id for payment in payments]) for chat_id, (_, payments) in digests.items() if payments]
+            digest_ids = dict(zip(
+                [chat_id for chat_id, _ in stored],
+                await run_db(OutboxService.save_digests, stored),
+            ))
+
+            futures = []
+            for (chat_id, row_id), messages in groups.items():
+                first = messages[0]
+                if row_id:
+                    factory = lambda first=first: bot.send_message(
+                        first.chat_id,
+                        first.text,
                         parse_mode="Markdown",
-                        reply_markup=get_payment_reminder_actions_keyboard(payment.id),
+                        reply_markup=get_payment_reminder_actions_keyboard(first.payment_id),
                     )
-                except Exception as e:
-                    print(f"Error sending monthly reminder to {user_id}: {e}")
-
-            payment_ids = [p.id for p in payments]
-            await run_db(PaymentService.mark_reminder_sent, payment_ids)
-
-    @staticmethod
-    async def send_yearly_reminders(user_id: int, bot):
-        """Send reminders for yearly payments in last 7 days"""
-        from services.payment_service import PaymentService
-        from keyboards import get_payment_reminder_actions_keyboard
-
-        settings = await ReminderService._get_user_settings(user_id)
-        if not settings.daily_reminder_enabled:
-            return
-
-        payments = await run_db(PaymentService.get_yearly_payments_due_in_week, user_id)
-
-        if payments:
-            today = date.today()
-            for payment in payments:
-                days_left = (payment.due_date - today).days
-                message = f"🎯 **YILLIK TO'LOV ESLATMASI:**\n\n"
-                message += f"{payment.description} to'lovi {days_left} kun qoldi\n"
-                message += f"Miqdori: {payment.amount:,.0f} so'm\n"
-                message += f"To'lov sanasi: {payment.due_date.strftime('%d.%m.%Y')}"
-
-                try:
-                    await bot.send_message(
-                        user_id,
-                        message,
+                else:
+                    text, payments = digests[chat_id]
+                    if not payments:
+                        # Every payment of the group is gone; nothing left to remind about.
+                        futures.append(asyncio.sleep(0))
+                        continue
+                    factory = lambda first=first, text=text, payments=payments: bot.send_message(
+                        first.chat_id,
+                        text,
                         parse_mode="Markdown",
-                        reply_markup=get_payment_reminder_actions_keyboard(payment.id),
+                        reply_markup=get_payment_digest_keyboard(payments, digest_ids[first.chat_id]),
                     )
-                except Exception as e:
-                    print(f"Error sending yearly reminder to {user_id}: {e}")
-
-            payment_ids = [p.id for p in payments]
-            await run_db(PaymentService.mark_reminder_sent, payment_ids)
-
-    @staticmethod
-    async def send_daily_summary(user_id: int, bot):
-        """Send daily expense summary at end of day"""
-        from services.expense_service import ExpenseService
-
-        settings = await ReminderService._get_user_settings(user_id)
-        if not settings.daily_summary_enabled:
-            return
-
-        today = date.today()
-        expenses = await run_db(ExpenseService.get_today_expenses, user_id)
-
-        if expenses:
-            total = sum(exp.amount for exp in expenses)
-            category_totals = await run_db(
-                ExpenseService.get_expenses_by_category,
-                user_id,
-                today,
-                today,
-            )
-
-            message = f"📊 **KUNLIK HISOBOT - {today.strftime('%d.%m.%Y')}**\n\n"
-            message += f"📈 Jami xarajat: {total:,.0f} so'm\n"
-            message += f"📝 Xarajatlar soni: {len(expenses)}\n\n"
-            message += "📋 **Kategoriyalar bo'yicha:**\n"
-
-            for category, amount in category_totals.items():
-                percentage = (amount / total * 100) if total > 0 else 0
-                message += f"• {category}: {amount:,.0f} so'm ({percentage:.1f}%)\n"
-
-            timezone_name = settings.timezone or config.TIMEZONE
-            message += (
-                f"\n⏰ Hisobot vaqti: "
-                f"{datetime.now(pytz.timezone(timezone_name)).strftime('%H:%M')}"
+                futures.append(send_scheduler.submit(first.chat_id, factory))
+            group_results = await asyncio.gather(*futures, return_exceptions=True)
+
+            results = []
+            for messages, result in zip(groups.values(), group_results):
+                if isinstance(result, BaseException):
+                    logger.warning("Error sending reminder %s to %s", messages[0].id, messages[0].chat_id, exc_info=result)
+                results.extend((message, result) for message in messages)
+            sent += await run_db(
+                OutboxService.record,
+                [message for message, _ in results],
+                [result for _, result in results],
             )
 
-            try:
-                await bot.send_message(user_id, message, parse_mode="Markdown")
-            except Exception as e:
-                print(f"Error sending daily summary to {user_id}: {e}")
-
     @staticmethod
-    async def send_overdue_reminders(user_id: int, bot):
-        """Send reminders for overdue payments (due_date < today)."""
-        from services.payment_service import PaymentService
-        from keyboards import get_payment_reminder_actions_keyboard
-
-        settings = await ReminderService._get_user_settings(user_id)
-        if not settings.overdue_reminder_enabled:
-            return
-
-        now_utc = datetime.utcnow()
-        payments = await run_db(PaymentService.get_overdue_payments, user_id)
-        if not payments:
-            return
-
-        # Rate-limit: at most once per ~8 hours per payment (scheduler is 2x/day)
-        to_send = []
-        for p in payments:
-            last = getattr(p, "overdue_last_sent_at", None)
-            if last is None:
-                to_send.append(p)
+    def _format_digest(messages: List[ClaimedMessage], recipient: DigestRecipient) -> Tuple[str, List]:
+        """One message for all of a chat's reminders, grouped by kind; returns the text and its payments."""
+        today = local_today(recipient.timezone)
+        sections: Dict[str, List] = defaultdict(list)
+        for message in messages:
+            payment = recipient.payments.get(message.payment_id)
+            if payment is None or payment.is_paid or payment.is_skipped:
+                continue
+            section = message.kind if message.kind in (OVERDUE, DUE_TOMORROW) else MONTHLY_AHEAD
+            if payment not in sections[section]:
+                sections[section].append(payment)
+
+        text = "📬 **TO'LOVLAR ESLATMASI**\n"
+        payments = []
+        lines = 0
+        for section, title in (
+            (OVERDUE, "🔴 **Muddati o'tgan:**"),
+            (DUE_TOMORROW, "📢 **Ertaga:**"),
+            (MONTHLY_AHEAD, "⏰ **Yaqinlashayotgan:**"),
+        ):
+            if not sections[section]:
                 continue
-            try:
-                if (now_utc - last).total_seconds() >= 8 * 3600:
-                    to_send.append(p)
-            except Exception:
-                to_send.append(p)
+            text += f"\n{title}\n"
+            for payment in sorted(sections[section], key=lambda p: (p.due_date, p.id)):
+                payments.append(payment)
+                lines += 1
+                if lines > DIGEST_MAX_LINES:
+                    continue
+                text += f"• {payment.description} — {payment.amount:,.0f} so'm"
+                days = (payment.due_date - today).days
+                if section == OVERDUE:
+                    text += f", {payment.due_date.strftime('%d.%m.%Y')} ({-days} kun o'tdi)"
+                elif section == MONTHLY_AHEAD:
+                    text += f", {payment.due_date.strftime('%d.%m.%Y')} ({days} kun qoldi)"
+                text += "\n"
+        if lines > DIGEST_MAX_LINES:
+            text += f"… va yana {lines - DIGEST_MAX_LINES} ta to'lov\n"
+        text += "\nTo'lovni belgilash uchun tanlang:"
+        return text, payments
 
-        if not to_send:
-            return
+    @staticmethod
+    def _format_payment_reminder(reminder: PlannedReminder, today: date) -> str:
+        payment = reminder.payment
+        if reminder.kind == DUE_TOMORROW:
+            message = "📢 **ERTAGA TO'LOV ESLATMASI:**\n\n"
+            message += f"📝 {payment.description}\n"
+            message += f"💰 {payment.amount:,.0f} so'm\n"
+            message += f"📅 Sana: {payment.due_date.strftime('%d.%m.%Y')}\n"
+            return message
 
-        for payment in to_send:
-            days_overdue = (date.today() - payment.due_date).days
+        if reminder.kind == OVERDUE:
+            days_overdue = (today - payment.due_date).days
             message = "🔴 **MUDDATI O'TGAN TO'LOV!**\n\n"
             message += f"📝 {payment.description}\n"
             message += f"💰 {payment.amount:,.0f} so'm\n"
             message += f"📅 Sana: {payment.due_date.strftime('%d.%m.%Y')}\n"
             message += f"⏰ {days_overdue} kun o'tdi\n"
+            return message
+
+        days_left = (payment.due_date - today).days
+        if reminder.kind == MONTHLY_AHEAD:
+            message = f"⏰ **OYLIK TO'LOV ESLATMASI:**\n\n"
+        else:
+            message = f"🎯 **YILLIK TO'LOV ESLATMASI:**\n\n"
+        message += f"{payment.description} to'lovi {days_left} kun qoldi\n"
+        message += f"Miqdori: {payment.amount:,.0f} so'm\n"
+        message += f"To'lov sanasi: {payment.due_date.strftime('%d.%m.%Y')}"
+        return message
 
-            try:
-                await bot.send_message(
-                    user_id,
-                    message,
+    @staticmethod
+    async def send_daily_summaries(
+        bot,
+        today: date | None = None,
+        timezones: Collection[str] | None = None,
+    ) -> int:
+        """
+        Send the daily expense summary at the end of the day to users who have
+        not had it yet. The sends are queued on send_scheduler and not awaited,
+        so the tick is not held up; failures are logged. Returns how many were queued.
+        """
+        today = today or date.today()
+        summaries = await run_db(ReminderPlanner.claim_daily_summaries, today, timezones)
+        for summary in summaries:
+            future = send_scheduler.submit(
+                summary.chat_id,
+                lambda summary=summary: bot.send_message(
+                    summary.chat_id,
+                    ReminderService._format_daily_summary(summary, today),
                     parse_mode="Markdown",
-                    reply_markup=get_payment_reminder_actions_keyboard(payment.id),
-                )
-            except Exception as e:
-                print(f"Error sending overdue reminder to {user_id}: {e}")
+                ),
+            )
+            future.add_done_callback(
+                lambda future, chat_id=summary.chat_id: ReminderService._log_summary_failure(future, chat_id)
+            )
+        return len(summaries)
+
+    @staticmethod
+    def _log_summary_failure(future: asyncio.Future, chat_id: int) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning("Error sending daily summary to %s", chat_id, exc_info=future.exception())
+
+    @staticmethod
+    def _format_daily_summary(summary: PlannedSummary, today: date) -> str:
+        total = summary.total
+        message = f"📊 **KUNLIK HISOBOT - {today.strftime('%d.%m.%Y')}**\n\n"
+        message += f"📈 Jami xarajat: {total:,.0f} so'm\n"
+        message += f"📝 Xarajatlar soni: {summary.expense_count}\n\n"
+        message += "📋 **Kategoriyalar bo'yicha:**\n"
+
+        for category, amount in summary.category_totals.items():
+            percentage = (amount / total * 100) if total > 0 else 0
+            message += f"• {category}: {amount:,.0f} so'm ({percentage:.1f}%)\n"
+
+        message += (
+            f"\n⏰ Hisobot vaqti: "
+            f"{local_now(summary.timezone).strftime('%H:%M')}"
+        )
+        return message
 
-        await run_db(PaymentService.mark_overdue_sent, [p.id for p in to_send])
+    @staticmethod
+    async def send_overdue_reminders(
+        bot,
+        today: date | None = None,
+        timezones: Collection[str] | None = None,
+    ):
+        """Send reminders for overdue payments (due_date < today)."""
+        if await run_db(ReminderService._queue_overdue_reminders, today, timezones):
+            await ReminderService.drain_outbox(bot)
+
+    @staticmethod
+    async def _queue_overdue_reminders(
+        db: AsyncSession,
+        today: date | None,
+        timezones: Collection[str] | None,
+        slot_start: datetime | None = None,
+        now: datetime | None = None,
+    ) -> int:
+        """
+        Claim overdue payments past their user's cooldown (and not reminded
+        since slot_start, if given) and queue their reminders, in one transaction.
+        """
+        today = today or date.today()
+        plan = await ReminderPlanner.claim_overdue_reminders(db, today, now, timezones, slot_start=slot_start)
+        if not plan:
+            return 0
+        queued = await OutboxService.enqueue(db, [
+            OutboxMessage(
+                chat_id=reminder.chat_id,
+                payment_id=reminder.payment.id,
+                kind=reminder.kind,
+                due_date=reminder.payment.due_date,
+                text=ReminderService._format_payment_reminder(reminder, today),
+            )
+            for reminder in plan
+        ], repeat=True)
+        return queued
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Dict
+
+from aiogram.types import BufferedInputFile, FSInputFile, InputFile
+
+from config import config
+from utils.report_rows import pack_report_data, unpack_report_data
+
+logger = logging.getLogger(__name__)
+
+EXCEL = "xlsx"
+PDF = "pdf"
+
+
+class RenderBusyError(Exception):
+    """The user already has REPORT_RENDER_PER_USER reports being rendered."""
+
+
+@dataclass(slots=True)
+class RenderedReport:
+    """
+    A rendered report file named `filename` for the user: its bytes, or the
+    path of a private temp file when it was larger than the spill threshold.
+    """
+
+    filename: str
+    data: bytes | None = None
+    path: str | None = None
+
+    def as_input_file(self) -> InputFile:
+        if self.path is not None:
+            return FSInputFile(self.path, filename=self.filename)
+        return BufferedInputFile(self.data or b"", filename=self.filename)
+
+    def discard(self) -> None:
+        """Remove the temp file, if any. Call once the document has been sent."""
+        if self.path is None:
+            return
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        self.path = None
+
+
+def _render(report_format: str, packed: Dict, filename: str, spill_bytes: int) -> RenderedReport:
+    """Worker process entry point."""
+    report_data = unpack_report_data(packed)
+    buffer = io.BytesIO()
+    if report_format == PDF:
+        from utils.pdf_generator import generate_pdf_report
+
+        generate_pdf_report(report_data, buffer)
+    else:
+        from utils.excel_generator import generate_excel_report
+
+        generate_excel_report(report_data, buffer)
+
+    if not spill_bytes or buffer.getbuffer().nbytes <= spill_bytes:
+        return RenderedReport(filename, data=buffer.getvalue())
+    # Big files go back by path rather than through the result pipe; mkstemp
+    # gives every render its own file in the local temp dir.
+    fd, path = tempfile.mkstemp(prefix="report_", suffix=os.path.splitext(filename)[1])
+    with os.fdopen(fd, "wb") as file:
+        file.write(buffer.getbuffer())
+    return RenderedReport(filename, path=path)
+
+
+class ReportRenderer:
+    """
+    Renders Excel/PDF report files in a small process pool so a large export
+    does not block polling and other users. At most `workers` renders run at
+    a time (later ones wait their turn), each user gets `per_user` of them,
+    and a render that runs past `timeout` or whose caller is cancelled has its
+    worker killed. Rows go to the workers as PackedRow tuples.
+    """
+
+    def __init__(self, workers: int, per_user: int, timeout: float, spill_bytes: int) -> None:
+        self.workers = workers
+        self.per_user = per_user
+        self.timeout = timeout
+        self.spill_bytes = spill_bytes
+        self._pool: ProcessPoolExecutor | None = None
+        self._slots = asyncio.Semaphore(workers)
+        self._active: Dict[int, int] = {}
+
+    def start(self) -> None:
+        if self._pool is None:
+            # spawn: forking a process that holds event loop and DB sockets is not safe.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    async def stop(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            self._kill(pool, cancel_pending=True)
+
+    async def render(self, user_id: int, report_format: str, report_data: Dict, filename: str) -> RenderedReport:
+        """
+        Render the report in memory as a document named `filename` (spilled to
+        a temp file above `spill_bytes`). Raises RenderBusyError when the user
+        is at their limit and TimeoutError when waiting plus rendering takes
+        longer than the timeout.
+        """
+        if self._active.get(user_id, 0) >= self.per_user:
+            raise RenderBusyError(user_id)
+        self._active[user_id] = self._active.get(user_id, 0) + 1
+        try:
+            payload = pack_report_data(report_data)
+            async with asyncio.timeout(self.timeout):
+                async with self._slots:
+                    try:
+                        return await self._run(report_format, payload, filename)
+                    except BrokenProcessPool:
+                        # Another render's worker was killed (timeout) or crashed; the pool is new now.
+                        logger.warning("Report worker pool was restarted, rendering %s again", filename)
+                        return await self._run(report_format, payload, filename)
+        finally:
+            self._active[user_id] -= 1
+            if not self._active[user_id]:
+                del self._active[user_id]
+
+    async def _run(self, report_format: str, payload: Dict, filename: str) -> RenderedReport:
+        self.start()
+        pool = self._pool
+        assert pool is not None
+        future = None
+        try:
+            future = pool.submit(_render, report_format, payload, filename, self.spill_bytes)
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Timed out or the caller went away. A running task cannot be
+            # interrupted, so the pool is replaced and its workers killed.
+            if future is not None and not future.cancel() and future.running():
+                logger.warning("Killing report workers to stop rendering %s", filename)
+                self._discard(pool)
+            raise
+        except BrokenProcessPool:
+            self._discard(pool)
+            raise
+
+    def _discard(self, pool: ProcessPoolExecutor) -> None:
+        if self._pool is pool:
+            self._pool = None
+        # Renders still queued on it fail with BrokenProcessPool and are retried.
+        self._kill(pool, cancel_pending=False)
+
+    @staticmethod
+    def _kill(pool: ProcessPoolExecutor, cancel_pending: bool) -> None:
+        # The executor has no public way to stop a running task, so terminate its workers.
+        processes = list((pool._processes or {}).values())
+        pool.shutdown(wait=False, cancel_futures=cancel_pending)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+
+report_renderer = ReportRenderer(
+    workers=config.REPORT_RENDER_WORKERS,
+    per_user=config.REPORT_RENDER_PER_USER,
+    timeout=config.REPORT_RENDER_TIMEOUT_SECONDS,
+    spill_bytes=config.REPORT_SPILL_BYTES,
+)
@@ -1,33 +1,34 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, date, timedelta
 from typing import List, Dict
-from models import Expense, Income
-from utils.excel_generator import generate_excel_report
-from utils.pdf_generator import generate_pdf_report
+from utils.helpers import get_month_range
+from utils.money import Money
 from services.expense_service import ExpenseService
 from services.income_service import IncomeService
+from services.report_renderer import EXCEL, PDF, RenderedReport, report_renderer
+from services.rollup_service import EXPENSE_KIND, INCOME_KIND, RollupService
+from services.settings_service import SettingsService
 
 class ReportService:
     @staticmethod
-    def generate_daily_report(db: Session, user_id: int, report_date: date | None = None) -> Dict:
+    async def generate_daily_report(db: AsyncSession, user_id: int, report_date: date | None = None) -> Dict:
         if report_date is None:
-            report_date = date.today()
+            report_date = await SettingsService.local_today(db, user_id)
         
         # Get expenses
-        expenses = ExpenseService.get_expenses_by_period(
+        expenses = await ExpenseService.get_expenses_by_period(
             db, user_id, report_date, report_date
         )
-        total_expenses = ExpenseService.get_total_expenses(db, user_id, expenses)
-        category_totals = ExpenseService.get_expenses_by_category(
+        total_expenses = await ExpenseService.get_total_expenses(db, user_id, report_date, report_date)
+        category_totals = await ExpenseService.get_expenses_by_category(
             db, user_id, report_date, report_date
         )
         
         # Get income
-        income_data = IncomeService.get_monthly_income(
-            db, user_id, report_date.year, report_date.month
+        daily_incomes = await IncomeService.get_incomes_by_period(
+            db, user_id, report_date, report_date
         )
-        daily_incomes = [inc for inc in income_data['incomes'] if inc.date == report_date]
-        total_income = sum(inc.amount for inc in daily_incomes)
+        total_income = await IncomeService.get_total_income(db, user_id, report_date, report_date)
         
         return {
             "period": f"Kunlik hisobot - {report_date.strftime('%d.%m.%Y')}",
@@ -42,27 +43,19 @@ class ReportService:
         }
 
     @staticmethod
-    def generate_weekly_report(db: Session, user_id: int) -> Dict:
-        today = date.today()
+    async def generate_weekly_report(db: AsyncSession, user_id: int) -> Dict:
+        today = await SettingsService.local_today(db, user_id)
         start_date = today - timedelta(days=today.weekday())
         end_date = start_date + timedelta(days=6)
         
         # Get expenses
-        expenses = ExpenseService.get_expenses_by_period(db, user_id, start_date, end_date)
-        total_expenses = ExpenseService.get_total_expenses(db, user_id, expenses)
-        category_totals = ExpenseService.get_expenses_by_category(db, user_id, start_date, end_date)
+        expenses = await ExpenseService.get_expenses_by_period(db, user_id, start_date, end_date)
+        total_expenses = await ExpenseService.get_total_expenses(db, user_id, start_date, end_date)
+        category_totals = await ExpenseService.get_expenses_by_category(db, user_id, start_date, end_date)
         
         # Get income for the week
-        total_income = 0
-        weekly_incomes = []
-        for day_offset in range(7):
-            current_date = start_date + timedelta(days=day_offset)
-            income_data = IncomeService.get_monthly_income(
-                db, user_id, current_date.year, current_date.month
-            )
-            daily_incomes = [inc for inc in income_data['incomes'] if inc.date == current_date]
-            total_income += sum(inc.amount for inc in daily_incomes)
-            weekly_incomes.extend(daily_incomes)
+        weekly_incomes = await IncomeService.get_incomes_by_period(db, user_id, start_date, end_date)
+        total_income = await IncomeService.get_total_income(db, user_id, start_date, end_date)
         
         return {
             "period": f"Haftalik hisobot - {start_date.strftime('%d.%m.%Y')} dan {end_date.strftime('%d.%m.%Y')} gacha",
@@ -77,25 +70,20 @@ class ReportService:
         }
 
     @staticmethod
-    def generate_monthly_report(db: Session, user_id: int, year: int | None = None, month: int | None = None) -> Dict:
-        today = date.today()
+    async def generate_monthly_report(db: AsyncSession, user_id: int, year: int | None = None, month: int | None = None) -> Dict:
+        today = await SettingsService.local_today(db, user_id)
         year = year or today.year
         month = month or today.month
         
-        if month == 12:
-            end_date = date(year + 1, 1, 1) - timedelta(days=1)
-        else:
-            end_date = date(year, month + 1, 1) - timedelta(days=1)
-        
-        start_date = date(year, month, 1)
+        start_date, end_date = get_month_range(year, month)
         
         # Get expenses
-        expenses = ExpenseService.get_expenses_by_period(db, user_id, start_date, end_date)
-        total_expenses = ExpenseService.get_total_expenses(db, user_id, expenses)
-        category_totals = ExpenseService.get_expenses_by_category(db, user_id, start_date, end_date)
+        expenses = await ExpenseService.get_expenses_by_period(db, user_id, start_date, end_date)
+        total_expenses = await ExpenseService.get_total_expenses(db, user_id, start_date, end_date)
+        category_totals = await ExpenseService.get_expenses_by_category(db, user_id, start_date, end_date)
         
         # Get income
-        income_data = IncomeService.get_monthly_income(db, user_id, year, month)
+        income_data = await IncomeService.get_monthly_income(db, user_id, year, month)
         total_income = income_data['total_amount']
         incomes = income_data['incomes']
         
@@ -112,44 +100,63 @@ class ReportService:
         }
 
     @staticmethod
-    def generate_yearly_report(db: Session, user_id: int, year: int | None = None) -> Dict:
-        today = date.today()
+    async def get_monthly_totals(db: AsyncSession, user_id: int, start_date: date, end_date: date) -> Dict[int, Dict]:
+        """
+        Per-month income and expense sums/counts for the period from the daily rollup.
+        Keys are month numbers; months without rows are absent.
+        """
+        monthly: Dict[int, Dict] = {}
+        for month_start, kinds in (await RollupService.get_monthly_totals(db, user_id, start_date, end_date)).items():
+            expenses, expense_count = kinds.get(EXPENSE_KIND, (Money(0), 0))
+            income, income_count = kinds.get(INCOME_KIND, (Money(0), 0))
+            monthly[month_start.month] = {
+                'expenses': expenses,
+                'income': income,
+                'expense_count': expense_count,
+                'income_count': income_count,
+            }
+        return monthly
+
+    @staticmethod
+    async def generate_yearly_report(db: AsyncSession, user_id: int, year: int | None = None, include_rows: bool = True) -> Dict:
+        today = await SettingsService.local_today(db, user_id)
         year = year or today.year
         
         start_date = date(year, 1, 1)
         end_date = date(year, 12, 31)
         
-        # Get expenses
-        expenses = ExpenseService.get_expenses_by_period(db, user_id, start_date, end_date)
-        total_expenses = ExpenseService.get_total_expenses(db, user_id, expenses)
-        category_totals = ExpenseService.get_expenses_by_category(db, user_id, start_date, end_date)
-        
-        # Get income
-        total_income = 0
-        yearly_incomes = []
-        for month in range(1, 13):
-            income_data = IncomeService.get_monthly_income(db, user_id, year, month)
-            total_income += income_data['total_amount']
-            yearly_incomes.extend(income_data['incomes'])
-        
-        # Get monthly breakdown
+        # Totals come from grouped queries; rows are only needed for the attachment.
+        monthly = await ReportService.get_monthly_totals(db, user_id, start_date, end_date)
+        category_totals = await ExpenseService.get_expenses_by_category(db, user_id, start_date, end_date)
+
         monthly_totals = {}
         for month in range(1, 13):
-            month_expenses = ExpenseService.get_monthly_expenses(db, user_id, year, month)
-            month_income_data = IncomeService.get_monthly_income(db, user_id, year, month)
-            month_total_expenses = ExpenseService.get_total_expenses(db, user_id, month_expenses)
+            data = monthly.get(month, {})
+            month_income = data.get('income', Money(0))
+            month_expenses = data.get('expenses', Money(0))
             monthly_totals[month] = {
-                'expenses': month_total_expenses,
-                'income': month_income_data['total_amount'],
-                'balance': month_income_data['total_amount'] - month_total_expenses
+                'expenses': month_expenses,
+                'income': month_income,
+                'balance': month_income - month_expenses
             }
+
+        total_income = sum(data['income'] for data in monthly_totals.values())
+        total_expenses = sum(data['expenses'] for data in monthly_totals.values())
+
+        expenses = []
+        yearly_incomes = []
+        if include_rows:
+            expenses = await ExpenseService.get_expenses_by_period(db, user_id, start_date, end_date)
+            yearly_incomes = await IncomeService.get_incomes_by_period(db, user_id, start_date, end_date)
         
         return {
             "period": f"Yillik hisobot - {year}",
             "expenses": expenses,
+            "expense_count": sum(data.get('expense_count', 0) for data in monthly.values()),
             "total_expenses": total_expenses,
             "category_totals": category_totals,
             "incomes": yearly_incomes,
+            "income_count": sum(data.get('income_count', 0) for data in monthly.values()),
             "total_income": total_income,
             "balance": total_income - total_expenses,
             "monthly_totals": monthly_totals,
@@ -158,24 +165,15 @@ class ReportService:
         }
 
     @staticmethod
-    def generate_custom_report(db: Session, user_id: int, start_date: date, end_date: date) -> Dict:
+    async def generate_custom_report(db: AsyncSession, user_id: int, start_date: date, end_date: date) -> Dict:
         # Get expenses
-        expenses = ExpenseService.get_expenses_by_period(db, user_id, start_date, end_date)
-        total_expenses = ExpenseService.get_total_expenses(db, user_id, expenses)
-        category_totals = ExpenseService.get_expenses_by_category(db, user_id, start_date, end_date)
+        expenses = await ExpenseService.get_expenses_by_period(db, user_id, start_date, end_date)
+        total_expenses = await ExpenseService.get_total_expenses(db, user_id, start_date, end_date)
+        category_totals = await ExpenseService.get_expenses_by_category(db, user_id, start_date, end_date)
         
         # Get income for custom period once to avoid duplicate rows/sums.
-        custom_incomes = (
-            db.query(Income)
-            .filter(
-                Income.user_id == user_id,
-                Income.date >= start_date,
-                Income.date <= end_date,
-            )
-            .order_by(Income.date)
-            .all()
-        )
-        total_income = sum(inc.amount for inc in custom_incomes)
+        custom_incomes = await IncomeService.get_incomes_by_period(db, user_id, start_date, end_date)
+        total_income = await IncomeService.get_total_income(db, user_id, start_date, end_date)
         
         return {
             "period": f"Hisobot - {start_date.strftime('%d.%m.%Y')} dan {end_date.strftime('%d.%m.%Y')} gacha",
@@ -190,9 +188,10 @@ class ReportService:
         }
 
     @staticmethod
-    async def create_excel_report(report_data: Dict, filename: str) -> str:
-        return await generate_excel_report(report_data, filename)
+    async def create_excel_report(user_id: int, report_data: Dict, filename: str) -> RenderedReport:
+        """Rendered in a worker process; see ReportRenderer for limits and errors."""
+        return await report_renderer.render(user_id, EXCEL, report_data, filename)
 
     @staticmethod
-    async def create_pdf_report(report_data: Dict, filename: str) -> str:
-        return await generate_pdf_report(report_data, filename)
+    async def create_pdf_report(user_id: int, report_data: Dict, filename: str) -> RenderedReport:
+        return await report_renderer.render(user_id, PDF, report_data, filename)
@@ -0,0 +1,188 @@
+from datetime import date
+from typing import Dict, List
+
+from sqlalchemy import delete, func, literal_column, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import DailyTotal, Expense, Income
+from utils.money import Money, MoneyType
+
+EXPENSE_KIND = "expense"
+INCOME_KIND = "income"
+
+
+class RollupService:
+    """
+    Maintains the daily_totals rollup. Writers call apply() in the same
+    transaction as the row change; readers aggregate the rollup instead of
+    the raw expenses/income tables.
+    """
+
+    @staticmethod
+    async def apply(
+        db: AsyncSession,
+        user_id: int,
+        day: date,
+        kind: str,
+        category: str | None,
+        amount: Money,
+        row_count: int,
+    ) -> None:
+        """Add amount/row_count (negative to remove) to one rollup bucket. Does not commit."""
+        category = category or ""
+        stmt = insert(DailyTotal).values(
+            user_id=user_id,
+            day=day,
+            kind=kind,
+            category=category,
+            amount_sum=amount,
+            row_count=row_count,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DailyTotal.user_id, DailyTotal.day, DailyTotal.kind, DailyTotal.category],
+            set_={
+                "amount_sum": DailyTotal.amount_sum + stmt.excluded.amount_sum,
+                "row_count": DailyTotal.row_count + stmt.excluded.row_count,
+            },
+        )
+        await db.execute(stmt)
+
+        if row_count < 0:
+            await db.execute(delete(DailyTotal).where(
+                DailyTotal.user_id == user_id,
+                DailyTotal.day == day,
+                DailyTotal.kind == kind,
+                DailyTotal.category == category,
+                DailyTotal.row_count <= 0,
+            ))
+
+    @staticmethod
+    def _period_filters(user_id: int, kind: str, start_date: date | None, end_date: date | None) -> list:
+        filters = [DailyTotal.user_id == user_id, DailyTotal.kind == kind]
+        if start_date:
+            filters.append(DailyTotal.day >= start_date)
+        if end_date:
+            filters.append(DailyTotal.day <= end_date)
+        return filters
+
+    @staticmethod
+    async def get_totals(
+        db: AsyncSession,
+        user_id: int,
+        kind: str,
+        start_date: date | None = None,
+        end_date: date | None = None,
+    ) -> tuple[Money, int]:
+        row = (await db.execute(select(
+            func.coalesce(func.sum(DailyTotal.amount_sum, type_=MoneyType), 0),
+            func.coalesce(func.sum(DailyTotal.row_count), 0),
+        ).where(*RollupService._period_filters(user_id, kind, start_date, end_date)))).one()
+        return Money(row[0]), int(row[1])
+
+    @staticmethod
+    async def get_category_totals(
+        db: AsyncSession,
+        user_id: int,
+        kind: str,
+        start_date: date,
+        end_date: date,
+    ) -> Dict[str | None, Money]:
+        result = await db.execute(select(
+            DailyTotal.category,
+            func.sum(DailyTotal.amount_sum, type_=MoneyType),
+        ).where(
+            *RollupService._period_filters(user_id, kind, start_date, end_date)
+        ).group_by(DailyTotal.category))
+        return {category or None: total for category, total in result.all()}
+
+    @staticmethod
+    async def get_monthly_totals(
+        db: AsyncSession,
+        user_id: int,
+        start_date: date,
+        end_date: date,
+    ) -> Dict[date, Dict[str, tuple[Money, int]]]:
+        """Return {month_start: {kind: (sum, count)}} for months that have rows."""
+        month = func.date_trunc(literal_column("'month'"), DailyTotal.day)
+        result = await db.execute(select(
+            month,
+            DailyTotal.kind,
+            func.sum(DailyTotal.amount_sum, type_=MoneyType),
+            func.sum(DailyTotal.row_count),
+        ).where(
+            DailyTotal.user_id == user_id,
+            DailyTotal.day >= start_date,
+            DailyTotal.day <= end_date,
+        ).group_by(month, DailyTotal.kind))
+
+        monthly: Dict[date, Dict[str, tuple[Money, int]]] = {}
+        for month_start, kind, total, row_count in result.all():
+            monthly.setdefault(month_start.date(), {})[kind] = (total, int(row_count))
+        return monthly
+
+    @staticmethod
+    async def _raw_buckets(db: AsyncSession, user_id: int) -> Dict[tuple, tuple[Money, int]]:
+        expense_rows = await db.execute(select(
+            Expense.date,
+            Expense.category,
+            func.sum(Expense.amount, type_=MoneyType),
+            func.count(Expense.id),
+        ).where(
+            Expense.user_id == user_id,
+            Expense.is_future == False
+        ).group_by(Expense.date, Expense.category))
+        income_rows = await db.execute(select(
+            Income.date,
+            Income.category,
+            func.sum(Income.amount, type_=MoneyType),
+            func.count(Income.id),
+        ).where(
+            Income.user_id == user_id
+        ).group_by(Income.date, Income.category))
+
+        buckets: Dict[tuple, tuple[Money, int]] = {}
+        for kind, rows in ((EXPENSE_KIND, expense_rows), (INCOME_KIND, income_rows)):
+            for day, category, total, row_count in rows.all():
+                key = (day, kind, category or "")
+                prev_total, prev_count = buckets.get(key, (Money(0), 0))
+                buckets[key] = (Money(prev_total + total), prev_count + int(row_count))
+        return buckets
+
+    @staticmethod
+    async def check_consistency(
+        db: AsyncSession,
+        user_ids: List[int] | None = None,
+        sample_size: int = 20,
+    ) -> List[dict]:
+        """
+        Compare rollup buckets against raw rows for the given users, or for a
+        random sample of users. Returns one dict per mismatching bucket.
+        """
+        if user_ids is None:
+            users = select(Expense.user_id).union(select(Income.user_id)).subquery()
+            user_ids = list((await db.scalars(
+                select(users.c.user_id).order_by(func.random()).limit(sample_size)
+            )).all())
+
+        mismatches: List[dict] = []
+        for user_id in user_ids:
+            raw = await RollupService._raw_buckets(db, user_id)
+            rollup = {
+                (row.day, row.kind, row.category): (row.amount_sum, row.row_count)
+                for row in (await db.scalars(select(DailyTotal).where(DailyTotal.user_id == user_id))).all()
+            }
+            for key in raw.keys() | rollup.keys():
+                raw_total, raw_count = raw.get(key, (Money(0), 0))
+                rollup_total, rollup_count = rollup.get(key, (Money(0), 0))
+                if raw_count != rollup_count or raw_total != rollup_total:
+                    day, kind, category = key
+                    mismatches.append({
+                        "user_id": user_id,
+                        "day": day,
+                        "kind": kind,
+                        "category": category,
+                        "raw": (raw_total, raw_count),
+                        "rollup": (rollup_total, rollup_count),
+                    })
+        return mismatches
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Classic token bucket; reserve() returns how long the caller has to wait for its token."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float | None = None) -> float:
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        blocked = max(0.0, self.blocked_until - now)
+        missing = max(0.0, 1 - self.tokens)
+        return max(blocked, missing / self.rate)
+
+    def reserve(self, now: float | None = None) -> float:
+        now = time.monotonic() if now is None else now
+        wait = self.delay(now)
+        self.tokens -= 1
+        return wait
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+@dataclass(slots=True)
+class SendStats:
+    submitted: int = 0
+    sent: int = 0
+    failed: int = 0
+    retry_after: int = 0
+    latency_total_seconds: float = 0.0
+    latency_max_seconds: float = 0.0
+
+
+@dataclass(slots=True)
+class _SendJob:
+    chat_id: int
+    factory: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+class SendScheduler:
+    """
+    Shared outbound queue for Telegram calls. A fixed number of workers drain
+    it under a global token bucket and a bucket per chat; a chat that is over
+    its limit or got TelegramRetryAfter is parked without holding a worker.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        chat_rate: float,
+        chat_burst: int,
+        concurrency: int,
+        max_attempts: int = 3,
+    ) -> None:
+        # No global burst: Telegram counts per second, so pace evenly from the start.
+        self.global_bucket = TokenBucket(rate, 1)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.stats = SendStats()
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._queue: asyncio.Queue[_SendJob] | None = None
+        self._workers: list[asyncio.Task] = []
+        self._parked = 0
+        self._timers: set[asyncio.TimerHandle] = set()
+        # Futures handed out by submit() that are not resolved yet.
+        self._pending: set[asyncio.Future] = set()
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """Stop the workers and cancel every unfinished send, queued, parked or in flight."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for timer in self._timers:
+            timer.cancel()
+        self._timers.clear()
+        self._parked = 0
+        for future in list(self._pending):
+            future.cancel()
+        self._pending.clear()
+        self._queue = None
+
+    def submit(self, chat_id: int, factory: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """Queue a send; factory is called once per attempt and must return a fresh awaitable."""
+        self.start()
+        job = _SendJob(chat_id, factory, asyncio.get_running_loop().create_future())
+        self._pending.add(job.future)
+        job.future.add_done_callback(self._pending.discard)
+        self.stats.submitted += 1
+        self._queue.put_nowait(job)  # type: ignore[union-attr]
+        return job.future
+
+    async def send(self, chat_id: int, factory: Callable[[], Awaitable[Any]]) -> Any:
+        return await self.submit(chat_id, factory)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10_000:
+                now = time.monotonic()
+                self._chat_buckets = {k: b for k, b in self._chat_buckets.items() if not b.is_idle(now)}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _park(self, job: _SendJob, delay: float) -> None:
+        queue = self._queue
+
+        def _requeue() -> None:
+            self._timers.discard(timer)
+            self._parked -= 1
+            if queue is not None:
+                queue.put_nowait(job)
+
+        self._parked += 1
+        timer = asyncio.get_running_loop().call_later(delay, _requeue)
+        self._timers.add(timer)
+
+    async def _worker(self) -> None:
+        queue = self._queue
+        assert queue is not None
+        while True:
+            job = await queue.get()
+            try:
+                await self._run(job)
+            finally:
+                queue.task_done()
+
+    async def _run(self, job: _SendJob) -> None:
+        if job.future.done():
+            return
+
+        chat_bucket = self._chat_bucket(job.chat_id)
+        chat_wait = chat_bucket.delay()
+        if chat_wait > 0:
+            self._park(job, chat_wait)
+            return
+        chat_bucket.reserve()
+
+        global_wait = self.global_bucket.reserve()
+        if global_wait > 0:
+            await asyncio.sleep(global_wait)
+
+        job.attempts += 1
+        try:
+            result = await job.factory()
+        except TelegramRetryAfter as e:
+            self.stats.retry_after += 1
+            logger.warning("Telegram flood limit for chat %s, retry after %ss", job.chat_id, e.retry_after)
+            chat_bucket.block(e.retry_after)
+            if job.attempts < self.max_attempts:
+                self._park(job, e.retry_after)
+                return
+            self._finish(job, error=e)
+        except Exception as e:
+            self._finish(job, error=e)
+        else:
+            self._finish(job, result=result)
+
+    def _finish(self, job: _SendJob, result: Any = None, error: BaseException | None = None) -> None:
+        if job.future.done():
+            return
+        latency = time.monotonic() - job.enqueued_at
+        self.stats.latency_total_seconds += latency
+        self.stats.latency_max_seconds = max(self.stats.latency_max_seconds, latency)
+        if error is None:
+            self.stats.sent += 1
+            job.future.set_result(result)
+        else:
+            self.stats.failed += 1
+            job.future.set_exception(error)
+
+    def snapshot(self) -> dict:
+        stats = asdict(self.stats)
+        done = stats["sent"] + stats["failed"]
+        stats["latency_avg_ms"] = (stats.pop("latency_total_seconds") / done * 1000) if done else 0.0
+        stats["latency_max_ms"] = stats.pop("latency_max_seconds") * 1000
+        stats["queue_depth"] = (self._queue.qsize() if self._queue is not None else 0) + self._parked
+        stats["parked"] = self._parked
+        return stats
+
+
+send_scheduler = SendScheduler(
+    rate=config.SEND_RATE_PER_SECOND,
+    chat_rate=config.SEND_CHAT_RATE_PER_SECOND,
+    chat_burst=config.SEND_CHAT_BURST,
+    concurrency=config.SEND_CONCURRENCY,
+)
@@ -1,13 +1,62 @@
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from config import config
 from models import UserSettings
+from utils.helpers import local_today
+
+# Choices offered in settings; the first one is the default.
+OVERDUE_COOLDOWN_HOURS = (8, 24, 72)
+
+# user_id -> (timezone name, expiry on time.monotonic()), least recently used
+# first and capped at TIMEZONE_CACHE_SIZE. Only committed values go in; other
+# replicas' changes show up after TIMEZONE_CACHE_SECONDS.
+_timezone_cache: OrderedDict[int, Tuple[str, float]] = OrderedDict()
+# Session.info key: timezones set in the session's open transaction.
+_PENDING_TIMEZONES = "pending_timezones"
+
+
+def _cache_timezone(user_id: int, timezone_name: str) -> None:
+    _timezone_cache[user_id] = (timezone_name, time.monotonic() + config.TIMEZONE_CACHE_SECONDS)
+    _timezone_cache.move_to_end(user_id)
+    while len(_timezone_cache) > config.TIMEZONE_CACHE_SIZE:
+        _timezone_cache.popitem(last=False)
+
+
+def _cached_timezone(user_id: int) -> str | None:
+    cached = _timezone_cache.get(user_id)
+    if cached is None:
+        return None
+    if cached[1] <= time.monotonic():
+        del _timezone_cache[user_id]
+        return None
+    _timezone_cache.move_to_end(user_id)
+    return cached[0]
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed_timezones(session: Session) -> None:
+    for user_id, timezone_name in session.info.pop(_PENDING_TIMEZONES, {}).items():
+        _cache_timezone(user_id, timezone_name)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back_timezones(session: Session) -> None:
+    session.info.pop(_PENDING_TIMEZONES, None)
 
 
 class SettingsService:
     @staticmethod
-    def get_or_create(db: Session, user_id: int) -> UserSettings:
-        settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
+    async def get_or_create(db: AsyncSession, user_id: int) -> UserSettings:
+        settings = await db.scalar(
+            select(UserSettings).where(UserSettings.user_id == user_id).limit(1)
+        )
         if settings:
             return settings
 
@@ -18,49 +67,87 @@ class SettingsService:
             daily_reminder_enabled=True,
             overdue_reminder_enabled=True,
             daily_summary_enabled=True,
+            digest_enabled=False,
+            overdue_cooldown_hours=OVERDUE_COOLDOWN_HOURS[0],
         )
         db.add(settings)
-        db.commit()
-        db.refresh(settings)
+        await db.flush()
+        await db.refresh(settings)
         return settings
 
     @staticmethod
-    def set_timezone(db: Session, user_id: int, timezone_name: str) -> UserSettings:
-        settings = SettingsService.get_or_create(db, user_id)
+    async def set_timezone(db: AsyncSession, user_id: int, timezone_name: str) -> UserSettings:
+        settings = await SettingsService.get_or_create(db, user_id)
         settings.timezone = timezone_name
-        db.commit()
-        db.refresh(settings)
+        await db.flush()
+        await db.refresh(settings)
+        db.info.setdefault(_PENDING_TIMEZONES, {})[user_id] = timezone_name
         return settings
 
     @staticmethod
-    def set_report_format(db: Session, user_id: int, report_format: str) -> UserSettings:
-        settings = SettingsService.get_or_create(db, user_id)
+    async def get_timezone(db: AsyncSession, user_id: int) -> str:
+        pending = db.info.get(_PENDING_TIMEZONES, {})
+        if user_id in pending:
+            return pending[user_id]
+        cached = _cached_timezone(user_id)
+        if cached is not None:
+            return cached
+        timezone_name = await db.scalar(
+            select(UserSettings.timezone).where(UserSettings.user_id == user_id).limit(1)
+        ) or config.TIMEZONE
+        _cache_timezone(user_id, timezone_name)
+        return timezone_name
+
+    @staticmethod
+    async def local_today(db: AsyncSession, user_id: int) -> date:
+        """Today's date in the user's timezone."""
+        return local_today(await SettingsService.get_timezone(db, user_id))
+
+    @staticmethod
+    async def set_report_format(db: AsyncSession, user_id: int, report_format: str) -> UserSettings:
+        settings = await SettingsService.get_or_create(db, user_id)
         normalized = (report_format or "").strip().lower()
         settings.report_format = "pdf" if normalized == "pdf" else "xlsx"
-        db.commit()
-        db.refresh(settings)
+        await db.flush()
+        await db.refresh(settings)
         return settings
 
     @staticmethod
-    def toggle_daily_reminder(db: Session, user_id: int) -> UserSettings:
-        settings = SettingsService.get_or_create(db, user_id)
+    async def set_overdue_cooldown(db: AsyncSession, user_id: int, hours: int) -> UserSettings:
+        settings = await SettingsService.get_or_create(db, user_id)
+        settings.overdue_cooldown_hours = hours if hours in OVERDUE_COOLDOWN_HOURS else OVERDUE_COOLDOWN_HOURS[0]
+        await db.flush()
+        await db.refresh(settings)
+        return settings
+
+    @staticmethod
+    async def toggle_daily_reminder(db: AsyncSession, user_id: int) -> UserSettings:
+        settings = await SettingsService.get_or_create(db, user_id)
         settings.daily_reminder_enabled = not bool(settings.daily_reminder_enabled)
-        db.commit()
-        db.refresh(settings)
+        await db.flush()
+        await db.refresh(settings)
         return settings
 
     @staticmethod
-    def toggle_overdue_reminder(db: Session, user_id: int) -> UserSettings:
-        settings = SettingsService.get_or_create(db, user_id)
+    async def toggle_overdue_reminder(db: AsyncSession, user_id: int) -> UserSettings:
+        settings = await SettingsService.get_or_create(db, user_id)
         settings.overdue_reminder_enabled = not bool(settings.overdue_reminder_enabled)
-        db.commit()
-        db.refresh(settings)
+        await db.flush()
+        await db.refresh(settings)
         return settings
 
     @staticmethod
-    def toggle_daily_summary(db: Session, user_id: int) -> UserSettings:
-        settings = SettingsService.get_or_create(db, user_id)
+    async def toggle_daily_summary(db: AsyncSession, user_id: int) -> UserSettings:
+        settings = await SettingsService.get_or_create(db, user_id)
         settings.daily_summary_enabled = not bool(settings.daily_summary_enabled)
-        db.commit()
-        db.refresh(settings)
+        await db.flush()
+        await db.refresh(settings)
+        return settings
+
+    @staticmethod
+    async def toggle_digest(db: AsyncSession, user_id: int) -> UserSettings:
+        settings = await SettingsService.get_or_create(db, user_id)
+        settings.digest_enabled = not bool(settings.digest_enabled)
+        await db.flush()
+        await db.refresh(settings)
         return settings
@@ -1,170 +1,204 @@
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.utils import get_column_letter
 from datetime import datetime
 import os
-from typing import Dict, List
-
-async def generate_excel_report(report_data: Dict, filename: str | None = None) -> str:
-    """Generate Excel report from report data"""
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    if ws is None:
-        ws = wb.create_sheet("Hisobot")
-    ws.title = "Hisobot"
-    
-    # Styles
-    header_font = Font(bold=True, color="FFFFFF", size=12)
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    
-    title_font = Font(bold=True, size=14)
-    title_alignment = Alignment(horizontal="center")
-    
-    currency_font = Font(size=11)
-    currency_alignment = Alignment(horizontal="right")
-    
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    
-    # Title
-    ws.merge_cells('A1:E1')
-    ws['A1'] = report_data.get("period", "Hisobot")
-    ws['A1'].font = title_font
-    ws['A1'].alignment = title_alignment
-    
-    # Headers
-    headers = ["Sana", "Turi", "Kategoriya", "Miqdor (so'm)", "Izoh"]
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=3, column=col_num)
-        cell.value = header if header else "None Header" # pyright: ignore[reportAttributeAccessIssue] # 
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-    
-    # Data
-    row_num = 4
-    
-    # Add income data first
-    incomes = report_data.get("incomes", [])
-    for income in incomes:
-        ws.cell(row=row_num, column=1, value=income.date.strftime("%d.%m.%Y")).border = thin_border
-        ws.cell(row=row_num, column=2, value="KIRIM").border = thin_border
-        ws.cell(row=row_num, column=3, value=income.category).border = thin_border
-        
-        amount_cell = ws.cell(row=row_num, column=4, value=income.amount)
-        amount_cell.number_format = '#,##0'
-        amount_cell.font = currency_font
-        amount_cell.alignment = currency_alignment
-        amount_cell.border = thin_border
-        
-        ws.cell(row=row_num, column=5, value=income.description or "").border = thin_border
-        row_num += 1
-    
-    # Add expense data
-    expenses = report_data.get("expenses", [])
-    for expense in expenses:
-        ws.cell(row=row_num, column=1, value=expense.date.strftime("%d.%m.%Y")).border = thin_border
-        ws.cell(row=row_num, column=2, value="XARAJAT").border = thin_border
-        ws.cell(row=row_num, column=3, value=expense.category).border = thin_border
-        
-        amount_cell = ws.cell(row=row_num, column=4, value=expense.amount)
-        amount_cell.number_format = '#,##0'
-        amount_cell.font = currency_font
-        amount_cell.alignment = currency_alignment
-        amount_cell.border = thin_border
-        
-        ws.cell(row=row_num, column=5, value=expense.description or "").border = thin_border
-        row_num += 1
-    
+from typing import Any, BinaryIO, Dict, List, Sequence, Tuple
+
+from utils.report_rows import ReportRow
+
+HEADERS = ["Sana", "Turi", "Kategoriya", "Miqdor (so'm)", "Izoh"]
+DATE_FORMAT = "%d.%m.%Y"
+MAX_COLUMN_WIDTH = 50
+
+# (value, named style or None) per column
+SheetRow = List[Tuple[Any, str | None]]
+
+
+def _named_styles() -> List[NamedStyle]:
+    """Styles shared by every cell that uses them (one xf record each instead of one per cell)."""
+    thin = Side(style='thin')
+    thin_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    negative_fill = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
+    return [
+        NamedStyle("report_title", font=Font(bold=True, size=14), alignment=Alignment(horizontal="center")),
+        NamedStyle(
+            "report_header",
+            font=Font(bold=True, color="FFFFFF", size=12),
+            fill=PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
+            alignment=Alignment(horizontal="center", vertical="center"),
+            border=thin_border,
+        ),
+        NamedStyle("report_cell", font=DEFAULT_FONT, border=thin_border),
+        NamedStyle(
+            "report_amount",
+            font=Font(size=11),
+            alignment=Alignment(horizontal="right"),
+            border=thin_border,
+            number_format='#,##0',
+        ),
+        NamedStyle("report_label", font=Font(bold=True)),
+        NamedStyle("report_total", font=Font(bold=True), number_format='#,##0'),
+        NamedStyle("report_total_negative", font=Font(bold=True), number_format='#,##0', fill=negative_fill),
+        NamedStyle("report_number", font=DEFAULT_FONT, number_format='#,##0'),
+        NamedStyle("report_number_negative", font=DEFAULT_FONT, number_format='#,##0', fill=negative_fill),
+    ]
+
+
+def _summary_rows(report_data: Dict, row_num: int) -> List[Tuple[int, SheetRow]]:
+    """Totals, category and monthly blocks below the data, keyed by sheet row number."""
+    rows: List[Tuple[int, SheetRow]] = []
+
     # Summary
     row_num += 1
-    ws.cell(row=row_num, column=1, value="JAMI KIRIM:").font = Font(bold=True)
-    income_total_cell = ws.cell(row=row_num, column=3, value=report_data.get("total_income", 0))
-    income_total_cell.font = Font(bold=True)
-    income_total_cell.number_format = '#,##0'
-    
+    rows.append((row_num, [("JAMI KIRIM:", "report_label"), (None, None), (report_data.get("total_income", 0), "report_total")]))
     row_num += 1
-    ws.cell(row=row_num, column=1, value="JAMI XARAJAT:").font = Font(bold=True)
-    expense_total_cell = ws.cell(row=row_num, column=3, value=report_data.get("total_expenses", 0))
-    expense_total_cell.font = Font(bold=True)
-    expense_total_cell.number_format = '#,##0'
-    
+    rows.append((row_num, [("JAMI XARAJAT:", "report_label"), (None, None), (report_data.get("total_expenses", 0), "report_total")]))
     row_num += 1
-    ws.cell(row=row_num, column=1, value="BALANS:").font = Font(bold=True)
     balance = report_data.get("balance", 0)
-    balance_total_cell = ws.cell(row=row_num, column=3, value=balance)
-    balance_total_cell.font = Font(bold=True)
-    balance_total_cell.number_format = '#,##0'
-    if balance < 0:
-        balance_total_cell.fill = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
-    
+    rows.append((row_num, [
+        ("BALANS:", "report_label"),
+        (None, None),
+        (balance, "report_total_negative" if balance < 0 else "report_total"),
+    ]))
+
     # Category summary
     if report_data.get("category_totals"):
         row_num += 2
-        ws.cell(row=row_num, column=1, value="Kategoriyalar bo'yicha:").font = Font(bold=True)
+        rows.append((row_num, [("Kategoriyalar bo'yicha:", "report_label")]))
         row_num += 1
-        
+
         category_totals = report_data.get("category_totals", {})
         for category, amount in sorted(category_totals.items(), key=lambda x: x[1], reverse=True):
-            ws.cell(row=row_num, column=1, value=category)
-            amount_cell = ws.cell(row=row_num, column=2, value=amount)
-            amount_cell.number_format = '#,##0'
+            rows.append((row_num, [(category, None), (amount, "report_number")]))
             row_num += 1
-    
+
     # Monthly summary for yearly report
     if report_data.get("monthly_totals"):
         row_num += 2
-        ws.cell(row=row_num, column=1, value="Oylik hisobot:").font = Font(bold=True)
+        rows.append((row_num, [("Oylik hisobot:", "report_label")]))
         row_num += 1
-        
+
         monthly_totals = report_data.get("monthly_totals", {})
         for month, data in monthly_totals.items():
             month_name = datetime(2024, month, 1).strftime("%B")
-            ws.cell(row=row_num, column=1, value=month_name)
-            
             if isinstance(data, dict):
                 # New format - show balance
                 balance = data.get('balance', 0)
-                amount_cell = ws.cell(row=row_num, column=2, value=balance)
-                amount_cell.number_format = '#,##0'
-                if balance < 0:
-                    amount_cell.fill = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
+                style = "report_number_negative" if balance < 0 else "report_number"
+                rows.append((row_num, [(month_name, None), (balance, style)]))
             else:
                 # Old format - show amount
-                amount_cell = ws.cell(row=row_num, column=2, value=data)
-                amount_cell.number_format = '#,##0'
-            
+                rows.append((row_num, [(month_name, None), (data, "report_number")]))
             row_num += 1
-    
-    # Auto-adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column if column[0].column else 1)
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
+
+    return rows
+
+
+def _fit(widths: List[int], values: Sequence[Any]) -> None:
+    for index, value in enumerate(values):
+        widths[index] = max(widths[index], len(str(value)))
+
+
+def _fit_entries(widths: List[int], entries: Sequence[ReportRow], kind: str) -> None:
+    """Data columns: the date and kind have a fixed length, so only three fields are measured."""
+    if not entries:
+        return
+    _fit(widths, [entries[0][0].strftime(DATE_FORMAT), kind])
+    category, amount, description = widths[2:5]
+    for _, entry_category, entry_amount, entry_description in entries:
+        category = max(category, len(str(entry_category)))
+        amount = max(amount, len(str(entry_amount)))
+        description = max(description, len(entry_description or ""))
+    widths[2:5] = [category, amount, description]
+
+
+def _styled_row(ws, row: SheetRow) -> List[Any]:
+    cells = []
+    for value, style in row:
+        if style is None:
+            cells.append(value)
+            continue
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        cells.append(cell)
+    return cells
+
+
+def generate_excel_report(report_data: Dict, output: str | BinaryIO | None = None) -> str | BinaryIO:
+    """
+    Generate Excel report from report data; incomes/expenses are ReportRow
+    tuples. The sheet is streamed row by row (openpyxl write-only mode) with
+    shared named styles, so memory stays flat for large yearly exports.
+    `output` is a file path or a writable binary stream. Blocking: called
+    in a report_renderer worker process.
+    """
+    title = report_data.get("period", "Hisobot")
+    incomes = report_data.get("incomes", [])
+    expenses = report_data.get("expenses", [])
+    summary = _summary_rows(report_data, 4 + len(incomes) + len(expenses))
+
+    # Column widths go in the sheet header, before any row is written, so they are
+    # measured up front from the raw values (no cell objects are built for that).
+    widths = [0] * len(HEADERS)
+    _fit(widths, [title])
+    _fit(widths, HEADERS)
+    _fit_entries(widths, incomes, "KIRIM")
+    _fit_entries(widths, expenses, "XARAJAT")
+    for _, row in summary:
+        _fit(widths, [value for value, _ in row])
+
+    wb = Workbook(write_only=True)
+    for style in _named_styles():
+        wb.add_named_style(style)
+    ws = wb.create_sheet("Hisobot")
+    for index, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(index)].width = min(width + 2, MAX_COLUMN_WIDTH)
+
+    # Title
+    ws.merged_cells.add('A1:E1')
+    ws.append(_styled_row(ws, [(title, "report_title")]))
+    ws.append([])
+
+    # Headers
+    ws.append(_styled_row(ws, [(header, "report_header") for header in HEADERS]))
+
+    # Data: incomes first, then expenses. Each appended row is serialised right
+    # away, so one set of styled cells is refilled for every row.
+    cells = [WriteOnlyCell(ws) for _ in HEADERS]
+    for cell, style in zip(cells, ["report_cell", "report_cell", "report_cell", "report_amount", "report_cell"]):
+        cell.style = style
+    date_cell, kind_cell, category_cell, amount_cell, description_cell = cells
+    for kind, entries in (("KIRIM", incomes), ("XARAJAT", expenses)):
+        kind_cell.value = kind
+        for entry_date, category, amount, description in entries:
+            date_cell.value = entry_date.strftime(DATE_FORMAT)
+            category_cell.value = category
+            amount_cell.value = amount
+            description_cell.value = description or ""
+            ws.append(cells)
+
+    # Summary blocks, with the blank rows between them
+    row_num = 4 + len(incomes) + len(expenses)
+    for summary_row_num, row in summary:
+        while row_num < summary_row_num:
+            ws.append([])
+            row_num += 1
+        ws.append(_styled_row(ws, row))
+        row_num += 1
+
     # Generate filename if not provided
-    if filename is None:
+    if output is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"reports/hisobot_{timestamp}.xlsx"
-    
+        output = f"reports/hisobot_{timestamp}.xlsx"
+
     # Ensure reports directory exists
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    
+    if isinstance(output, str):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+
     # Save workbook
-    wb.save(filename)
-    
-    return filename
+    wb.save(output)
+
+    return output
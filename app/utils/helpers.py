@@ -1,9 +1,31 @@
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, timedelta, timezone
+from functools import lru_cache
 from typing import Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import re
 
-def parse_date(date_str: str) -> Optional[date]:
-    """Parse date from various formats"""
+from config import config
+from utils.money import Money
+
+@lru_cache(maxsize=None)
+def get_zone(timezone_name: str | None = None) -> ZoneInfo:
+    """Cached ZoneInfo lookup; unknown names fall back to the bot's default timezone."""
+    try:
+        return ZoneInfo(timezone_name or config.TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(config.TIMEZONE)
+
+
+def local_now(timezone_name: str | None = None, now: datetime | None = None) -> datetime:
+    return (now or datetime.now(timezone.utc)).astimezone(get_zone(timezone_name))
+
+
+def local_today(timezone_name: str | None = None, now: datetime | None = None) -> date:
+    return local_now(timezone_name, now).date()
+
+
+def parse_date(date_str: str, today: date | None = None) -> Optional[date]:
+    """Parse date from various formats; relative dates count from `today` (the user's local date)"""
     date_str = date_str.strip()
     formats = [
         "%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y",
@@ -19,7 +41,7 @@ def parse_date(date_str: str) -> Optional[date]:
     
     # Try relative dates
     date_str = date_str.lower().strip()
-    today = date.today()
+    today = today or date.today()
     
     if date_str == "bugun" or date_str == "today":
         return today
@@ -40,17 +62,17 @@ def format_date(dt: date, format_str: str = "%d.%m.%Y") -> str:
     """Format date to string"""
     return dt.strftime(format_str)
 
-def format_amount(amount: float) -> str:
+def format_amount(amount: Money | float) -> str:
     """Format amount with thousand separators"""
     return f"{amount:,.0f}".replace(",", " ")
 
-def parse_amount(amount_str: str) -> Optional[float]:
+def parse_amount(amount_str: str) -> Optional[Money]:
     """Parse amount from string, remove spaces and commas"""
     try:
         # Remove spaces, commas, and non-digit characters except dot
         cleaned = re.sub(r'[^\d.]', '', amount_str)
-        return float(cleaned)
-    except:
+        return Money(cleaned)
+    except ValueError:
         return None
 
 def get_week_range(date_obj: date | None = None) -> Tuple[date, date]:
@@ -62,20 +84,27 @@ def get_week_range(date_obj: date | None = None) -> Tuple[date, date]:
     end = start + timedelta(days=6)
     return start, end
 
+def get_month_bounds(year: int, month: int) -> Tuple[date, date]:
+    """Get half-open [start, next_start) bounds of month for sargable date filters"""
+    start = date(year, month, 1)
+    if month == 12:
+        next_start = date(year + 1, 1, 1)
+    else:
+        next_start = date(year, month + 1, 1)
+    return start, next_start
+
+def get_year_bounds(year: int) -> Tuple[date, date]:
+    """Get half-open [start, next_start) bounds of year for sargable date filters"""
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
 def get_month_range(year: int | None = None, month: int | None = None) -> Tuple[date, date]:
     """Get start and end dates of month"""
     today = date.today()
     year = year or today.year
     month = month or today.month
     
-    if month == 12:
-        start = date(year, month, 1)
-        end = date(year + 1, 1, 1) - timedelta(days=1)
-    else:
-        start = date(year, month, 1)
-        end = date(year, month + 1, 1) - timedelta(days=1)
-    
-    return start, end
+    start, next_start = get_month_bounds(year, month)
+    return start, next_start - timedelta(days=1)
 
 def format_report_message(report_data: dict) -> str:
     """Format report data into readable message"""
@@ -89,11 +118,13 @@ def format_report_message(report_data: dict) -> str:
     
     # Income section
     message += f"💵 **Jami kirim:** {format_amount(total_income)} so'm\n"
-    message += f"📝 **Kirimlar soni:** {len(report_data.get('incomes', []))}\n\n"
+    income_count = report_data.get("income_count", len(report_data.get("incomes", [])))
+    message += f"📝 **Kirimlar soni:** {income_count}\n\n"
     
     # Expense section
     message += f"💸 **Jami xarajat:** {format_amount(total_expenses)} so'm\n"
-    message += f"📝 **Xarajatlar soni:** {len(report_data.get('expenses', []))}\n\n"
+    expense_count = report_data.get("expense_count", len(report_data.get("expenses", [])))
+    message += f"📝 **Xarajatlar soni:** {expense_count}\n\n"
     
     # Balance section
     if balance >= 0:
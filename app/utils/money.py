@@ -0,0 +1,51 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Any
+
+from sqlalchemy import BigInteger
+from sqlalchemy.types import TypeDecorator
+
+# Amounts are stored as integer tiyin (1 so'm = 100 tiyin).
+MINOR_UNITS = 100
+_QUANTUM = Decimal("0.01")
+
+
+class Money(Decimal):
+    """Exact so'm amount with tiyin precision."""
+
+    def __new__(cls, value: Any = 0) -> "Money":
+        if isinstance(value, float):
+            # repr() gives the shortest round-tripping form, e.g. 0.1 -> "0.1".
+            value = repr(value)
+        try:
+            amount = Decimal(value).quantize(_QUANTUM, rounding=ROUND_HALF_UP)
+        except InvalidOperation:
+            raise ValueError(f"Invalid money amount: {value!r}")
+        return super().__new__(cls, amount)
+
+    @classmethod
+    def from_minor(cls, minor_units: int | Decimal) -> "Money":
+        return cls(Decimal(int(minor_units)).scaleb(-2))
+
+    @property
+    def minor_units(self) -> int:
+        return int(self.scaleb(2))
+
+    def is_whole(self) -> bool:
+        return self.minor_units % MINOR_UNITS == 0
+
+
+class MoneyType(TypeDecorator):
+    """Stores Money as BIGINT tiyin; SUM() over it stays exact integer arithmetic."""
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect) -> int | None:
+        if value is None:
+            return None
+        return Money(value).minor_units
+
+    def process_result_value(self, value: Any, dialect) -> Money | None:
+        if value is None:
+            return None
+        return Money.from_minor(value)
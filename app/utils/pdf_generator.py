@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+from bisect import bisect_right
 from datetime import datetime
+from itertools import accumulate
 import os
-from typing import Any
+from typing import Any, BinaryIO, Callable, Sequence
 
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from reportlab.platypus import Flowable, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from reportlab.platypus.tables import CellStyle
+
+from utils.report_rows import ReportRow
 
 
 def _money(value: float | int) -> str:
@@ -20,15 +25,107 @@ def _safe_text(value: Any) -> str:
     return str(value)
 
 
-async def generate_pdf_report(report_data: dict[str, Any], filename: str | None = None) -> str:
-    if filename is None:
+# Row heights are precomputed with reportlab's own rule for text cells:
+# leading per line plus top/bottom padding of the default cell style.
+_CELL_STYLE = CellStyle("report")
+
+
+def _row_height(*texts: str) -> float:
+    lines = max(text.count("\n") for text in texts) + 1
+    return _CELL_STYLE.leading * lines + _CELL_STYLE.topPadding + _CELL_STYLE.bottomPadding
+
+
+class ChunkedTable(Flowable):
+    """
+    A long table with a repeated header, laid out one page at a time.
+    Splitting a single big Table re-measures and copies every remaining
+    row on each page (quadratic in rows); here only the rows of the page
+    being laid out are made into a Table. Row heights come precomputed, and
+    rows are turned into cell text only when their page is laid out.
+    """
+
+    def __init__(
+        self,
+        header: list[str],
+        rows: Sequence[Any],
+        make_line: Callable[[Any], list[str]],
+        heights: Sequence[float],
+        col_widths: list[float],
+        style: TableStyle,
+        start: int = 0,
+        offsets: list[float] | None = None,
+        piece: int = 0,
+    ) -> None:
+        super().__init__()
+        self.header = header
+        self.rows = rows
+        self.make_line = make_line
+        self.col_widths = col_widths
+        self.style = style
+        self.start = start
+        self.piece = piece
+        # offsets[i]: height of rows[:i], shared by all the pieces of one table
+        self.offsets = offsets if offsets is not None else [0.0, *accumulate(heights)]
+        self.header_height = _row_height(*header)
+        self.width = sum(col_widths)
+        self._table: Table | None = None
+
+    def _table_from(self, stop: int) -> Table:
+        """The header and rows[start:stop] as the Table a split would have left at this point."""
+        lines = [self.make_line(row) for row in self.rows[self.start:stop]]
+        # Continuations carry split-adjusted line commands (they stop changing
+        # after the second split); get them the same way, by splitting
+        # placeholder rows off the top, so the pages match a single Table's.
+        splits = min(self.piece, 2)
+        placeholder = [""] * len(self.header)
+        table = Table([self.header] + [placeholder] * splits + lines, colWidths=self.col_widths, repeatRows=1)
+        table.setStyle(self.style)
+        for _ in range(splits):
+            table = table.split(self.width, self.header_height + _row_height(*placeholder))[1]
+        return table
+
+    def wrap(self, availWidth, availHeight):
+        self._table = None
+        return self.width, self.header_height + self.offsets[-1] - self.offsets[self.start]
+
+    def split(self, availWidth, availHeight):
+        # Same rule as Table: as many whole rows as fit, at least one below the header.
+        limit = self.offsets[self.start] + availHeight - self.header_height
+        stop = bisect_right(self.offsets, limit) - 1
+        if stop <= self.start:
+            return []
+        if stop >= len(self.rows):
+            return [self]
+        page = self._table_from(stop + 1).split(availWidth, availHeight)[0]
+        rest = ChunkedTable(
+            self.header, self.rows, self.make_line, (),
+            self.col_widths, self.style, stop, self.offsets, self.piece + 1,
+        )
+        return [page, rest]
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        # The rest fits on this page: draw it as the final Table piece.
+        if self._table is None:
+            self._table = self._table_from(len(self.rows))
+            self._table.wrap(self.width, self.header_height + self.offsets[-1])
+        self._table.drawOn(canvas, x, y, _sW)
+
+
+def generate_pdf_report(report_data: dict[str, Any], output: str | BinaryIO | None = None) -> str | BinaryIO:
+    """
+    Incomes/expenses are ReportRow tuples; `output` is a file path or a
+    writable binary stream. Blocking: called in a report_renderer worker
+    process.
+    """
+    if output is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"reports/hisobot_{timestamp}.pdf"
+        output = f"reports/hisobot_{timestamp}.pdf"
 
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    if isinstance(output, str):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
 
     doc = SimpleDocTemplate(
-        filename,
+        output,
         pagesize=A4,
         leftMargin=24,
         rightMargin=24,
@@ -62,35 +159,37 @@ async def generate_pdf_report(report_data: dict[str, Any], filename: str | None
     story.append(summary_table)
     story.append(Spacer(1, 12))
 
-    lines: list[list[str]] = [["Sana", "Turi", "Kategoriya", "Miqdor", "Izoh"]]
-
-    for income in report_data.get("incomes", []):
-        lines.append(
-            [
-                income.date.strftime("%d.%m.%Y"),
-                "KIRIM",
-                _safe_text(getattr(income, "category", "")),
-                _money(float(getattr(income, "amount", 0))),
-                _safe_text(getattr(income, "description", "")),
-            ]
-        )
-
-    for expense in report_data.get("expenses", []):
-        lines.append(
-            [
-                expense.date.strftime("%d.%m.%Y"),
-                "XARAJAT",
-                _safe_text(getattr(expense, "category", "")),
-                _money(float(getattr(expense, "amount", 0))),
-                _safe_text(getattr(expense, "description", "")),
-            ]
-        )
-
-    if len(lines) == 1:
-        lines.append(["-", "-", "-", "-", "Ma'lumot topilmadi"])
+    entries: list[tuple[str, ReportRow] | None] = [
+        ("KIRIM", row) for row in report_data.get("incomes", [])
+    ]
+    entries.extend(("XARAJAT", row) for row in report_data.get("expenses", []))
+    if not entries:
+        entries.append(None)
+
+    def make_line(entry: tuple[str, ReportRow] | None) -> list[str]:
+        if entry is None:
+            return ["-", "-", "-", "-", "Ma'lumot topilmadi"]
+        kind, (entry_date, category, amount, description) = entry
+        return [
+            entry_date.strftime("%d.%m.%Y"),
+            kind,
+            _safe_text(category),
+            _money(float(amount or 0)),
+            _safe_text(description),
+        ]
+
+    # Only category and description can span several lines.
+    heights = [
+        _row_height(_safe_text(entry[1][1]), _safe_text(entry[1][3])) if entry else _row_height("")
+        for entry in entries
+    ]
 
-    data_table = Table(lines, colWidths=[70, 60, 110, 90, 180], repeatRows=1)
-    data_table.setStyle(
+    data_table = ChunkedTable(
+        ["Sana", "Turi", "Kategoriya", "Miqdor", "Izoh"],
+        entries,
+        make_line,
+        heights,
+        [70, 60, 110, 90, 180],
         TableStyle(
             [
                 ("GRID", (0, 0), (-1, -1), 0.4, colors.grey),
@@ -100,7 +199,7 @@ async def generate_pdf_report(report_data: dict[str, Any], filename: str | None
                 ("ALIGN", (3, 1), (3, -1), "RIGHT"),
                 ("VALIGN", (0, 0), (-1, -1), "TOP"),
             ]
-        )
+        ),
     )
     story.append(data_table)
 
@@ -126,4 +225,4 @@ async def generate_pdf_report(report_data: dict[str, Any], filename: str | None
         story.append(cat_table)
 
     doc.build(story)
-    return filename
+    return output
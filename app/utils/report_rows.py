@@ -0,0 +1,43 @@
+from datetime import date
+from typing import Any, Dict, Iterable, List, Tuple
+
+from utils.money import Money
+
+ROW_KEYS = ("incomes", "expenses")
+
+# One income/expense line of a report file: (date, category, amount, description).
+ReportRow = Tuple[date, str | None, Money, str | None]
+# The same line as sent to a worker process: (date ordinal, category, tiyin, description).
+# Only ints and strings, so pickling stays cheap (dates and Decimals are ~10x slower).
+PackedRow = Tuple[int, str | None, int, str | None]
+
+
+def pack_rows(entries: Iterable[Any]) -> List[PackedRow]:
+    """Income/Expense rows (anything with date, category, amount, description) as PackedRow tuples."""
+    return [
+        (entry.date.toordinal(), entry.category, entry.amount.minor_units, entry.description)
+        for entry in entries
+    ]
+
+
+def unpack_rows(rows: Iterable[PackedRow]) -> List[ReportRow]:
+    return [
+        (date.fromordinal(day), category, Money.from_minor(amount), description)
+        for day, category, amount, description in rows
+    ]
+
+
+def pack_report_data(report_data: Dict) -> Dict:
+    """Copy of report_data with the incomes/expenses rows packed for a worker process."""
+    packed = dict(report_data)
+    for key in ROW_KEYS:
+        packed[key] = pack_rows(report_data.get(key, []))
+    return packed
+
+
+def unpack_report_data(packed: Dict) -> Dict:
+    """report_data with ReportRow tuples, as the Excel/PDF generators take it."""
+    report_data = dict(packed)
+    for key in ROW_KEYS:
+        report_data[key] = unpack_rows(packed.get(key, []))
+    return report_data
@@ -0,0 +1,173 @@
+"""
+Helpers shared by the benchmark scripts. Import this module before any app
+module: it puts app/ on sys.path and points the app's settings at
+BENCH_DATABASE_URL.
+
+The report scripts compare against a generator as it was before a request,
+read from the git history, so they must run inside the repository checkout.
+
+The database scripts expect BENCH_DATABASE_URL (an asyncpg URL) to name a
+scratch database migrated to head. They create their own rows or bench_*
+tables and remove them again, but never run them against production.
+"""
+
+import asyncio
+import importlib.util
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import NamedTuple
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+APP_DIR = ROOT_DIR / "app"
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL", "").strip()
+if BENCH_DATABASE_URL:
+    os.environ["DATABASE_URL"] = BENCH_DATABASE_URL
+os.environ.setdefault("BOT_TOKEN", "123456:bench-token")
+
+
+def require_database() -> str:
+    if not BENCH_DATABASE_URL:
+        sys.exit("Set BENCH_DATABASE_URL to a scratch database migrated to head.")
+    return BENCH_DATABASE_URL
+
+
+def sync_database_url() -> str:
+    return require_database().replace("+asyncpg", "+psycopg2")
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    """Best wall time of fn() in seconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+async def async_timings(fn, calls: int) -> list[float]:
+    """Wall time of each of `calls` awaits of fn(), in seconds."""
+    timings = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def summarize(timings: list[float]) -> str:
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"median {statistics.median(ordered) * 1e6:8.1f} us   p95 {p95 * 1e6:8.1f} us"
+
+
+def run(coro):
+    """asyncio.run(coro), closing the app engine's pool inside the same loop."""
+    from database import async_engine
+
+    async def _run():
+        try:
+            return await coro
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(_run())
+
+
+def module_before(request_id: str, path: str, name: str):
+    """
+    Import `path` (relative to the repository root) as it was just before the
+    first commit of `request_id`, as module `name`.
+    """
+    commit = subprocess.run(
+        ["git", "log", "--reverse", "--format=%H", f"--grep=^\\[{request_id}\\]"],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+    ).stdout.split()[0]
+    source = subprocess.run(
+        ["git", "show", f"{commit}^:{path}"],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    spec = importlib.util.spec_from_loader(name, loader=None)
+    module = importlib.util.module_from_spec(spec)
+    exec(compile(source, f"{path}@{commit[:7]}^", "exec"), module.__dict__)
+    return module
+
+
+class ReportEntry(NamedTuple):
+    """A ReportRow that also has the attribute access of the Income/Expense rows older generators read."""
+
+    date: date
+    category: str | None
+    amount: object
+    description: str | None
+
+
+def fake_report_data(rows: int) -> dict:
+    """A yearly report_data with `rows` income/expense lines (a fifth of them incomes)."""
+    from utils.money import Money
+
+    rnd = random.Random(1)
+    categories = ["Oziq-ovqat", "Transport", None, "Kommunal to'lovlar", "Sog'liq"]
+    descriptions = [None, "", "tushlik", "bozor va do'kon xaridlari"]
+
+    def entry(i: int) -> ReportEntry:
+        return ReportEntry(
+            date(2025, 1, 1) + timedelta(days=i % 365),
+            rnd.choice(categories),
+            Money(rnd.randint(1, 10**7)),
+            rnd.choice(descriptions),
+        )
+
+    incomes = rows // 5
+    return {
+        "period": "Yillik hisobot - 2025",
+        "incomes": [entry(i) for i in range(incomes)],
+        "expenses": [entry(i) for i in range(rows - incomes)],
+        "total_income": Money(5_000_000),
+        "total_expenses": Money(9_000_000),
+        "balance": Money(-4_000_000),
+        "category_totals": {"Transport": Money(3_000_000), "Oziq-ovqat": Money(6_000_000)},
+        "monthly_totals": {month: {"balance": Money(month * 100_000 - 600_000)} for month in range(1, 13)},
+    }
+
+
+def _peak_rss_mib() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def measure_in_child(fn, *args) -> tuple[float, float]:
+    """
+    (seconds, MiB of peak RSS growth) of fn(*args), run in a forked child so
+    each measurement starts from the same memory. Linux only: the peak is
+    reset through /proc/self/clear_refs and read from VmHWM.
+    """
+    import multiprocessing
+
+    def child(pipe):
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        before = _peak_rss_mib()
+        started = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - started
+        pipe.send((elapsed, _peak_rss_mib() - before))
+
+    parent_end, child_end = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.get_context("fork").Process(target=child, args=(child_end,))
+    process.start()
+    result = parent_end.recv()
+    process.join()
+    return result
@@ -0,0 +1,48 @@
+"""
+Excel report generation at 10k, 100k and 1M rows (user-022): the streaming
+write-only generator against the in-memory one it replaced, which is read from
+the git history.
+
+Each run happens in a forked child and reports wall time, peak RSS growth and
+file size. The old generator is skipped above 100k rows unless --all is
+given: at 1M rows it needs minutes and over 2 GiB.
+
+    python scripts/bench/excel_report.py [--all] [rows ...]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+import _common
+from utils.excel_generator import generate_excel_report
+
+OLD_MAX_ROWS = 100_000
+
+
+def main(rows_list: list[int], run_old_always: bool) -> None:
+    old = _common.module_before("user-022", "app/utils/excel_generator.py", "old_excel_generator")
+    variants = [
+        ("old (in-memory)", lambda data, path: asyncio.run(old.generate_excel_report(data, path))),
+        ("new (write-only)", generate_excel_report),
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'rows':>9}  {'generator':<17} {'time':>9} {'peak RSS':>12} {'file':>10}")
+        for rows in rows_list:
+            data = _common.fake_report_data(rows)
+            for label, generate in variants:
+                if label.startswith("old") and rows > OLD_MAX_ROWS and not run_old_always:
+                    print(f"{rows:>9}  {label:<17} {'skipped (--all)':>33}")
+                    continue
+                path = os.path.join(directory, f"report_{rows}.xlsx")
+                seconds, peak = _common.measure_in_child(generate, data, path)
+                size = os.path.getsize(path) / 2**20
+                print(f"{rows:>9}  {label:<17} {seconds:8.2f}s {peak:+9.1f} MiB {size:6.1f} MiB", flush=True)
+            del data
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--all"]
+    main([int(arg) for arg in args] or [10_000, 100_000, 1_000_000], "--all" in sys.argv[1:])
@@ -0,0 +1,109 @@
+"""
+Cost of the 20261018_04 money migration on a large table (user-008).
+
+Builds bench_money_expenses (1M float rows by default) with its user_id and
+(user_id, date) indexes, then times the steps 20261018_04 runs on expenses:
+- the ALTER ... TYPE bigint USING round(...) rewrite
+- the daily_totals rebuild, against a bench_money_totals copy
+It also reports the lock the ALTER holds, and SUM over float against SUM over
+the bigint column. Both tables are dropped at the end.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python scripts/bench/money_migration.py [rows]
+"""
+
+import sys
+import time
+
+import _common
+import sqlalchemy as sa
+
+USERS = 1000
+
+
+def build_tables(conn, rows: int) -> None:
+    conn.execute(sa.text("DROP TABLE IF EXISTS bench_money_expenses, bench_money_totals"))
+    conn.execute(sa.text("""
+        CREATE TABLE bench_money_expenses (
+            id bigserial PRIMARY KEY,
+            user_id bigint NOT NULL,
+            amount double precision NOT NULL,
+            category varchar(100),
+            date date NOT NULL,
+            is_future boolean NOT NULL DEFAULT false
+        )
+    """))
+    conn.execute(sa.text("""
+        INSERT INTO bench_money_expenses (user_id, amount, category, date)
+        SELECT 1 + i % :users, (i % 997) * 1250.35 + 0.105, 'c' || (i % 7), DATE '2025-01-01' + (i % 600)
+        FROM generate_series(1, :rows) AS s(i)
+    """), {"rows": rows, "users": USERS})
+    conn.execute(sa.text("CREATE INDEX ix_bench_money_expenses_user_id ON bench_money_expenses (user_id)"))
+    conn.execute(sa.text(
+        "CREATE INDEX ix_bench_money_expenses_user_id_date ON bench_money_expenses (user_id, date) "
+        "WHERE is_future = false"
+    ))
+    conn.execute(sa.text("""
+        CREATE TABLE bench_money_totals (
+            user_id bigint NOT NULL,
+            day date NOT NULL,
+            kind varchar(16) NOT NULL,
+            category varchar(100) NOT NULL,
+            amount_sum bigint NOT NULL,
+            row_count integer NOT NULL,
+            PRIMARY KEY (user_id, day, kind, category)
+        )
+    """))
+    conn.execute(sa.text("ANALYZE bench_money_expenses"))
+
+
+def timed(conn, label: str, statement: str) -> None:
+    started = time.perf_counter()
+    conn.execute(sa.text(statement))
+    print(f"{label:<44} {time.perf_counter() - started:7.2f} s")
+
+
+def main(rows: int) -> None:
+    engine = sa.create_engine(_common.sync_database_url(), poolclass=sa.pool.NullPool)
+    with engine.begin() as conn:
+        build_tables(conn, rows)
+    print(f"bench_money_expenses: {rows} rows, {USERS} users")
+
+    try:
+        with engine.connect() as conn:
+            started = time.perf_counter()
+            float_sum = conn.execute(sa.text("SELECT SUM(amount) FROM bench_money_expenses")).scalar()
+            print(f"{'SUM(amount) over float':<44} {time.perf_counter() - started:7.2f} s  = {float_sum!r}")
+
+        with engine.begin() as conn:
+            timed(
+                conn,
+                "ALTER amount TYPE bigint USING round(...)",
+                "ALTER TABLE bench_money_expenses ALTER COLUMN amount TYPE bigint "
+                "USING round(amount::numeric * 100)::bigint",
+            )
+            lock = conn.execute(sa.text("""
+                SELECT mode FROM pg_locks
+                WHERE relation = 'bench_money_expenses'::regclass AND pid = pg_backend_pid()
+                ORDER BY mode
+            """)).scalars().all()
+            print(f"{'  locks held until commit':<44} {', '.join(lock)}")
+            timed(conn, "rebuild daily_totals from converted rows", """
+                INSERT INTO bench_money_totals (user_id, day, kind, category, amount_sum, row_count)
+                SELECT user_id, date, 'expense', COALESCE(category, ''), SUM(amount), COUNT(*)
+                FROM bench_money_expenses
+                WHERE is_future = false
+                GROUP BY user_id, date, COALESCE(category, '')
+            """)
+
+        with engine.connect() as conn:
+            started = time.perf_counter()
+            tiyin_sum = conn.execute(sa.text("SELECT SUM(amount) FROM bench_money_expenses")).scalar()
+            print(f"{'SUM(amount) over bigint':<44} {time.perf_counter() - started:7.2f} s  = {tiyin_sum} tiyin")
+    finally:
+        with engine.begin() as conn:
+            conn.execute(sa.text("DROP TABLE IF EXISTS bench_money_expenses, bench_money_totals"))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
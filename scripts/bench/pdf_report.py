@@ -0,0 +1,58 @@
+"""
+PDF report generation (user-024): the per-page ChunkedTable layout against the
+single-Table generator it replaced, which is read from the git history.
+
+Each run happens in a forked child and reports wall time and peak RSS growth.
+reportlab's invariant mode is on, so when both generators run their files are
+compared byte for byte. The old generator is skipped above 20k rows unless
+--all is given: its layout time grows quadratically (about 200 s at 50k).
+
+    python scripts/bench/pdf_report.py [--all] [rows ...]
+"""
+
+import filecmp
+import os
+import sys
+import tempfile
+
+import _common
+from reportlab import rl_config
+
+from utils.pdf_generator import generate_pdf_report
+
+OLD_MAX_ROWS = 20_000
+
+
+def main(rows_list: list[int], run_old_always: bool) -> None:
+    # No creation date or random document id, so equal layouts give equal bytes.
+    rl_config.invariant = 1
+    old = _common.module_before("user-024", "app/utils/pdf_generator.py", "old_pdf_generator")
+    variants = [
+        ("old (one Table)", old.generate_pdf_report),
+        ("new (per page)", generate_pdf_report),
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'rows':>9}  {'generator':<16} {'time':>9} {'peak RSS':>12}  same bytes")
+        for rows in rows_list:
+            data = _common.fake_report_data(rows)
+            paths = []
+            for label, generate in variants:
+                if label.startswith("old") and rows > OLD_MAX_ROWS and not run_old_always:
+                    print(f"{rows:>9}  {label:<16} {'skipped (--all)':>22}")
+                    continue
+                path = os.path.join(directory, f"{len(paths)}_{rows}.pdf")
+                seconds, peak = _common.measure_in_child(generate, data, path)
+                paths.append(path)
+                same = filecmp.cmp(*paths, shallow=False) if len(paths) == 2 else None
+                print(
+                    f"{rows:>9}  {label:<16} {seconds:8.2f}s {peak:+9.1f} MiB"
+                    f"  {'' if same is None else ('yes' if same else 'NO')}",
+                    flush=True,
+                )
+            del data
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--all"]
+    main([int(arg) for arg in args] or [1_000, 10_000, 20_000, 100_000], "--all" in sys.argv[1:])
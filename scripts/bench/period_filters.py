@@ -0,0 +1,114 @@
+"""
+extract() period filters against half-open date ranges on a large expenses
+table (user-007).
+
+Builds bench_expenses (1M rows by default: 1000 users x 1000 days) with the
+same partial (user_id, date) index as expenses. Then it runs the monthly
+lookup both ways for a sample of users, timing the queries and printing one
+EXPLAIN ANALYZE of each. The table is dropped at the end.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python scripts/bench/period_filters.py [users] [rows_per_user]
+"""
+
+import random
+import statistics
+import sys
+import time
+
+import _common
+import sqlalchemy as sa
+
+YEAR, MONTH = 2026, 3
+
+EXTRACT_SQL = sa.text("""
+    SELECT * FROM bench_expenses
+    WHERE user_id = :user_id
+      AND extract(year FROM date) = :year
+      AND extract(month FROM date) = :month
+      AND is_future = false
+""")
+
+RANGE_SQL = sa.text("""
+    SELECT * FROM bench_expenses
+    WHERE user_id = :user_id
+      AND date >= :start_date
+      AND date < :next_start
+      AND is_future = false
+""")
+
+
+def build_table(conn, users: int, rows_per_user: int) -> None:
+    conn.execute(sa.text("DROP TABLE IF EXISTS bench_expenses"))
+    conn.execute(sa.text("""
+        CREATE TABLE bench_expenses (
+            id bigserial PRIMARY KEY,
+            user_id bigint NOT NULL,
+            amount bigint NOT NULL,
+            category varchar(100),
+            date date NOT NULL,
+            is_future boolean NOT NULL DEFAULT false
+        )
+    """))
+    conn.execute(sa.text("""
+        INSERT INTO bench_expenses (user_id, amount, category, date, is_future)
+        SELECT u, 1000 + d, 'Oziq-ovqat', DATE '2024-01-01' + (d % 1000), d % 50 = 0
+        FROM generate_series(1, :users) AS d0(u), generate_series(1, :rows) AS d1(d)
+    """), {"users": users, "rows": rows_per_user})
+    conn.execute(sa.text(
+        "CREATE INDEX ix_bench_expenses_user_id_date_actual "
+        "ON bench_expenses (user_id, date) WHERE is_future = false"
+    ))
+    conn.execute(sa.text("ANALYZE bench_expenses"))
+
+
+def time_queries(conn, statement, params_list) -> list[float]:
+    timings = []
+    for params in params_list:
+        started = time.perf_counter()
+        conn.execute(statement, params).fetchall()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def explain(conn, statement, params) -> str:
+    rows = conn.execute(sa.text(f"EXPLAIN (ANALYZE, BUFFERS) {statement.text}"), params).scalars()
+    return "\n".join(f"    {row}" for row in rows)
+
+
+def main(users: int, rows_per_user: int) -> None:
+    from utils.helpers import get_month_bounds
+
+    engine = sa.create_engine(_common.sync_database_url(), poolclass=sa.pool.NullPool)
+    start_date, next_start = get_month_bounds(YEAR, MONTH)
+    sample = random.Random(7).sample(range(1, users + 1), min(users, 200))
+    extract_params = [{"user_id": u, "year": YEAR, "month": MONTH} for u in sample]
+    range_params = [{"user_id": u, "start_date": start_date, "next_start": next_start} for u in sample]
+
+    with engine.begin() as conn:
+        started = time.perf_counter()
+        build_table(conn, users, rows_per_user)
+        print(f"bench_expenses: {users * rows_per_user} rows built in {time.perf_counter() - started:.1f} s")
+
+    try:
+        with engine.connect() as conn:
+            for _ in range(2):  # warm the cache for both shapes
+                time_queries(conn, EXTRACT_SQL, extract_params)
+                time_queries(conn, RANGE_SQL, range_params)
+            for label, statement, params_list in (
+                ("extract()", EXTRACT_SQL, extract_params),
+                ("range", RANGE_SQL, range_params),
+            ):
+                timings = time_queries(conn, statement, params_list)
+                print(f"\n{label}: {len(timings)} users, median {statistics.median(timings) * 1000:.2f} ms per query")
+                print(explain(conn, statement, params_list[0]))
+    finally:
+        with engine.begin() as conn:
+            conn.execute(sa.text("DROP TABLE IF EXISTS bench_expenses"))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 1000,
+    )
@@ -0,0 +1,237 @@
+"""
+Planning pass of the payment reminders (due tomorrow, monthly 3 days ahead,
+yearly 7 days ahead) three ways (user-017):
+- the baseline per-user loops: a settings lookup per reminder type and one
+  query per user and day, as check_and_send_reminders ran them every hour
+- the three set-based queries ReminderPlanner had before user-017, one per kind
+- the current single date-range query of plan_payment_reminders
+
+Seeds users (10k by default) with five payments each, and their
+payment_occurrences, under ids starting at BENCH_USER_ID. The baseline loop is
+timed on a sample of users and scaled to all of them. For the set-based
+variants it prints the round trips, the wall time (best of 5) and the
+Postgres execution time from EXPLAIN ANALYZE. The seeded rows are deleted at the end.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python scripts/bench/reminder_planning.py [users] [sample]
+"""
+
+import sys
+import time
+from datetime import date, timedelta
+
+import _common
+from sqlalchemy import and_, delete, event, func, select, text
+
+from database import AsyncSessionLocal, async_engine
+from models import Payment, PaymentFrequency, PaymentOccurrence, User, UserSettings
+from services.occurrence_service import OccurrenceService
+from services.reminder_planner import (
+    DUE_TOMORROW,
+    MONTHLY_AHEAD,
+    PAYMENT_REMINDER_KINDS,
+    YEARLY_AHEAD,
+    PlannedReminder,
+    ReminderPlanner,
+)
+from utils.money import Money
+
+BENCH_USER_ID = 990_100_000
+TODAY = date(2026, 10, 19)
+
+
+def _payments(user_id: int, i: int) -> list[Payment]:
+    def payment(frequency, days):
+        return Payment(
+            user_id=user_id, amount=Money(25000), description="bench",
+            due_date=TODAY + timedelta(days=days), frequency=frequency,
+        )
+
+    return [
+        payment(PaymentFrequency.WEEKLY, i % 7),
+        payment(PaymentFrequency.MONTHLY, i % 30),
+        payment(PaymentFrequency.MONTHLY, i * 7 % 30),
+        payment(PaymentFrequency.YEARLY, i % 365),
+        payment(PaymentFrequency.ONCE, i % 60),
+    ]
+
+
+async def seed(users: int) -> None:
+    await cleanup()
+    for start in range(0, users, 1000):
+        async with AsyncSessionLocal() as db:
+            payments = []
+            for i in range(start, min(users, start + 1000)):
+                user_id = BENCH_USER_ID + i
+                db.add(User(telegram_id=user_id))
+                db.add(UserSettings(user_id=user_id, timezone="Asia/Tashkent"))
+                payments += _payments(user_id, i)
+            db.add_all(payments)
+            await db.flush()
+            await OccurrenceService.regenerate(db, payments, TODAY)
+            await db.commit()
+    async with AsyncSessionLocal() as db:
+        for table in ("users", "user_settings", "payments", "payment_occurrences"):
+            await db.execute(text(f"ANALYZE {table}"))
+        await db.commit()
+
+
+async def cleanup() -> None:
+    bench_users = [BENCH_USER_ID, BENCH_USER_ID + 10_000_000]
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(PaymentOccurrence).where(PaymentOccurrence.user_id.between(*bench_users)))
+        await db.execute(delete(Payment).where(Payment.user_id.between(*bench_users)))
+        await db.execute(delete(UserSettings).where(UserSettings.user_id.between(*bench_users)))
+        await db.execute(delete(User).where(User.telegram_id.between(*bench_users)))
+        await db.commit()
+
+
+async def per_user_loop(user_id: int) -> int:
+    """Baseline check_and_send_reminders for one user, one session per run_db call as it was."""
+    # The baseline queries also ran normalize_recurring_payments first; it is
+    # left out, so this is a lower bound.
+    open_payments = (
+        select(Payment)
+        .where(
+            Payment.user_id == user_id,
+            Payment.is_paid == False,
+            Payment.is_skipped == False,
+            Payment.reminder_sent == False,
+        )
+    )
+    planned = 0
+    for days, frequency, first_only in (
+        ((1,), None, False),
+        ((1, 2, 3), PaymentFrequency.MONTHLY, True),
+        ((1, 2, 3, 4, 5, 6, 7), PaymentFrequency.YEARLY, False),
+    ):
+        async with AsyncSessionLocal() as db:
+            await db.scalar(select(UserSettings).where(UserSettings.user_id == user_id).limit(1))
+        async with AsyncSessionLocal() as db:
+            for day in days:
+                query = open_payments.where(Payment.due_date == TODAY + timedelta(days=day))
+                if frequency is not None:
+                    query = query.where(Payment.frequency == frequency)
+                found = (await db.scalars(query)).all()
+                planned += len(found)
+                if found and first_only:
+                    break
+    return planned
+
+
+async def three_queries(db, today: date = TODAY) -> list[PlannedReminder]:
+    """ReminderPlanner.plan_payment_reminders as it was before user-017: one query per kind."""
+    tomorrow = today + timedelta(days=1)
+    ahead_start = tomorrow + timedelta(days=1)
+    due = PaymentOccurrence.due_date
+    pending = ReminderPlanner._payments_for(UserSettings.daily_reminder_enabled, None).join(
+        PaymentOccurrence,
+        and_(PaymentOccurrence.payment_id == Payment.id, due == Payment.due_date),
+    ).where(
+        Payment.reminder_sent == False
+    )
+    plan: list[PlannedReminder] = []
+
+    result = await db.execute(pending.where(due == tomorrow).order_by(Payment.user_id, Payment.id))
+    plan.extend(PlannedReminder(chat_id, DUE_TOMORROW, payment) for payment, chat_id in result.all())
+
+    candidates = pending.add_columns(
+        func.min(Payment.due_date).over(partition_by=Payment.user_id).label("first_due")
+    ).where(
+        Payment.frequency == PaymentFrequency.MONTHLY,
+        due >= ahead_start,
+        due <= today + timedelta(days=3),
+    ).subquery()
+    result = await db.execute(
+        select(Payment, candidates.c.telegram_id)
+        .join(candidates, candidates.c.id == Payment.id)
+        .where(candidates.c.due_date == candidates.c.first_due)
+        .order_by(Payment.user_id, Payment.id)
+    )
+    plan.extend(PlannedReminder(chat_id, MONTHLY_AHEAD, payment) for payment, chat_id in result.all())
+
+    result = await db.execute(
+        pending.where(
+            Payment.frequency == PaymentFrequency.YEARLY,
+            due >= ahead_start,
+            due <= today + timedelta(days=7),
+        ).order_by(Payment.user_id, Payment.due_date, Payment.id)
+    )
+    plan.extend(PlannedReminder(chat_id, YEARLY_AHEAD, payment) for payment, chat_id in result.all())
+    return plan
+
+
+async def one_query(db) -> list[PlannedReminder]:
+    return await ReminderPlanner.plan_payment_reminders(db, PAYMENT_REMINDER_KINDS, TODAY)
+
+
+async def measure(plan) -> tuple[int, float, float, int]:
+    """(round trips, best wall time, Postgres execution time, reminders planned) of one planning pass."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    wall = []
+    for attempt in range(6):
+        async with AsyncSessionLocal() as db:
+            if attempt == 1:
+                event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+            started = time.perf_counter()
+            planned = await plan(db)
+            wall.append(time.perf_counter() - started)
+            if attempt == 1:
+                event.remove(async_engine.sync_engine, "before_cursor_execute", capture)
+
+    postgres = 0.0
+    async with AsyncSessionLocal() as db:
+        raw = await (await db.connection()).get_raw_connection()
+        for statement, parameters in statements:
+            explained = await raw.driver_connection.fetchval(
+                "EXPLAIN (ANALYZE, FORMAT JSON) " + statement, *(parameters or ())
+            )
+            postgres += explained[0]["Execution Time"] / 1000
+    # The first pass only warms the caches.
+    return len(statements), min(wall[1:]), postgres, len(planned)
+
+
+async def main(users: int, sample: int) -> None:
+    started = time.perf_counter()
+    await seed(users)
+    print(f"seeded {users} users, {users * 5} payments in {time.perf_counter() - started:.1f} s")
+
+    try:
+        statements = 0
+
+        def count(*args):
+            nonlocal statements
+            statements += 1
+
+        sample = min(sample, users)
+        event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+        started = time.perf_counter()
+        for i in range(sample):
+            await per_user_loop(BENCH_USER_ID + i)
+        elapsed = time.perf_counter() - started
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+        scale = users / sample
+        print(
+            f"{'per-user loop (baseline)':<28} {statements * scale:9.0f} queries"
+            f"  {elapsed * scale * 1000:9.0f} ms  (measured on {sample} users, scaled)"
+        )
+
+        for label, plan in (("three queries (pre user-017)", three_queries), ("one query (current)", one_query)):
+            round_trips, wall, postgres, planned = await measure(plan)
+            print(
+                f"{label:<28} {round_trips:9d} queries  {wall * 1000:9.1f} ms"
+                f"  ({postgres * 1000:.1f} ms in Postgres, {planned} reminders)"
+            )
+    finally:
+        await cleanup()
+
+
+if __name__ == "__main__":
+    _common.require_database()
+    _common.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 500,
+    ))
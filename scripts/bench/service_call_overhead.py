@@ -0,0 +1,103 @@
+"""
+Per-call overhead of the old run_sync service path against the native
+AsyncSession one (user-001).
+
+Each call opens its own session, as run_db does. Before user-001 run_db wrapped
+a sync Session service in db.run_sync(...), so every call paid a greenlet hop.
+The legacy variants rebuild that path with the same query the native service
+sends. SELECT 1 isolates the hop from the query itself.
+
+    BENCH_DATABASE_URL=postgresql+asyncpg://... python scripts/bench/service_call_overhead.py [calls]
+"""
+
+import sys
+from datetime import date
+
+import _common
+from sqlalchemy import delete, insert, select, text
+
+from database import AsyncSessionLocal
+from models import Expense
+from services.expense_service import ExpenseService
+
+BENCH_USER_ID = 990_000_001
+START, END = date(2026, 3, 1), date(2026, 3, 31)
+
+
+async def legacy_select_one():
+    async with AsyncSessionLocal() as db:
+        return await db.run_sync(lambda sync_db: sync_db.execute(text("SELECT 1")).scalar())
+
+
+async def native_select_one():
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(text("SELECT 1"))
+
+
+def _legacy_expenses_by_period(sync_db, user_id, start_date, end_date):
+    # The baseline ExpenseService.get_expenses_by_period.
+    return sync_db.query(Expense).filter(
+        Expense.user_id == user_id,
+        Expense.date >= start_date,
+        Expense.date <= end_date,
+        Expense.is_future == False,
+    ).order_by(Expense.date).all()
+
+
+async def legacy_expenses_by_period():
+    async with AsyncSessionLocal() as db:
+        return await db.run_sync(
+            lambda sync_db: _legacy_expenses_by_period(sync_db, BENCH_USER_ID, START, END)
+        )
+
+
+async def native_expenses_by_period():
+    async with AsyncSessionLocal() as db:
+        return await ExpenseService.get_expenses_by_period(db, BENCH_USER_ID, START, END)
+
+
+async def main(calls: int):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Expense).where(Expense.user_id == BENCH_USER_ID))
+        await db.execute(insert(Expense), [
+            {
+                "user_id": BENCH_USER_ID,
+                "amount": 15000,
+                "category": "Oziq-ovqat",
+                "description": "bench",
+                "date": date(2026, 3, 1 + i % 31),
+                "is_future": False,
+            }
+            for i in range(30)
+        ])
+        await db.commit()
+
+    try:
+        variants = [
+            ("select_one legacy run_sync", legacy_select_one),
+            ("select_one native", native_select_one),
+            ("expenses_by_period legacy run_sync", legacy_expenses_by_period),
+            ("expenses_by_period native", native_expenses_by_period),
+        ]
+        for _label, fn in variants:
+            await _common.async_timings(fn, 200)  # warm the pool and statement caches
+
+        # Alternate the variants in blocks so drift hits them evenly.
+        timings = {label: [] for label, _fn in variants}
+        block = max(1, calls // 10)
+        for _ in range(10):
+            for label, fn in variants:
+                timings[label] += await _common.async_timings(fn, block)
+
+        print(f"{calls} calls per variant, one session per call")
+        for label, _fn in variants:
+            print(f"  {label:<36} {_common.summarize(timings[label])}")
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Expense).where(Expense.user_id == BENCH_USER_ID))
+            await db.commit()
+
+
+if __name__ == "__main__":
+    _common.require_database()
+    _common.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
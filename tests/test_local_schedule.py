@@ -0,0 +1,130 @@
+"""
+The quarter-hour reminder tick catches up on slots whose tick was missed and
+never plans a slot twice. Ticks only queue; drain_outbox delivers.
+"""
+
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+from conftest import run_async
+
+CHAT_ID = 1001
+# Asia/Tashkent is UTC+5: 09:00 local is 04:00 UTC, 18:00 is 13:00, 23:00 is 18:00.
+LOCAL_TODAY = date(2026, 10, 19)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text.splitlines()[0]))
+
+
+async def _seed():
+    from database import AsyncSessionLocal, run_db
+    from models import Payment, PaymentFrequency, User, UserSettings
+    from services.expense_service import ExpenseService
+    from services.occurrence_service import OccurrenceService
+    from utils.money import Money
+
+    async with AsyncSessionLocal() as db:
+        db.add(User(telegram_id=CHAT_ID))
+        db.add(UserSettings(user_id=CHAT_ID, timezone="Asia/Tashkent"))
+        db.add(Payment(
+            user_id=CHAT_ID, amount=Money(50000), description="Internet",
+            due_date=LOCAL_TODAY + timedelta(days=1), frequency=PaymentFrequency.ONCE,
+        ))
+        db.add(Payment(
+            user_id=CHAT_ID, amount=Money(90000), description="Kredit",
+            due_date=LOCAL_TODAY - timedelta(days=3), frequency=PaymentFrequency.ONCE,
+        ))
+        await db.commit()
+    await run_db(ExpenseService.add_expense, CHAT_ID, Money(12000), "Oziq-ovqat", "non", LOCAL_TODAY)
+    await run_db(OccurrenceService.refresh_batch, 0)
+
+
+async def _tick(bot, hour, minute):
+    from services.reminder_service import ReminderService
+    from services.send_scheduler import send_scheduler
+
+    before = len(bot.sent)
+    await ReminderService.run_local_schedule(bot, datetime(2026, 10, 19, hour, minute, 7, tzinfo=timezone.utc))
+    queued_only = len(bot.sent) == before
+    await ReminderService.drain_outbox(bot)
+    # Daily summaries go straight to the send scheduler.
+    for _ in range(100):
+        if send_scheduler.snapshot()["queue_depth"] == 0:
+            break
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.05)
+    return queued_only, sorted(text for _chat, text in bot.sent[before:])
+
+
+def test_missed_ticks_are_caught_up_once(database):
+    from services.send_scheduler import send_scheduler
+
+    async def scenario():
+        await _seed()
+        bot = FakeBot()
+        try:
+            # 04:00 UTC (09:00 local) never ran; 04:15 catches up.
+            return [
+                await _tick(bot, 3, 45),
+                await _tick(bot, 4, 15),
+                await _tick(bot, 4, 30),
+                # 13:00 and 13:15 missed, 13:30 catches up the 18:00 overdue slot.
+                await _tick(bot, 13, 30),
+                await _tick(bot, 13, 45),
+                # 23:00 local missed, 23:15 sends the summary.
+                await _tick(bot, 18, 15),
+                await _tick(bot, 18, 30),
+            ]
+        finally:
+            await send_scheduler.stop()
+
+    ticks = run_async(scenario())
+
+    # Payment reminders wait in the outbox until the drain (summaries do not).
+    assert all(queued_only for index, (queued_only, _sent) in enumerate(ticks) if index != 5)
+    sent = [texts for _queued_only, texts in ticks]
+    assert sent[0] == []
+    assert sent[1] == ["📢 **ERTAGA TO'LOV ESLATMASI:**", "🔴 **MUDDATI O'TGAN TO'LOV!**"]
+    assert sent[2] == []
+    assert sent[3] == ["🔴 **MUDDATI O'TGAN TO'LOV!**"]
+    assert sent[4] == []
+    assert sent[5] == ["📊 **KUNLIK HISOBOT - 19.10.2026**"]
+    assert sent[6] == []
+
+
+def test_digest_is_not_split_by_a_drain_during_the_tick(database, monkeypatch):
+    from sqlalchemy import update
+
+    from database import AsyncSessionLocal
+    from models import UserSettings
+    from services.reminder_service import ReminderService
+    from services.send_scheduler import send_scheduler
+
+    bot = FakeBot()
+    queue_overdue = ReminderService._queue_overdue_reminders
+
+    async def drain_then_queue_overdue(db, *args):
+        # The drain job firing between the tick's two planning steps.
+        await ReminderService.drain_outbox(bot)
+        return await queue_overdue(db, *args)
+
+    monkeypatch.setattr(ReminderService, "_queue_overdue_reminders", drain_then_queue_overdue)
+
+    async def scenario():
+        await _seed()
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(UserSettings).where(UserSettings.user_id == CHAT_ID).values(digest_enabled=True))
+            await db.commit()
+        try:
+            await _tick(bot, 4, 15)
+        finally:
+            await send_scheduler.stop()
+
+    run_async(scenario())
+
+    assert bot.sent == [(CHAT_ID, "📬 **TO'LOVLAR ESLATMASI**")]
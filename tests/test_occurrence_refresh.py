@@ -0,0 +1,85 @@
+"""
+The nightly occurrence refresh fills each payment up to the horizon from its
+owner's local date and leaves payments locked by a concurrent writer alone.
+"""
+
+from datetime import timedelta
+
+import pytest
+
+from conftest import run_async
+
+# UTC+14 and UTC-11: their local dates are always one or two days apart.
+AHEAD, BEHIND = 1, 2
+TIMEZONES = {AHEAD: "Pacific/Kiritimati", BEHIND: "Pacific/Pago_Pago"}
+
+
+async def _seed(due_in_days):
+    from database import AsyncSessionLocal
+    from models import Payment, PaymentFrequency, User, UserSettings
+    from utils.helpers import local_today
+    from utils.money import Money
+
+    async with AsyncSessionLocal() as db:
+        for user_id, timezone_name in TIMEZONES.items():
+            db.add(User(telegram_id=user_id))
+            db.add(UserSettings(user_id=user_id, timezone=timezone_name))
+        await db.flush()
+        for user_id, timezone_name in TIMEZONES.items():
+            db.add(Payment(
+                user_id=user_id, amount=Money(10000), description="Obuna",
+                due_date=local_today(timezone_name) + timedelta(days=due_in_days),
+                frequency=PaymentFrequency.WEEKLY,
+            ))
+        await db.commit()
+
+
+async def _occurrences():
+    from sqlalchemy import func, select
+
+    from database import AsyncSessionLocal
+    from models import PaymentOccurrence
+
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(
+            select(PaymentOccurrence.user_id, func.count())
+            .group_by(PaymentOccurrence.user_id)
+        )
+        return dict(rows.all())
+
+
+@pytest.mark.parametrize("past_horizon, expected", [(0, 2), (1, 1)])
+def test_refresh_uses_each_users_local_date(database, past_horizon, expected):
+    from config import config
+    from database import run_db
+    from services.occurrence_service import OccurrenceService
+
+    async def scenario():
+        # The second weekly occurrence lands on the local horizon end, or a day past it.
+        await _seed(config.PAYMENT_OCCURRENCE_HORIZON_DAYS - 7 + past_horizon)
+        await run_db(OccurrenceService.refresh_batch, 0)
+        return await _occurrences()
+
+    assert run_async(scenario()) == {AHEAD: expected, BEHIND: expected}
+
+
+def test_refresh_skips_payments_locked_by_a_writer(database):
+    from sqlalchemy import select
+
+    from database import AsyncSessionLocal, run_db
+    from models import Payment
+    from services.occurrence_service import OccurrenceService
+
+    async def scenario():
+        await _seed(0)
+        async with AsyncSessionLocal() as writer:
+            await writer.execute(select(Payment).where(Payment.user_id == AHEAD).with_for_update())
+            written, last_id = await run_db(OccurrenceService.refresh_batch, 0)
+            await writer.rollback()
+        return written, last_id, await _occurrences()
+
+    written, last_id, occurrences = run_async(scenario())
+
+    assert last_id is not None
+    assert AHEAD not in occurrences
+    assert occurrences[BEHIND] == written
@@ -0,0 +1,185 @@
+"""
+The closed-form recurrence helpers of PaymentService against the loops they
+replaced. The oracles below are the baseline implementation: step one period
+at a time with _add_months(), so month-end clamping accumulates
+(Jan 31 -> Apr 30 -> Jul 30, Feb 29 -> Feb 28 for good).
+"""
+
+import calendar
+from datetime import date, timedelta
+
+from hypothesis import given, settings, strategies as st
+
+from models import Payment, PaymentFrequency
+from services.payment_service import PaymentService
+
+RECURRING = [
+    PaymentFrequency.WEEKLY,
+    PaymentFrequency.BIWEEKLY,
+    PaymentFrequency.MONTHLY,
+    PaymentFrequency.QUARTERLY,
+    PaymentFrequency.YEARLY,
+]
+STEPPED = [f for f in RECURRING if f != PaymentFrequency.MONTHLY]
+
+
+def _old_add_months(dt: date, months: int) -> date:
+    month_index = (dt.month - 1) + months
+    year = dt.year + month_index // 12
+    month = month_index % 12 + 1
+    last_day = calendar.monthrange(year, month)[1]
+    day = min(dt.day, last_day)
+    return date(year, month, day)
+
+
+def _old_next_weekday(from_date: date, weekday: int) -> date:
+    days_ahead = (weekday - from_date.weekday()) % 7
+    if days_ahead == 0:
+        days_ahead = 7
+    return from_date + timedelta(days=days_ahead)
+
+
+def _old_next_month_day(from_date: date, day_of_month: int) -> date:
+    last_day_this_month = calendar.monthrange(from_date.year, from_date.month)[1]
+    day_this_month = min(day_of_month, last_day_this_month)
+    candidate = date(from_date.year, from_date.month, day_this_month)
+    if candidate <= from_date:
+        next_month = _old_add_months(from_date.replace(day=1), 1)
+        last_day_next_month = calendar.monthrange(next_month.year, next_month.month)[1]
+        day_next_month = min(day_of_month, last_day_next_month)
+        return date(next_month.year, next_month.month, day_next_month)
+    return candidate
+
+
+def _old_get_next_due_date(payment, from_date: date) -> date:
+    """PaymentService._get_next_due_date as of the baseline commit."""
+    base = from_date
+
+    if payment.frequency == PaymentFrequency.WEEKLY:
+        next_due = payment.due_date
+        if next_due is None:
+            if payment.weekday is None:
+                return base
+            return _old_next_weekday(base, payment.weekday)
+        while next_due <= base:
+            next_due = next_due + timedelta(days=7)
+        return next_due
+
+    if payment.frequency == PaymentFrequency.BIWEEKLY:
+        next_due = payment.due_date
+        if next_due is None:
+            if payment.weekday is None:
+                return base
+            next_due = _old_next_weekday(base, payment.weekday)
+        while next_due <= base:
+            next_due = next_due + timedelta(days=14)
+        return next_due
+
+    if payment.frequency == PaymentFrequency.MONTHLY:
+        if payment.day_of_month is None:
+            return _old_next_month_day(base, payment.due_date.day)
+        return _old_next_month_day(base, payment.day_of_month)
+
+    if payment.frequency == PaymentFrequency.QUARTERLY:
+        next_due = payment.due_date
+        while next_due <= base:
+            next_due = _old_add_months(next_due, 3)
+        return next_due
+
+    if payment.frequency == PaymentFrequency.YEARLY:
+        next_due = payment.due_date
+        while next_due <= base:
+            next_due = date(
+                next_due.year + 1,
+                next_due.month,
+                min(next_due.day, calendar.monthrange(next_due.year + 1, next_due.month)[1]),
+            )
+        return next_due
+
+    return payment.due_date
+
+
+def _old_latest_occurrence(payment, today: date) -> date:
+    """The due date a payment reaches when each occurrence up to today is paid in turn."""
+    due_date = payment.due_date
+    while True:
+        current = _payment(payment.frequency, due_date, payment.day_of_month)
+        next_due = _old_get_next_due_date(current, due_date)
+        if next_due <= due_date or next_due > today:
+            return due_date
+        due_date = next_due
+
+
+def _payment(frequency, due_date, day_of_month=None, weekday=None) -> Payment:
+    return Payment(frequency=frequency, due_date=due_date, day_of_month=day_of_month, weekday=weekday)
+
+
+# Month ends and leap days are where clamping differs; mix them in on purpose.
+month_ends = st.builds(
+    lambda year, month, back: date(year, month, calendar.monthrange(year, month)[1]) - timedelta(days=back),
+    st.integers(1990, 2060),
+    st.integers(1, 12),
+    st.integers(0, 3),
+)
+anchors = st.one_of(st.dates(date(1990, 1, 1), date(2060, 12, 31)), month_ends)
+offsets = st.integers(-400, 365 * 60)
+days_of_month = st.one_of(st.none(), st.integers(1, 31))
+
+
+@settings(max_examples=1500, deadline=None)
+@given(frequency=st.sampled_from(RECURRING), anchor=anchors, offset=offsets, day_of_month=days_of_month)
+def test_next_due_date_matches_the_loop(frequency, anchor, offset, day_of_month):
+    base = anchor + timedelta(days=offset)
+    payment = _payment(frequency, anchor, day_of_month)
+
+    assert PaymentService._get_next_due_date(payment, base) == _old_get_next_due_date(payment, base)
+
+
+@settings(max_examples=1500, deadline=None)
+@given(frequency=st.sampled_from(RECURRING), anchor=anchors, offset=offsets, day_of_month=days_of_month)
+def test_latest_occurrence_matches_the_loop(frequency, anchor, offset, day_of_month):
+    today = anchor + timedelta(days=offset)
+    payment = _payment(frequency, anchor, day_of_month)
+
+    assert PaymentService._latest_occurrence(payment, today) == _old_latest_occurrence(payment, today)
+
+
+@settings(max_examples=1500, deadline=None)
+@given(frequency=st.sampled_from(STEPPED), anchor=anchors, offset=offsets)
+def test_steps_after_is_the_first_occurrence_past_base(frequency, anchor, offset):
+    base = anchor + timedelta(days=offset)
+    payment = _payment(frequency, anchor)
+
+    steps = PaymentService._steps_after(payment, base)
+
+    assert PaymentService._occurrence(payment, steps) > base
+    assert steps == 0 or PaymentService._occurrence(payment, steps - 1) <= base
+
+
+@settings(max_examples=1000, deadline=None)
+@given(frequency=st.sampled_from(STEPPED), anchor=anchors, steps=st.integers(0, 80))
+def test_occurrence_matches_stepping_one_period_at_a_time(frequency, anchor, steps):
+    payment = _payment(frequency, anchor)
+    expected = anchor
+    for _ in range(steps):
+        expected = _old_get_next_due_date(_payment(frequency, expected), expected)
+
+    assert PaymentService._occurrence(payment, steps) == expected
+
+
+def test_shift_months_matches_repeated_add_months_for_every_month_end():
+    # Exhaustive over the anchors where clamping matters: the last four days
+    # of every month in a leap cycle and a half, stepped far enough to pass
+    # several non-leap Februaries.
+    anchors = [
+        date(year, month, calendar.monthrange(year, month)[1]) - timedelta(days=back)
+        for year in range(2023, 2030)
+        for month in range(1, 13)
+        for back in range(4)
+    ]
+    for anchor in anchors:
+        for months in (1, 3, 12):
+            expected = anchor
+            for steps in range(0, 70):
+                assert PaymentService._shift_months(anchor, months, steps) == expected, (anchor, months, steps)
+                expected = _old_add_months(expected, months)
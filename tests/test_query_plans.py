@@ -0,0 +1,149 @@
+"""
+The service queries that the 20261018_01 indexes were built for must be able
+to use them. Each service call runs against a seeded database, and every
+statement it sends to the target table is re-run with EXPLAIN and sequential
+scans disabled. The test fails if the plan still scans that table
+sequentially or reaches it through a different index.
+"""
+
+from datetime import date
+
+import pytest
+from sqlalchemy import event, text
+
+from conftest import run_async
+
+USERS = 200
+USER_ID = 7
+TODAY = date(2026, 10, 18)
+
+SEED_SQL = [
+    f"""
+    INSERT INTO expenses (user_id, amount, category, description, date, expense_type, is_future)
+    SELECT u, 1000 + d, 'Oziq-ovqat', 'seed', DATE '2026-01-01' + (d % 365), 'ONCE', d % 20 = 0
+    FROM generate_series(1, {USERS}) AS u, generate_series(1, 100) AS d
+    """,
+    f"""
+    INSERT INTO income (user_id, amount, description, category, date)
+    SELECT u, 500000 + d, 'seed', 'Kirim', DATE '2026-01-01' + (d * 18 % 365)
+    FROM generate_series(1, {USERS}) AS u, generate_series(1, 20) AS d
+    """,
+    f"""
+    INSERT INTO payments (user_id, amount, category, description, due_date, is_paid, is_skipped, frequency, reminder_sent)
+    SELECT u, 20000 + d, 'Kommunal', 'seed', DATE '2026-06-01' + (d * 15), d % 4 = 0, false, 'ONCE', false
+    FROM generate_series(1, {USERS}) AS u, generate_series(1, 20) AS d
+    """,
+    "ANALYZE expenses",
+    "ANALYZE income",
+    "ANALYZE payments",
+]
+
+EXPENSES_INDEX = ("expenses", "ix_expenses_user_id_date_actual")
+INCOME_INDEX = ("income", "ix_income_user_id_date")
+PAYMENTS_INDEX = ("payments", "ix_payments_user_id_due_date_open")
+
+
+def _service_calls():
+    from services.expense_service import ExpenseService
+    from services.income_service import IncomeService
+    from services.payment_service import PaymentService
+
+    return [
+        ("get_today_expenses", EXPENSES_INDEX, lambda db: ExpenseService.get_today_expenses(db, USER_ID)),
+        ("get_weekly_expenses", EXPENSES_INDEX, lambda db: ExpenseService.get_weekly_expenses(db, USER_ID)),
+        ("get_monthly_expenses", EXPENSES_INDEX, lambda db: ExpenseService.get_monthly_expenses(db, USER_ID, 2026, 3)),
+        ("get_yearly_expenses", EXPENSES_INDEX, lambda db: ExpenseService.get_yearly_expenses(db, USER_ID, 2026)),
+        (
+            "get_expenses_by_period",
+            EXPENSES_INDEX,
+            lambda db: ExpenseService.get_expenses_by_period(db, USER_ID, date(2026, 2, 1), date(2026, 2, 28)),
+        ),
+        ("get_last_expenses", EXPENSES_INDEX, lambda db: ExpenseService.get_last_expenses(db, USER_ID)),
+        (
+            "get_incomes_by_period",
+            INCOME_INDEX,
+            lambda db: IncomeService.get_incomes_by_period(db, USER_ID, date(2026, 1, 1), date(2026, 6, 30)),
+        ),
+        ("get_recent_incomes", INCOME_INDEX, lambda db: IncomeService.get_recent_incomes(db, USER_ID)),
+        ("get_overdue_payments", PAYMENTS_INDEX, lambda db: PaymentService.get_overdue_payments(db, USER_ID)),
+        (
+            "get_upcoming_payments_this_month",
+            PAYMENTS_INDEX,
+            lambda db: PaymentService.get_upcoming_payments_this_month(db, USER_ID),
+        ),
+        ("get_future_payments", PAYMENTS_INDEX, lambda db: PaymentService.get_future_payments(db, USER_ID)),
+        ("get_upcoming_totals", PAYMENTS_INDEX, lambda db: PaymentService.get_upcoming_totals(db, USER_ID)),
+    ]
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+async def _explain_service_call(call):
+    from database import AsyncSessionLocal, async_engine
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    plans = []
+    async with AsyncSessionLocal() as db:
+        event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+        try:
+            await call(db)
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", capture)
+
+        await db.execute(text("SET LOCAL enable_seqscan = off"))
+        raw = await (await db.connection()).get_raw_connection()
+        for statement, parameters in statements:
+            plan = await raw.driver_connection.fetchval(
+                "EXPLAIN (FORMAT JSON) " + statement, *(parameters or ())
+            )
+            # SQLAlchemy registers a json codec on its asyncpg connections.
+            plans.append((statement, plan[0]["Plan"]))
+        await db.rollback()
+    return plans
+
+
+@pytest.fixture
+def seeded_database(database):
+    with database.begin() as conn:
+        for statement in SEED_SQL:
+            conn.execute(text(statement))
+    return database
+
+
+@pytest.fixture(autouse=True)
+def fixed_today(monkeypatch):
+    from services.settings_service import SettingsService
+
+    async def local_today(db, user_id):
+        return TODAY
+
+    monkeypatch.setattr(SettingsService, "local_today", staticmethod(local_today))
+
+
+def test_service_queries_use_their_indexes(seeded_database):
+    failures = []
+    for name, (table, index_name), call in _service_calls():
+        checked = 0
+        for statement, plan in run_async(_explain_service_call(call)):
+            nodes = list(_plan_nodes(plan))
+            if not any(node.get("Relation Name") == table for node in nodes):
+                continue
+            checked += 1
+            indexes = {node["Index Name"] for node in nodes if "Index Name" in node}
+            if any(node["Node Type"] == "Seq Scan" and node.get("Relation Name") == table for node in nodes):
+                failures.append(f"{name}: sequential scan on {table}\n{statement}")
+            elif index_name not in indexes:
+                failures.append(f"{name}: {table} read via {sorted(indexes)}, not {index_name}\n{statement}")
+        if not checked:
+            failures.append(f"{name}: no statement read {table}")
+
+    assert not failures, "\n\n".join(failures)
@@ -0,0 +1,80 @@
+"""
+The yearly report must issue a fixed number of statements, however many
+months, categories and rows the year has.
+"""
+
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from conftest import run_async
+
+USER_ID = 42
+YEAR = 2026
+
+
+async def _seed():
+    from database import run_db
+    from services.expense_service import ExpenseService
+    from services.income_service import IncomeService
+    from utils.money import Money
+
+    async def seed(db):
+        for month in range(1, 13):
+            for day in (3, 17):
+                for category in ("Oziq-ovqat", "Transport", "Kommunal"):
+                    await ExpenseService.add_expense(
+                        db, USER_ID, Money("12500.50"), category, "seed", date(YEAR, month, day)
+                    )
+            await IncomeService.add_income(db, USER_ID, Money("3000000"), "Oylik", income_date=date(YEAR, month, 5))
+
+    await run_db(seed)
+
+
+async def _count_report_queries(include_rows):
+    from database import AsyncSessionLocal, async_engine
+    from services import settings_service
+    from services.report_service import ReportService
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    settings_service._timezone_cache.clear()
+    async with AsyncSessionLocal() as db:
+        event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+        try:
+            report = await ReportService.generate_yearly_report(db, USER_ID, YEAR, include_rows=include_rows)
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+    return report, statements
+
+
+@pytest.mark.parametrize(
+    ("include_rows", "expected_queries"),
+    [
+        # timezone, monthly totals, category totals, expense rows, income rows
+        (True, 5),
+        # timezone, monthly totals, category totals
+        (False, 3),
+    ],
+)
+def test_yearly_report_query_count(database, include_rows, expected_queries):
+    from utils.money import Money
+
+    async def scenario():
+        await _seed()
+        return await _count_report_queries(include_rows)
+
+    report, statements = run_async(scenario())
+
+    assert len(statements) == expected_queries, "\n\n".join(statements)
+    assert report["expense_count"] == 72
+    assert report["income_count"] == 12
+    assert report["total_expenses"] == Money("900036.00")
+    assert report["total_income"] == Money("36000000")
+    assert report["monthly_totals"][7]["balance"] == Money("2924997.00")
+    assert len(report["expenses"]) == (72 if include_rows else 0)
+    assert len(report["incomes"]) == (12 if include_rows else 0)
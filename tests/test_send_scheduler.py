@@ -0,0 +1,208 @@
+"""
+SendScheduler against a fake Bot API session: real aiogram Bot and
+SendMessage calls, with the HTTP round trip replaced by canned responses.
+"""
+
+import asyncio
+import json
+import time
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from services.send_scheduler import SendScheduler
+
+
+class FakeBotSession(BaseSession):
+    """Answers sendMessage like the Bot API. flood maps chat_id to how many
+    of its first requests get 429 Too Many Requests."""
+
+    def __init__(self, flood=None, retry_after=1, bad_chats=(), hold=None):
+        super().__init__()
+        self.flood = dict(flood or {})
+        self.retry_after = retry_after
+        self.bad_chats = set(bad_chats)
+        self.hold = hold
+        self.requests = []
+        self.delivered = []
+
+    async def make_request(self, bot, method, timeout=None):
+        chat_id = method.chat_id
+        self.requests.append((time.monotonic(), chat_id, method.text))
+        if self.hold is not None:
+            await self.hold.wait()
+        if self.flood.get(chat_id, 0) > 0:
+            self.flood[chat_id] -= 1
+            status, body = 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+        elif chat_id in self.bad_chats:
+            status, body = 400, {"ok": False, "error_code": 400, "description": "Bad Request: chat not found"}
+        else:
+            self.delivered.append((chat_id, method.text))
+            status, body = 200, {
+                "ok": True,
+                "result": {
+                    "message_id": len(self.delivered),
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"},
+                    "text": method.text,
+                },
+            }
+        return self.check_response(bot, method, status, json.dumps(body)).result
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+
+def _scheduler(**overrides):
+    options = dict(rate=1000, chat_rate=1000, chat_burst=10, concurrency=4, max_attempts=3)
+    options.update(overrides)
+    return SendScheduler(**options)
+
+
+def _send(scheduler, bot, chat_id, text):
+    return scheduler.submit(chat_id, lambda: bot.send_message(chat_id, text))
+
+
+def test_delivers_messages_and_returns_results():
+    session = FakeBotSession()
+
+    async def scenario():
+        bot = Bot("42:TEST", session=session)
+        scheduler = _scheduler()
+        try:
+            return await asyncio.gather(*(_send(scheduler, bot, 100 + i % 3, f"m{i}") for i in range(9)))
+        finally:
+            await scheduler.stop()
+
+    messages = asyncio.run(scenario())
+
+    assert [message.text for message in messages] == [f"m{i}" for i in range(9)]
+    assert sorted(session.delivered) == sorted((100 + i % 3, f"m{i}") for i in range(9))
+
+
+def test_chat_rate_spaces_sends_to_one_chat():
+    session = FakeBotSession()
+
+    async def scenario():
+        bot = Bot("42:TEST", session=session)
+        scheduler = _scheduler(chat_rate=20, chat_burst=1)
+        try:
+            await asyncio.gather(*(_send(scheduler, bot, 7, f"m{i}") for i in range(4)))
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(scenario())
+
+    sent_at = [at for at, _chat, _text in session.requests]
+    gaps = [later - earlier for earlier, later in zip(sent_at, sent_at[1:])]
+    assert len(sent_at) == 4
+    assert min(gaps) >= 0.04
+
+
+def test_retry_after_parks_the_chat_and_retries():
+    session = FakeBotSession(flood={7: 1}, retry_after=1)
+
+    async def scenario():
+        bot = Bot("42:TEST", session=session)
+        scheduler = _scheduler()
+        try:
+            started = time.monotonic()
+            flooded = _send(scheduler, bot, 7, "flooded")
+            other = await _send(scheduler, bot, 8, "other")
+            other_latency = time.monotonic() - started
+            message = await flooded
+            return scheduler, message, other, other_latency, time.monotonic() - started
+        finally:
+            await scheduler.stop()
+
+    scheduler, message, other, other_latency, flooded_latency = asyncio.run(scenario())
+
+    assert message.text == "flooded"
+    assert other.text == "other"
+    assert other_latency < 0.5
+    assert flooded_latency >= 1
+    assert scheduler.stats.retry_after == 1
+    assert scheduler.stats.sent == 2
+
+
+def test_gives_up_after_max_attempts_and_reports_errors():
+    session = FakeBotSession(flood={7: 5}, retry_after=1, bad_chats={9})
+
+    async def scenario():
+        bot = Bot("42:TEST", session=session)
+        scheduler = _scheduler(max_attempts=2)
+        try:
+            results = await asyncio.gather(
+                _send(scheduler, bot, 7, "flooded"),
+                _send(scheduler, bot, 9, "bad"),
+                return_exceptions=True,
+            )
+            return scheduler, results
+        finally:
+            await scheduler.stop()
+
+    scheduler, (flooded, bad) = asyncio.run(scenario())
+
+    assert isinstance(flooded, TelegramRetryAfter)
+    assert isinstance(bad, TelegramBadRequest)
+    assert scheduler.stats.failed == 2
+    assert len([chat for _at, chat, _text in session.requests if chat == 7]) == 2
+
+
+def test_stop_cancels_queued_parked_and_in_flight_sends():
+    hold = asyncio.Event()
+    session = FakeBotSession(hold=hold)
+
+    async def scenario():
+        bot = Bot("42:TEST", session=session)
+        # Two workers and one token per chat every 10 s: the second send to
+        # chat 7 is parked behind the chat limit, the sends to chats 7 and 9
+        # hang in flight and hold both workers, so chat 8's send stays queued.
+        scheduler = _scheduler(concurrency=2, chat_rate=0.1, chat_burst=1)
+        in_flight = _send(scheduler, bot, 7, "in flight")
+        await asyncio.sleep(0.05)
+        parked = _send(scheduler, bot, 7, "parked")
+        await asyncio.sleep(0.05)
+        also_in_flight = _send(scheduler, bot, 9, "also in flight")
+        await asyncio.sleep(0.05)
+        queued = _send(scheduler, bot, 8, "queued")
+        await asyncio.sleep(0.05)
+        assert scheduler.snapshot()["parked"] == 1
+        assert len(session.requests) == 2
+
+        await asyncio.wait_for(scheduler.stop(), timeout=1)
+        results = await asyncio.wait_for(
+            asyncio.gather(in_flight, parked, also_in_flight, queued, return_exceptions=True), timeout=1
+        )
+        return scheduler, results
+
+    scheduler, results = asyncio.run(scenario())
+
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert scheduler.snapshot()["queue_depth"] == 0
+    assert session.delivered == []
+
+
+def test_submit_after_stop_starts_again():
+    session = FakeBotSession()
+
+    async def scenario():
+        bot = Bot("42:TEST", session=session)
+        scheduler = _scheduler()
+        await _send(scheduler, bot, 1, "before")
+        await scheduler.stop()
+        try:
+            return await asyncio.wait_for(_send(scheduler, bot, 1, "after"), timeout=1)
+        finally:
+            await scheduler.stop()
+
+    assert asyncio.run(scenario()).text == "after"
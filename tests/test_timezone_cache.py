@@ -0,0 +1,33 @@
+"""The per-process timezone cache stays bounded and drops expired entries."""
+
+import pytest
+
+from config import config
+from services import settings_service
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(settings_service, "_timezone_cache", settings_service.OrderedDict())
+    monkeypatch.setattr(config, "TIMEZONE_CACHE_SIZE", 3)
+    monkeypatch.setattr(config, "TIMEZONE_CACHE_SECONDS", 300)
+
+
+def test_least_recently_used_entries_are_evicted():
+    for user_id in (1, 2, 3):
+        settings_service._cache_timezone(user_id, "Asia/Tashkent")
+    assert settings_service._cached_timezone(1) == "Asia/Tashkent"
+
+    settings_service._cache_timezone(4, "Europe/Moscow")
+
+    assert list(settings_service._timezone_cache) == [3, 1, 4]
+    assert settings_service._cached_timezone(2) is None
+
+
+def test_expired_entries_are_dropped_on_read(monkeypatch):
+    settings_service._cache_timezone(1, "Asia/Tashkent")
+    now = settings_service.time.monotonic()
+    monkeypatch.setattr(settings_service.time, "monotonic", lambda: now + 301)
+
+    assert settings_service._cached_timezone(1) is None
+    assert 1 not in settings_service._timezone_cache